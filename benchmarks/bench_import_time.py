@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Startup cost of non_pseudo modules and CLI calls.
+
+Each target runs in a fresh interpreter from the repository root, so nothing
+is cached between measurements. Reports wall time and whether the database
+engine was created (which means a connection and table checks).
+
+    python benchmarks/bench_import_time.py --repeat 5
+"""
+import os
+import subprocess
+import sys
+from time import perf_counter
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# label -> Python source run in a fresh interpreter
+TARGETS = [
+    ('python (baseline)', 'pass'),
+    ('import non_pseudo', 'import non_pseudo'),
+    ('import non_pseudo.db', 'import non_pseudo.db'),
+    ('import non_pseudo.db.utilities', 'import non_pseudo.db.utilities'),
+    ('import non_pseudo.non_pseudo', 'import non_pseudo.non_pseudo'),
+    ('import nps', 'import nps'),
+]
+
+REPORT_ENGINE = '''
+import sys
+db = sys.modules.get('non_pseudo.db')
+print('engine' if db is not None and db._engine is not None else 'no engine')
+'''
+
+def run(source, repeat):
+    """Best wall time [s] of running `source` and its last line of output."""
+    times, output = [], ''
+    for i in range(repeat):
+        start = perf_counter()
+        result = subprocess.run([sys.executable, '-c', source + REPORT_ENGINE],
+                                cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        times.append(perf_counter() - start)
+        if result.returncode != 0:
+            lines = result.stderr.decode().strip().splitlines()
+            return None, lines[-1] if lines else 'failed'
+        output = result.stdout.decode().strip().splitlines()[-1]
+    return min(times), output
+
+@click.command()
+@click.option('--repeat', '-r', default=5, help='Runs per target (best is kept).')
+def bench(repeat):
+    print('{:<36}{:>10}   {}'.format('target', 'time [s]', 'result'))
+    for label, source in TARGETS:
+        elapsed, output = run(source, repeat)
+        elapsed = '{:10.3f}'.format(elapsed) if elapsed is not None else '{:>10}'.format('-')
+        print('{:<36}{}   {}'.format(label, elapsed, output))
+    start = perf_counter()
+    subprocess.run([sys.executable, 'nps.py', '--help'], cwd=ROOT, stdout=subprocess.DEVNULL)
+    print('{:<36}{:10.3f}'.format('nps.py --help', perf_counter() - start))
+
+if __name__ == '__main__':
+    bench()
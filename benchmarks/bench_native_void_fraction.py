@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Validation and throughput of the native helium void fraction engine.
+
+Computes the void fraction of each CIF in-process and compares it with RASPA
+values, read from a CSV file (name,void_fraction) or from a finished run's
+database rows. Throughput is reported in materials per core-hour.
+
+    python benchmarks/bench_native_void_fraction.py cif_files/*.cif --reference raspa.csv
+    python benchmarks/bench_native_void_fraction.py cif_files/*.cif --run-id <run_id>
+"""
+import csv
+import os
+import sys
+from time import process_time
+
+import click
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from non_pseudo.cif import read_cif
+from non_pseudo.simulation.staging import force_field_directory
+from non_pseudo.simulation.native_void_fraction import load_mixing_rules, widom_void_fraction
+
+def load_reference(reference, run_id, names):
+    """RASPA void fractions by material name."""
+    values = {}
+    if reference is not None:
+        with open(reference) as reference_file:
+            for row in csv.reader(reference_file):
+                if row and row[0] in names:
+                    values[row[0]] = float(row[1])
+    if run_id is not None:
+        from non_pseudo.db.utilities import find_material
+        for name in names:
+            material = find_material(run_id, name)
+            if material is not None and material.vf_helium_void_fraction is not None:
+                values[name] = material.vf_helium_void_fraction
+    return values
+
+def column(value, precision=4):
+    """Value right-aligned in a 10 character column, or '-' if it is missing."""
+    if value is None:
+        return '{:>10}'.format('-')
+    return '{:10.{}f}'.format(value, precision)
+
+@click.command()
+@click.argument('cif_paths', nargs=-1, required=True)
+@click.option('--reference', type=click.Path(exists=True),
+              help='CSV file of RASPA void fractions (name,void_fraction).')
+@click.option('--run-id', help='Run to read RASPA void fractions from.')
+@click.option('--insertions', '-n', default=100000, help='Widom insertions per material.')
+@click.option('--seed', default=0, help='Seed of the insertion points.')
+def bench(cif_paths, reference, run_id, insertions, seed):
+    parameters, shifted = load_mixing_rules(
+        os.path.join(force_field_directory(), 'force_field_mixing_rules.def'))
+    names = [os.path.splitext(os.path.basename(path))[0] for path in cif_paths]
+    raspa = load_reference(reference, run_id, set(names))
+
+    print('{:<40}{:>10}{:>10}{:>10}{:>10}{:>10}'.format(
+        'material', 'native', 'error', 'RASPA', 'diff', 'CPU [s]'))
+    cpu_times, differences = [], []
+    for name, path in zip(names, cif_paths):
+        start = process_time()
+        void_fraction, error = widom_void_fraction(
+            read_cif(path), parameters, insertions=insertions, shifted=shifted, seed=seed)
+        cpu_times.append(process_time() - start)
+        difference = None
+        if name in raspa:
+            difference = void_fraction - raspa[name]
+            differences.append(difference)
+        print('{:<40}{}{}{}{}{}'.format(
+            name, column(void_fraction), column(error), column(raspa.get(name)),
+            column(difference), column(cpu_times[-1], 2)))
+
+    print('\nMaterials per core-hour :\t{:.0f}'.format(3600. / np.mean(cpu_times)))
+    if differences:
+        differences = np.array(differences)
+        print('Compared with RASPA :\t\t{} materials'.format(len(differences)))
+        print('Mean absolute difference :\t{:.4f}'.format(np.abs(differences).mean()))
+        print('Max absolute difference :\t{:.4f}'.format(np.abs(differences).max()))
+        print('Mean difference (bias) :\t{:.4f}'.format(differences.mean()))
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Micro-benchmark for RASPA output parsing.
+
+Writes synthetic output files of increasing size and compares the shared
+single-pass parser with the two-pass scan gas adsorption used before.
+
+    python benchmarks/bench_parsers.py --size 10 --size 100
+"""
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from non_pseudo.simulation.raspa_output import parse_output_file
+from synthetic_output import write_gas_adsorption, write_void_fraction, write_surface_area
+
+def two_pass_gas_adsorption(output_file):
+    """Reference: the line-number scan followed by a second read."""
+    results = {}
+    with open(output_file) as origin:
+        line_counter = 1
+        for line in origin:
+            if "absolute [mol/kg" in line:
+                results['absolute_molar_loading'] = float(line.split()[5])
+            elif "absolute [cm^3 (STP)/c" in line:
+                results['absolute_volumetric_loading'] = float(line.split()[6])
+            elif "Average Host-Host energy:" in line:
+                host_host_line = line_counter + 8
+            elif "Average Adsorbate-Adsorbate energy:" in line:
+                adsorbate_adsorbate_line = line_counter + 8
+            elif "Average Host-Adsorbate energy:" in line:
+                host_adsorbate_line = line_counter + 8
+            line_counter += 1
+    with open(output_file) as origin:
+        line_counter = 1
+        for line in origin:
+            if line_counter in (host_host_line, adsorbate_adsorbate_line, host_adsorbate_line):
+                results[line_counter] = float(line.split()[1])
+            line_counter += 1
+    return results
+
+def best_of(function, path, repeat):
+    times = []
+    for i in range(repeat):
+        start = perf_counter()
+        function(path)
+        times.append(perf_counter() - start)
+    return min(times)
+
+@click.command()
+@click.option('--size', '-s', multiple=True, type=float, default=[1, 10, 100],
+              help='Output file size in MB (repeatable).')
+@click.option('--repeat', '-r', default=3, help='Timings per measurement (best is kept).')
+def bench(size, repeat):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print('{:>8} {:>12} {:>12} {:>12}   {}'.format(
+            'MB', 'single [s]', 'two-pass [s]', 'MB/s', 'file'))
+        for mb in size:
+            for label, write in [('gas_adsorption', write_gas_adsorption),
+                                 ('void_fraction', write_void_fraction),
+                                 ('surface_area', write_surface_area)]:
+                path = os.path.join(tmp_dir, '{}.data'.format(label))
+                write(path, size=int(mb * 1e6))
+                actual_mb = os.path.getsize(path) / 1e6
+                single = best_of(parse_output_file, path, repeat)
+                two_pass = ''
+                if label == 'gas_adsorption':
+                    two_pass = '{:12.4f}'.format(best_of(two_pass_gas_adsorption, path, repeat))
+                print('{:8.1f} {:12.4f} {:>12} {:12.1f}   {}'.format(
+                    actual_mb, single, two_pass, actual_mb / single, label))
+
+if __name__ == '__main__':
+    bench()
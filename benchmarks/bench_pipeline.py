@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""End-to-end throughput of the pipeline without RASPA.
+
+Generates random CIFs and simulates them on a temporary SQLite database, with
+fake_simulate.py standing in for RASPA's `simulate`, once through
+add_material_to_database (what each rq job does) and once through
+worker_run_loop (`nps launch_worker`). Reports, from the stage_timings rows of
+each run:
+
+    materials / h    end-to-end throughput
+    overhead [s]     wall time per material not spent waiting on `simulate`
+    parse [MB/s]     output bytes over time spent parsing them
+    db [rows/s]      material rows committed per second of database writes
+
+Results are compared with a baseline saved by an earlier `--save-baseline`
+run; the exit status is 1 if any measure is worse than the baseline by more
+than `--tolerance`. The baseline in the repository was taken with the default
+options; rerun with --save-baseline on the machine results are compared on.
+
+    python benchmarks/bench_pipeline.py --materials 50 --output-size 1 --save-baseline
+    python benchmarks/bench_pipeline.py --materials 50 --output-size 1
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+from time import time
+
+import click
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+import non_pseudo.non_pseudo
+from non_pseudo.db.writer import ResultWriter
+from non_pseudo.db.utilities import find_stage_timings
+from non_pseudo.telemetry import summarize
+from synthetic_output import write_cif
+
+# measure -> True if higher is better
+MEASURES = {
+    'materials_per_hour' : True,
+    'overhead' : False,
+    'parse_mb_per_s' : True,
+    'db_rows_per_s' : True,
+}
+
+class TimedResultWriter(ResultWriter):
+    """ResultWriter counting the rows it writes and the time it takes."""
+
+    rows = 0
+    seconds = 0.
+
+    def _write(self, rows):
+        start = time()
+        super(TimedResultWriter, self)._write(rows)
+        TimedResultWriter.seconds += time() - start
+        TimedResultWriter.rows += len(rows)
+
+def run_config(work_dir, run_id):
+    """Config of a benchmark run; stages run one at a time, without retests."""
+    return {
+        'run_id' : run_id,
+        'materials_directory' : os.path.join(work_dir, 'cifs'),
+        'simulations_directory' : 'tmpfs',
+        'tmpfs_directory' : os.path.join(work_dir, 'simulations'),
+        'staging_directory' : os.path.join(work_dir, 'staging'),
+        'concurrent_stages' : 1,
+        'retries' : {'max_retries' : 0, 'backoff' : 0},
+        'writer' : {'batch_size' : 50, 'flush_interval' : 5},
+        'simulations' : {
+            'helium_void_fraction' : {'simulation_cycles' : 500},
+            'gas_adsorption' : {
+                'adsorbate' : 'methane',
+                'external_pressure' : [3500000, 6500000],
+                'external_temperature' : 298,
+                'initialization_cycles' : 500,
+                'simulation_cycles' : 500,
+            },
+            'surface_area' : {'simulation_cycles' : 100},
+        },
+    }
+
+def measures(run_id, wall_time, db_rows, db_seconds):
+    """Benchmark measures of a finished run from its stage timings."""
+    rows = find_stage_timings(run_id)
+    summary = summarize(rows)
+    materials = [row for row in rows if row['stage'] == 'material']
+    stages = [row for row in rows if row['stage'] != 'material']
+    parse_time = sum(row['parse_time'] for row in stages)
+    return {
+        'materials' : len(materials),
+        'wall_time' : wall_time,
+        'materials_per_hour' : len(materials) / wall_time * 3600.,
+        'overhead' : sum(row['wall_time'] - row['raspa_time'] for row in materials) /
+                     max(len(materials), 1),
+        'parse_mb_per_s' : sum(row['bytes_written'] for row in stages) / 1e6 / parse_time
+                           if parse_time else None,
+        'db_rows_per_s' : db_rows / db_seconds if db_seconds else None,
+        'stages' : {stage : stats['wall_time'][50]
+                    for stage, stats in summary['stages'].items()},
+    }
+
+def bench_add_material(work_dir, names):
+    """Simulate every material with add_material_to_database, one after another."""
+    config = run_config(work_dir, 'bench_add_material')
+    start = time()
+    for name in names:
+        non_pseudo.non_pseudo.add_material_to_database(config, name)
+    wall_time = time() - start
+    commits = [row for row in find_stage_timings(config['run_id']) if row['stage'] == 'material']
+    return measures(config['run_id'], wall_time, len(commits),
+                    sum(row['commit_time'] for row in commits))
+
+def bench_worker(work_dir, jobs):
+    """Simulate every material with worker_run_loop and its background writer."""
+    run_id = 'bench_worker'
+    os.makedirs(run_id, exist_ok=True)
+    with open(os.path.join(run_id, 'config.yaml'), 'w') as config_file:
+        yaml.dump(run_config(work_dir, run_id), config_file, default_flow_style=False)
+    non_pseudo.non_pseudo.ResultWriter = TimedResultWriter
+    start = time()
+    try:
+        non_pseudo.non_pseudo.worker_run_loop(run_id, jobs)
+    finally:
+        # claim locks and spool files go to the run directory in the repository
+        shutil.rmtree(os.path.join(ROOT, run_id), ignore_errors=True)
+    wall_time = time() - start
+    return measures(run_id, wall_time, TimedResultWriter.rows, TimedResultWriter.seconds)
+
+def compare(results, baseline, tolerance):
+    """Print results next to the baseline; True if nothing regressed."""
+    passed = True
+    print('{:<16}{:<22}{:>12}{:>12}{:>10}'.format('mode', 'measure', 'result', 'baseline', 'change'))
+    for mode, values in results.items():
+        for measure, higher_is_better in MEASURES.items():
+            value = values.get(measure)
+            reference = baseline.get(mode, {}).get(measure)
+            change, flag = '', ''
+            if value is not None and reference:
+                ratio = value / reference if higher_is_better else reference / value
+                change = '{:+.1%}'.format(ratio - 1)
+                if ratio < 1 - tolerance:
+                    flag, passed = '  REGRESSION', False
+            print('{:<16}{:<22}{:>12}{:>12}{:>10}{}'.format(
+                mode, measure, '-' if value is None else '{:.3f}'.format(value),
+                '-' if reference is None else '{:.3f}'.format(reference), change, flag))
+    return passed
+
+@click.command()
+@click.option('--materials', '-n', default=20, help='Number of generated CIFs.')
+@click.option('--jobs', '-j', default=1, help='Worker processes for worker_run_loop.')
+@click.option('--output-size', '-s', default=0.1, help='Size of each output file [MB].')
+@click.option('--delay', '-d', default=0., help='Seconds each fake simulation sleeps.')
+@click.option('--baseline', '-b', default=os.path.join(BENCHMARKS, 'pipeline_baseline.json'),
+              type=click.Path(), help='Baseline results file.')
+@click.option('--save-baseline', is_flag=True, help='Store these results as the baseline.')
+@click.option('--tolerance', '-t', default=0.1, help='Allowed relative regression.')
+@click.option('--seed', default=0, help='Seed of the generated CIFs.')
+def bench(materials, jobs, output_size, delay, baseline, save_baseline, tolerance, seed):
+    import random
+    random.seed(seed)
+    baseline = os.path.abspath(baseline)
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, 'cifs'))
+        names = ['synthetic_{:04d}'.format(i) for i in range(materials)]
+        for name in names:
+            write_cif(os.path.join(work_dir, 'cifs', '{}.cif'.format(name)))
+
+        bin_dir = os.path.join(work_dir, 'bin')
+        os.makedirs(bin_dir)
+        with open(os.path.join(bin_dir, 'simulate'), 'w') as simulate:
+            simulate.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(
+                sys.executable, os.path.join(BENCHMARKS, 'fake_simulate.py')))
+        os.chmod(os.path.join(bin_dir, 'simulate'), 0o755)
+        os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+        os.environ['NPS_FAKE_OUTPUT_BYTES'] = str(int(output_size * 1e6))
+        os.environ['NPS_FAKE_DELAY'] = str(delay)
+
+        # the database engine reads settings/database.yaml from the working directory
+        os.makedirs(os.path.join(work_dir, 'settings'))
+        with open(os.path.join(work_dir, 'settings', 'database.yaml'), 'w') as db_file:
+            db_file.write('connection_string: sqlite:///{}\n'.format(
+                os.path.join(work_dir, 'bench.sqlite')))
+        os.chdir(work_dir)
+
+        results = {
+            'add_material' : bench_add_material(work_dir, names),
+            'worker_run_loop' : bench_worker(work_dir, jobs),
+        }
+        os.chdir(ROOT)
+
+    for mode, values in results.items():
+        print('\n{} : {} materials in {:.1f} s; median stage wall times [s] : {}'.format(
+            mode, values['materials'], values['wall_time'], ', '.join(
+                '{} {:.2f}'.format(stage, t) for stage, t in sorted(values['stages'].items()))))
+    print()
+    parameters = {'materials' : materials, 'jobs' : jobs, 'output_size' : output_size,
+                  'delay' : delay, 'seed' : seed}
+    reference = {}
+    if os.path.exists(baseline):
+        with open(baseline) as baseline_file:
+            saved = json.load(baseline_file)
+        reference = saved['results']
+        if saved['parameters'] != parameters:
+            print('WARNING: baseline was run with {}; results are not comparable.\n'.format(
+                saved['parameters']))
+    passed = compare(results, reference, tolerance)
+    if save_baseline:
+        with open(baseline, 'w') as baseline_file:
+            json.dump({'parameters' : parameters, 'results' : results},
+                      baseline_file, indent=2, sort_keys=True)
+        print('\nBaseline saved to {}'.format(baseline))
+    elif not passed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Stand-in for RASPA's `simulate` executable.
+
+Reads the RASPA input file non_pseudo wrote and, after sleeping
+$NPS_FAKE_DELAY seconds, writes the files the pipeline reads back: output files
+of about $NPS_FAKE_OUTPUT_BYTES bytes (void fraction, surface area, or gas
+adsorption at each pressure) with restart files, or the grid file of a
+MakeGrid run. bench_pipeline.py puts it on PATH as `simulate`.
+
+    NPS_FAKE_DELAY=0.5 python benchmarks/fake_simulate.py VoidFraction.input
+"""
+import os
+import sys
+from importlib.util import spec_from_file_location, module_from_spec
+from time import sleep
+
+from synthetic_output import write_gas_adsorption, write_void_fraction, write_surface_area
+
+# raspa_output is loaded on its own, without the non_pseudo packages, so the
+# stand-in starts about as fast as a compiled executable would
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_spec = spec_from_file_location('raspa_output', os.path.join(
+    ROOT, 'non_pseudo', 'simulation', 'raspa_output.py'))
+raspa_output = module_from_spec(_spec)
+_spec.loader.exec_module(raspa_output)
+
+def read_input(path):
+    """RASPA input keywords -> values; component keywords without 'Component N'."""
+    keywords = {}
+    with open(path) as input_file:
+        for line in input_file:
+            fields = line.split()
+            if len(fields) > 2 and fields[0] == 'Component':
+                fields = fields[2:]
+            if fields:
+                keywords[fields[0]] = fields[1:]
+    return keywords
+
+def make_grid(keywords, size):
+    grid_dir = os.path.join(os.environ['RASPA_DIR'], 'share', 'raspa', 'grids',
+                            keywords['Forcefield'][0], keywords['FrameworkName'][0],
+                            '%f' % float(keywords['SpacingVDWGrid'][0]))
+    os.makedirs(grid_dir, exist_ok=True)
+    for grid_type in keywords['GridTypes']:
+        with open(os.path.join(grid_dir, '%s_shifted.grid' % grid_type), 'wb') as grid_file:
+            grid_file.write(os.urandom(size))
+
+def main(input_file):
+    keywords = read_input(input_file)
+    size = int(os.environ.get('NPS_FAKE_OUTPUT_BYTES', 100000))
+    sleep(float(os.environ.get('NPS_FAKE_DELAY', 0)))
+    if keywords['SimulationType'][0] == 'MakeGrid':
+        make_grid(keywords, size)
+        return
+
+    name = keywords['FrameworkName'][0]
+    cells = [int(n) for n in keywords.get('UnitCells', [2, 2, 2])]
+    temperature = float(keywords.get('ExternalTemperature', [298.])[0])
+    pressures = [float(p) for p in keywords.get('ExternalPressure', [0.])]
+    cycles = int(keywords['NumberOfCycles'][0])
+    os.makedirs(os.path.join('Output', 'System_0'), exist_ok=True)
+    os.makedirs(os.path.join('Restart', 'System_0'), exist_ok=True)
+    for pressure in pressures:
+        path = os.path.join('Output', 'System_0', raspa_output.output_file_name(
+            name, cells, temperature, pressure))
+        if 'WidomProbability' in keywords:
+            write_void_fraction(path, size, cycles)
+        elif 'SurfaceAreaProbability' in keywords:
+            write_surface_area(path, size, cycles)
+        else:
+            write_gas_adsorption(path, size, cycles)
+            restart_path = os.path.join('Restart', 'System_0', raspa_output.restart_file_name(
+                name, cells, temperature, pressure))
+            with open(restart_path, 'w') as restart_file:
+                restart_file.write('Cell info:\n')
+
+if __name__ == '__main__':
+    main(sys.argv[1])
@@ -0,0 +1,110 @@
+"""Write RASPA-like output files and CIFs for benchmarks.
+
+Only the lines the parsers in `non_pseudo.simulation` read are realistic; the
+per-cycle blocks in between are filler of the same shape RASPA prints every
+`PrintEvery` cycles.
+"""
+import random
+
+_CYCLE_BLOCK = """Current cycle: {cycle} out of {cycles}
+========================================================================================================
+
+Net charge: 0 (F: 0, A: 0, C: 0)
+Current Box:  25.83200   0.00000   0.00000 [A]   Average Box:  25.83200   0.00000   0.00000 [A]
+              0.00000  25.83200   0.00000 [A]                 0.00000  25.83200   0.00000 [A]
+              0.00000   0.00000  25.83200 [A]                 0.00000   0.00000  25.83200 [A]
+Current total potential energy:      {energy:.5f} [K]  ({energy:.5f} [K])
+	Current Host-Host energy:                   0.00000 [K]  (avg.          0.00000 [K])
+	Current Host-Adsorbate energy:         {energy:.5f} [K]  (avg.     {energy:.5f} [K])
+	Current Adsorbate-Adsorbate energy:         0.00000 [K]  (avg.          0.00000 [K])
+
+"""
+
+_ENERGY_BLOCK = """Average {label} energy:
+======================
+	Block[ 0] {avg:.5f} Van der Waals: {avg:.5f} Coulomb: 0.00000 [K]
+	Block[ 1] {avg:.5f} Van der Waals: {avg:.5f} Coulomb: 0.00000 [K]
+	Block[ 2] {avg:.5f} Van der Waals: {avg:.5f} Coulomb: 0.00000 [K]
+	Block[ 3] {avg:.5f} Van der Waals: {avg:.5f} Coulomb: 0.00000 [K]
+	Block[ 4] {avg:.5f} Van der Waals: {avg:.5f} Coulomb: 0.00000 [K]
+	------------------------------------------------------------------------------
+	Average   {avg:.5f} Van der Waals: {avg:.5f} Coulomb: 0.00000 [K]
+	          +/- {err:.5f}          +/- {err:.5f}    +/- 0.00000 [K]
+
+"""
+
+_LOADING_BLOCK = """Component 0 [methane]
+-------------------------------------------------------------
+	Average loading absolute [molecules/unit cell]  {molecules:.10f} +/- {err:.10f} [-]
+	Average loading absolute [mol/kg framework]            {molar:.10f} +/- {err:.10f} [-]
+	Average loading absolute [milligram/gram framework]    {mg:.10f} +/- {err:.10f} [-]
+	Average loading absolute [cm^3 (STP)/gr framework]     {grav:.10f} +/- {err:.10f} [-]
+	Average loading absolute [cm^3 (STP)/cm^3 framework]   {vol:.10f} +/- {err:.10f} [-]
+
+	Average loading excess [molecules/unit cell]  {molecules:.10f} +/- {err:.10f} [-]
+	Average loading excess [mol/kg framework]            {molar:.10f} +/- {err:.10f} [-]
+	Average loading excess [milligram/gram framework]    {mg:.10f} +/- {err:.10f} [-]
+	Average loading excess [cm^3 (STP)/gr framework]     {grav:.10f} +/- {err:.10f} [-]
+	Average loading excess [cm^3 (STP)/cm^3 framework]   {vol:.10f} +/- {err:.10f} [-]
+
+"""
+
+def _write_cycles(output_file, cycles, size):
+    """Write filler blocks until the file is about `size` bytes."""
+    block_size = len(_CYCLE_BLOCK.format(cycle=0, cycles=cycles, energy=-1000.))
+    blocks = max(size // block_size, 1)
+    for i in range(blocks):
+        cycle = i * max(cycles // blocks, 1)
+        output_file.write(_CYCLE_BLOCK.format(
+            cycle=cycle, cycles=cycles, energy=-1000. - random.random()))
+
+def write_gas_adsorption(path, size=0, cycles=1000, loading=None):
+    """Write gas adsorption output file of about `size` bytes."""
+    loading = loading if loading is not None else random.uniform(50, 250)
+    with open(path, 'w') as output_file:
+        _write_cycles(output_file, cycles, size)
+        for label in ['Host-Host', 'Adsorbate-Adsorbate', 'Host-Adsorbate']:
+            avg = 0. if label == 'Host-Host' else -random.uniform(100, 2000)
+            output_file.write(_ENERGY_BLOCK.format(label=label, avg=avg, err=avg / 100))
+        output_file.write(_LOADING_BLOCK.format(
+            molecules=loading / 10, molar=loading / 30, mg=loading / 2,
+            grav=loading * 1.5, vol=loading, err=loading / 50))
+
+def write_void_fraction(path, size=0, cycles=1000, void_fraction=None):
+    """Write helium Widom insertion output file of about `size` bytes."""
+    void_fraction = void_fraction if void_fraction is not None else random.random()
+    with open(path, 'w') as output_file:
+        _write_cycles(output_file, cycles, size)
+        output_file.write(
+            '[helium] Average Widom Rosenbluth-weight:   {:.5f} +/- {:.5f} [-]\n'.format(
+                void_fraction, void_fraction / 100))
+
+def write_surface_area(path, size=0, cycles=100, surface_area=None):
+    """Write surface area output file of about `size` bytes."""
+    surface_area = surface_area if surface_area is not None else random.uniform(100, 4000)
+    with open(path, 'w') as output_file:
+        _write_cycles(output_file, cycles, size)
+        output_file.write(
+            '\tSurface area:   {0:.5f} +/- {1:.5f} [A^2]\n'
+            '\tSurface area:   {2:.5f} +/- {1:.5f} [m^2/g]\n'
+            '\tSurface area:   {3:.5f} +/- {1:.5f} [m^2/cm^3]\n'.format(
+                surface_area * 2, surface_area / 100, surface_area * 1.5, surface_area))
+
+def write_cif(path, lengths=None, atoms=None, elements=('C', 'H', 'O', 'N', 'Zn'),
+              angles=(90., 90., 90.)):
+    """Write CIF of a random framework (orthorhombic unless `angles` given)."""
+    lengths = lengths if lengths is not None else [random.uniform(10, 30) for i in range(3)]
+    atoms = atoms if atoms is not None else random.randint(20, 400)
+    with open(path, 'w') as cif_file:
+        cif_file.write('data_synthetic\n')
+        for axis, length in zip('abc', lengths):
+            cif_file.write('_cell_length_{}    {:.4f}\n'.format(axis, length))
+        for axis, angle in zip(['alpha', 'beta', 'gamma'], angles):
+            cif_file.write('_cell_angle_{}    {:.4f}\n'.format(axis, angle))
+        cif_file.write('_symmetry_space_group_name_H-M    \'P 1\'\n\nloop_\n'
+                       '_atom_site_label\n_atom_site_type_symbol\n'
+                       '_atom_site_fract_x\n_atom_site_fract_y\n_atom_site_fract_z\n')
+        for i in range(atoms):
+            element = random.choice(elements)
+            cif_file.write('{0}{1} {0} {2:.5f} {3:.5f} {4:.5f}\n'.format(
+                element, i + 1, random.random(), random.random(), random.random()))
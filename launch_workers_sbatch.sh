@@ -21,5 +21,9 @@ source ~/venv/htsohm/bin/activate
 
 cd $SLURM_SUBMIT_DIR
 sjs_launch_workers.sh $SLURM_CPUS_ON_NODE $stay_alive
+# or, to fill the node from a single process with one database connection
+# (--pin-cores gives each job as many cores as RASPA processes it runs at once,
+# concurrent_stages x retests: number, so divide the cores by that):
+# ./nps.py launch_worker $run_id --jobs $((SLURM_CPUS_ON_NODE / 6)) --pin-cores
 
 exit
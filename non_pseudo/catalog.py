@@ -0,0 +1,145 @@
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from non_pseudo import cif
+from non_pseudo.simulation.native_void_fraction import load_mixing_rules, framework_type
+from non_pseudo.simulation.staging import file_hash, force_field_directory
+
+# Lennard-Jones table of each catalog worker, loaded once per process
+_table = None
+
+def lj_table(path=None):
+    """Lennard-Jones parameters of framework elements as parallel arrays.
+
+    Args:
+        path (str): mixing rules file (default: force_field_mixing_rules.def
+            in the force field directory).
+
+    Returns:
+        table (tuple): (parameters, sigma, epsilon); `parameters` maps
+            pseudo-atom type -> row of the `sigma` and `epsilon` arrays.
+
+    """
+    if path is None:
+        path = os.path.join(force_field_directory(), 'force_field_mixing_rules.def')
+    parameters, shifted = load_mixing_rules(path)
+    rows = {key : i for i, key in enumerate(parameters)}
+    epsilon, sigma = np.array(list(parameters.values())).T
+    return rows, sigma, epsilon
+
+def average_sigma_epsilon(elements, counts, table):
+    """Atom-weighted average Lennard-Jones parameters of a framework.
+
+    Args:
+        elements (array): distinct elements of the framework.
+        counts (array): number of atom sites of each element.
+        table (tuple): from lj_table.
+
+    Returns:
+        sigma (float): average sigma [A].
+        epsilon (float): average epsilon [K].
+
+    Elements without parameters count towards the number of atoms but add
+    nothing to the sums.
+
+    """
+    rows, sigma, epsilon = table
+    index = np.array([rows.get(framework_type(e, rows), -1) for e in elements], dtype=int)
+    known = index >= 0
+    total = counts.sum()
+    return (counts[known] @ sigma[index[known]] / total,
+            counts[known] @ epsilon[index[known]] / total)
+
+def describe(path, table=None):
+    """Compute descriptors of a single CIF.
+
+    Args:
+        path (str): path to CIF.
+        table (tuple): from lj_table (default: this process's shared table).
+
+    Returns:
+        descriptors (dict): `name`, `sha256`, `volume` [A^3], `number_density`
+            [1 / A^3], `atoms`, `sigma` [A], `epsilon` [K], and `counts`
+            (element -> number of atom sites).
+
+    """
+    global _table
+    if table is None:
+        if _table is None:
+            _table = lj_table()
+        table = _table
+    crystal = cif.read_cif(path)
+    elements, counts = np.unique(cif.atom_types(crystal.labels), return_counts=True)
+    sigma, epsilon = average_sigma_epsilon(elements, counts, table)
+    return {
+        'name' : os.path.splitext(os.path.basename(path))[0],
+        'sha256' : file_hash(path),
+        'volume' : cif.volume(crystal),
+        'number_density' : cif.number_density(crystal),
+        'atoms' : int(counts.sum()),
+        'sigma' : sigma,
+        'epsilon' : epsilon,
+        'counts' : dict(zip(elements.tolist(), counts.tolist())),
+    }
+
+def build_catalog(paths, processes=None, chunksize=16):
+    """Describe CIFs in a process pool.
+
+    Args:
+        paths (list): paths to CIFs.
+        processes (int): number of worker processes (default: CPU count).
+        chunksize (int): CIFs handed to a worker at once.
+
+    Returns:
+        columns (dict): column name -> array, one row per CIF in `paths`.
+            Atom counts per element are in 'count_<element>' columns.
+
+    """
+    with Pool(processes) as pool:
+        rows = pool.map(describe, paths, chunksize)
+    elements = sorted({e for row in rows for e in row['counts']})
+    columns = {
+        'name' : np.array([row['name'] for row in rows], dtype=str),
+        'sha256' : np.array([row['sha256'] for row in rows], dtype=str),
+    }
+    for key in ['volume', 'number_density', 'sigma', 'epsilon']:
+        columns[key] = np.array([row[key] for row in rows], dtype=float)
+    columns['atoms'] = np.array([row['atoms'] for row in rows], dtype=int)
+    for element in elements:
+        columns['count_{}'.format(element)] = np.array(
+            [row['counts'].get(element, 0) for row in rows], dtype=int)
+    return columns
+
+def write_catalog(columns, path):
+    """Write catalog columns to a `.npz` or `.parquet` file.
+
+    Args:
+        columns (dict): from build_catalog.
+        path (str): output file; Parquet needs pyarrow.
+
+    """
+    if path.endswith('.parquet'):
+        import pyarrow
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(pyarrow.table(columns), path)
+    else:
+        np.savez(path, **columns)
+
+def load_catalog(path):
+    """Read a catalog written by write_catalog.
+
+    Args:
+        path (str): `.npz` or `.parquet` file.
+
+    Returns:
+        columns (dict): column name -> array.
+
+    """
+    if path.endswith('.parquet'):
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(path)
+        return {name : table.column(name).to_numpy() for name in table.column_names}
+    with np.load(path) as catalog:
+        return {name : catalog[name] for name in catalog.files}
@@ -0,0 +1,140 @@
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+# cell lengths [A] and angles [degrees] as float arrays of length 3, atom-site
+# labels as a str array and fractional coordinates as an (atoms, 3) array
+Crystal = namedtuple('Crystal', ['lengths', 'angles', 'labels', 'fractional'])
+
+_CELL_KEYS = {
+    '_cell_length_a' : ('lengths', 0),
+    '_cell_length_b' : ('lengths', 1),
+    '_cell_length_c' : ('lengths', 2),
+    '_cell_angle_alpha' : ('angles', 0),
+    '_cell_angle_beta' : ('angles', 1),
+    '_cell_angle_gamma' : ('angles', 2),
+}
+
+def _number(text):
+    """CIF number, without its standard uncertainty (ex. '12.345(6)')."""
+    return float(text.split('(')[0])
+
+def read_cif(path):
+    """Read cell parameters and atom sites from a CIF.
+
+    Args:
+        path (str): path to CIF.
+
+    Returns:
+        crystal (Crystal): cell lengths and angles, atom-site labels and
+            fractional coordinates. The arrays are read-only, since they are
+            shared by every caller.
+
+    The file is read once, line by line; the atom sites are taken from the
+    loop defining `_atom_site_fract_x`, wherever it is in the file. Parsed
+    files are kept in an LRU cache keyed by path, size and modification time,
+    so repeated reads of an unchanged file cost a stat.
+
+    """
+    stat = os.stat(path)
+    return _read_cif(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+@lru_cache(maxsize=1024)
+def _read_cif(path, size, mtime_ns):
+    cell = {'lengths' : np.zeros(3), 'angles' : np.full(3, 90.)}
+    labels, fractional = [], []
+    loop_headers, in_loop, loop_rows = [], False, False
+    columns = None
+    with open(path) as cif:
+        for line in cif:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.lower() == 'loop_':
+                loop_headers, in_loop, loop_rows = [], True, False
+                continue
+            fields = line.split()
+            if line.startswith('_'):
+                if in_loop and not loop_rows:
+                    loop_headers.append(fields[0])
+                    continue
+                in_loop = False
+                if fields[0] in _CELL_KEYS and len(fields) > 1:
+                    key, index = _CELL_KEYS[fields[0]]
+                    cell[key][index] = _number(fields[1])
+                continue
+            if not in_loop:
+                continue
+            if not loop_rows:
+                loop_rows = True
+                columns = None
+                if '_atom_site_fract_x' in loop_headers:
+                    columns = [loop_headers.index(h) for h in (
+                        '_atom_site_label', '_atom_site_fract_x',
+                        '_atom_site_fract_y', '_atom_site_fract_z')]
+            if columns is not None and len(fields) == len(loop_headers):
+                labels.append(fields[columns[0]])
+                fractional.append([_number(fields[i]) for i in columns[1:]])
+    crystal = Crystal(cell['lengths'], cell['angles'], np.array(labels, dtype=str),
+                      np.array(fractional, dtype=float).reshape(-1, 3))
+    for array in crystal:
+        array.flags.writeable = False
+    return crystal
+
+def lattice_vectors(lengths, angles):
+    """Cartesian lattice vectors of a cell.
+
+    Args:
+        lengths (array): a, b and c [A].
+        angles (array): alpha, beta and gamma [degrees].
+
+    Returns:
+        lattice (array): (3, 3) array with a, b and c as rows; a along x and
+            b in the xy-plane.
+
+    """
+    a, b, c = lengths
+    alpha, beta, gamma = np.radians(angles)
+    cx = c * np.cos(beta)
+    cy = c * (np.cos(alpha) - np.cos(beta) * np.cos(gamma)) / np.sin(gamma)
+    return np.array([
+        [a, 0., 0.],
+        [b * np.cos(gamma), b * np.sin(gamma), 0.],
+        [cx, cy, np.sqrt(c ** 2 - cx ** 2 - cy ** 2)],
+    ])
+
+def atom_types(labels):
+    """Chemical species of atom-site labels.
+
+    Args:
+        labels (array): atom-site labels (ex. 'Zn12').
+
+    Returns:
+        types (list): labels without digits (ex. 'Zn').
+
+    """
+    return [''.join(i for i in label if not i.isdigit()) for label in labels]
+
+def perpendicular_widths(crystal):
+    """Distances [A] between opposite faces of the unit cell.
+
+    Args:
+        crystal (Crystal): framework.
+
+    Returns:
+        widths (array): widths perpendicular to the bc, ca and ab planes.
+
+    """
+    lattice = lattice_vectors(crystal.lengths, crystal.angles)
+    areas = np.linalg.norm(np.cross(lattice[[1, 2, 0]], lattice[[2, 0, 1]]), axis=1)
+    return abs(np.linalg.det(lattice)) / areas
+
+def volume(crystal):
+    """Unit cell volume [A^3], for any cell angles."""
+    return abs(np.linalg.det(lattice_vectors(crystal.lengths, crystal.angles)))
+
+def number_density(crystal):
+    """Atom sites per unit cell volume [1 / A^3]."""
+    return len(crystal.labels) / volume(crystal)
@@ -2,27 +2,169 @@
 
 # standard library imports
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import threading
+from contextlib import contextmanager
 import yaml
 
-# Init the database
-with open(os.path.join('settings', 'database.yaml'), 'r') as yaml_file:
-    dbconfig = yaml.load(yaml_file)
-connection_string = dbconfig['connection_string']
-if 'sqlite' in connection_string:
-    print(
-        'WARNING: attempting to use SQLite database! Okay for local debugging\n' +
-        'but will not work with multiple workers, due to lack of locking features.'
-    )
-engine = create_engine(connection_string)
-session = sessionmaker(bind=engine)()
-
 # Import all models
 from non_pseudo.db.base import Base
 from non_pseudo.db.material import Material
+from non_pseudo.db.work_claim import WorkClaim
+from non_pseudo.db.isotherm_point import IsothermPoint
+from non_pseudo.db.stage_timing import StageTiming
+
+# settings/database.yaml keys passed on to the connection pool
+POOL_OPTIONS = ['pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'pool_pre_ping']
+
+_engine = None
+_Session = None
+_pid = None
+_lock = threading.Lock()
+
+def _check_pid():
+    """Drop connections and sessions inherited from a parent process.
+
+    After a fork (ex. an rq work-horse or a pool worker) the child must not use
+    the parent's connections. They are discarded without being closed, which
+    would also close them for the parent, and the pool opens new ones on
+    demand.
+
+    """
+    global _Session, _pid
+    if _pid == os.getpid():
+        return
+    if _engine is not None:
+        try:
+            _engine.dispose(close=False)
+        except TypeError:
+            # SQLAlchemy < 1.4.33 can't dispose without closing; the checkout
+            # listener in get_engine replaces inherited connections instead
+            pass
+    _Session = None
+    _pid = os.getpid()
+
+def _track_pid(engine):
+    """Refuse to hand out a pooled connection in a process that didn't open it."""
+    from sqlalchemy import event, exc
+
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @event.listens_for(engine, 'checkout')
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info['pid'] != pid:
+            connection_record.connection = connection_proxy.connection = None
+            raise exc.DisconnectionError(
+                'Connection record belongs to pid {}, attempting to check out in pid {}'.format(
+                    connection_record.info['pid'], pid))
+
+def get_engine():
+    """Database engine of this process, created on first use.
+
+    Returns:
+        engine (sqlalchemy.engine.Engine): engine for `connection_string` in
+            settings/database.yaml, with the pool sized by `pool_size`,
+            `max_overflow`, `pool_timeout`, `pool_recycle` and `pool_pre_ping`
+            there (ignored for SQLite).
+
+    Tables that don't exist yet are created when the engine is, and columns
+    missing from existing tables are added (see add_missing_columns), so
+    importing the models costs no database round trip. A process forked from
+    one that used the engine gets a fresh pool.
+
+    """
+    global _engine
+    with _lock:
+        _check_pid()
+        if _engine is None:
+            from sqlalchemy import create_engine
+            with open(os.path.join('settings', 'database.yaml'), 'r') as yaml_file:
+                dbconfig = yaml.load(yaml_file)
+            connection_string = dbconfig['connection_string']
+            if 'sqlite' in connection_string:
+                print(
+                    'WARNING: attempting to use SQLite database! Okay for local debugging\n' +
+                    'but will not work with multiple workers, due to lack of locking features.'
+                )
+                pool_options = {}
+            else:
+                pool_options = {key : dbconfig[key] for key in POOL_OPTIONS if key in dbconfig}
+            engine = create_engine(connection_string, **pool_options)
+            _track_pid(engine)
+            # Create tables in the engine, if they don't exist already.
+            Base.metadata.create_all(engine)
+            add_missing_columns(engine)
+            Base.metadata.bind = engine
+            _engine = engine
+    return _engine
+
+def add_missing_columns(engine):
+    """Add model columns that existing tables lack.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): database to upgrade.
+
+    create_all never alters an existing table, so a database written by an
+    earlier version lacks the columns added since (ex. `*_stop_cycle`,
+    `*_error_estimate`, `*_replicas`, `*_spread` and `ga_isotherm_points` in
+    materials). They are added with ALTER TABLE; rows written before read
+    them as NULL. A column another worker adds first is left alone.
+
+    """
+    from sqlalchemy import inspect, text
+    from sqlalchemy.exc import DBAPIError
+    quote = engine.dialect.identifier_preparer.quote
+    for table in Base.metadata.sorted_tables:
+        existing = {column['name'] for column in inspect(engine).get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            statement = 'ALTER TABLE {} ADD COLUMN {} {}'.format(
+                quote(table.name), quote(column.name), column.type.compile(dialect=engine.dialect))
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text(statement))
+            except DBAPIError:
+                columns = inspect(engine).get_columns(table.name)
+                if column.name not in {c['name'] for c in columns}:
+                    raise
+                continue
+            print('Added column {}.{}'.format(table.name, column.name))
+
+def get_session():
+    """Session of the calling thread, created on first use.
+
+    Returns:
+        session (sqlalchemy.orm.Session): bound to get_engine(); the same
+            object for every call from a thread until session_scope ends.
+
+    """
+    global _Session
+    engine = get_engine()
+    with _lock:
+        if _Session is None:
+            from sqlalchemy.orm import scoped_session, sessionmaker
+            _Session = scoped_session(sessionmaker(bind=engine))
+        return _Session()
+
+@contextmanager
+def session_scope():
+    """Session for one unit of work (ex. an rq job).
+
+    Yields:
+        session (sqlalchemy.orm.Session): from get_session; committed if the
+            block succeeds, rolled back if it raises, and removed afterwards so
+            its connection goes back to the pool.
 
-# Create tables in the engine, if they don't exist already.
-Base.metadata.create_all(engine)
-Base.metadata.bind = engine
+    """
+    session = get_session()
+    try:
+        yield session
+        session.commit()
+    except:
+        session.rollback()
+        raise
+    finally:
+        _Session.remove()
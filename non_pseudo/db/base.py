@@ -30,5 +30,17 @@ class Base(object):
         for k, v in d.items():
             setattr(self, k, v)
 
+    def to_dict(self):
+        """Collect column values into a dictionary.
+
+        Args:
+            self (class): class name.
+
+        Returns:
+            d (dict): column name -> value, for every column in the table.
+
+        """
+        return {col.name : getattr(self, col.name) for col in self.__table__.columns}
+
 from sqlalchemy.ext.declarative import declarative_base
 Base = declarative_base(cls=Base)
@@ -0,0 +1,168 @@
+import fcntl
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+import non_pseudo
+from non_pseudo.db import get_engine, get_session
+from non_pseudo.db.work_claim import WorkClaim
+
+def worker_id():
+    """Identify this worker process.
+
+    Returns:
+        worker_id (str): '<hostname>:<pid>'.
+
+    """
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+@contextmanager
+def _claim_lock(run_id):
+    """Serialize claiming between workers when the database can't.
+
+    Args:
+        run_id (str): identification string for run.
+
+    PostgreSQL rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so no
+    lock is taken. SQLite has no row locks; workers sharing the database file
+    take an exclusive lock on `<run_id>/claims.lock` instead.
+
+    """
+    if get_engine().dialect.name != 'sqlite':
+        yield
+        return
+    non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+    run_dir = os.path.join(non_pseudo_dir, run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, 'claims.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def seed_claims(run_id, names):
+    """Add unclaimed rows for materials not yet in the work-claim table.
+
+    Args:
+        run_id (str): identification string for run.
+        names (list): names of materials in the run.
+
+    Safe to call from every worker at startup; rows inserted concurrently by
+    another worker are skipped.
+
+    """
+    session = get_session()
+    for attempt in range(3):
+        with _claim_lock(run_id):
+            existing = {row[0] for row in session.query(WorkClaim.material).filter(
+                WorkClaim.run_id == run_id)}
+            new = [name for name in names if name not in existing]
+            session.add_all([WorkClaim(run_id, name) for name in new])
+            try:
+                session.commit()
+                return
+            except IntegrityError:
+                session.rollback()
+    raise RuntimeError('Could not seed work claims for run {}'.format(run_id))
+
+def claim_materials(run_id, worker, batch_size, expire_after):
+    """Atomically claim a batch of materials for this worker.
+
+    Args:
+        run_id (str): identification string for run.
+        worker (str): id of claiming worker.
+        batch_size (int): maximum number of materials to claim.
+        expire_after (float): seconds without a heartbeat after which another
+            worker's claim is considered dead and can be taken over.
+
+    Returns:
+        names (list): names of claimed materials; empty when nothing is left.
+
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=expire_after)
+    session = get_session()
+    with _claim_lock(run_id):
+        query = session.query(WorkClaim).filter(
+            WorkClaim.run_id == run_id,
+            WorkClaim.completed == False,
+            or_(WorkClaim.worker_id == None, WorkClaim.heartbeat_at < stale)
+        ).order_by(WorkClaim.id).limit(batch_size)
+        if get_engine().dialect.name == 'postgresql':
+            query = query.with_for_update(skip_locked=True)
+        claims = query.all()
+        for claim in claims:
+            if claim.worker_id is not None:
+                print('Reclaiming {} from dead worker {}'.format(
+                    claim.material, claim.worker_id))
+            claim.worker_id = worker
+            claim.claimed_at = now
+            claim.heartbeat_at = now
+        names = [claim.material for claim in claims]
+        session.commit()
+    return names
+
+def complete_claim(run_id, name):
+    """Mark material as done, so no worker claims it again.
+
+    Args:
+        run_id (str): identification string for run.
+        name (str): name of material.
+
+    """
+    get_engine().execute(WorkClaim.__table__.update().where(and_(
+        WorkClaim.run_id == run_id, WorkClaim.material == name)).values(completed=True))
+
+def release_claims(run_id, worker):
+    """Return this worker's unfinished claims to the pool.
+
+    Args:
+        run_id (str): identification string for run.
+        worker (str): id of worker giving up its claims.
+
+    """
+    get_engine().execute(WorkClaim.__table__.update().where(and_(
+        WorkClaim.run_id == run_id,
+        WorkClaim.worker_id == worker,
+        WorkClaim.completed == False)).values(worker_id=None))
+
+def heartbeat(run_id, worker):
+    """Refresh this worker's claims so they don't expire.
+
+    Args:
+        run_id (str): identification string for run.
+        worker (str): id of worker.
+
+    """
+    get_engine().execute(WorkClaim.__table__.update().where(and_(
+        WorkClaim.run_id == run_id,
+        WorkClaim.worker_id == worker,
+        WorkClaim.completed == False)).values(heartbeat_at=datetime.utcnow()))
+
+def start_heartbeat(run_id, worker, interval):
+    """Refresh this worker's claims from a background thread.
+
+    Args:
+        run_id (str): identification string for run.
+        worker (str): id of worker.
+        interval (float): seconds between heartbeats.
+
+    Returns:
+        stop (threading.Event): set to stop the heartbeat thread.
+
+    """
+    stop = threading.Event()
+    def beat():
+        while not stop.wait(interval):
+            try:
+                heartbeat(run_id, worker)
+            except Exception as err:
+                print('Heartbeat failed : {}'.format(err))
+    threading.Thread(target=beat, daemon=True).start()
+    return stop
@@ -0,0 +1,61 @@
+from sqlalchemy import Column, Integer, String, Float, UniqueConstraint
+
+from non_pseudo.db import Base
+
+class IsothermPoint(Base):
+    """Declarative class mapping to table of gas adsorption isotherm points.
+
+    Attributes:
+        run_id (str): identification string for run.
+        name (str): name of material.
+        pressure (float): external pressure [Pa].
+        temperature (float): external temperature [K].
+        error_estimate (float): error of the absolute volumetric loading.
+        stop_cycle (int): number of production cycles simulated.
+
+    Loading and energy columns match the `ga0_*` columns of Material.
+
+    """
+    __tablename__ = 'isotherm_points'
+    __table_args__ = (
+        UniqueConstraint('run_id', 'name', 'pressure',
+                         name='uq_isotherm_points_run_id_name_pressure'),
+    )
+    # COLUMN                                                 UNITS
+    id = Column(Integer, primary_key=True)                 # dimm.
+    run_id = Column(String(50), nullable=False)
+    name = Column(String(150), nullable=False)
+    pressure = Column(Float, nullable=False)               # Pa
+    temperature = Column(Float)                            # K
+
+    absolute_volumetric_loading = Column(Float)            # cm^3 / cm^3
+    absolute_gravimetric_loading = Column(Float)           # cm^3 / g
+    absolute_molar_loading = Column(Float)                 # mol / kg
+    excess_volumetric_loading = Column(Float)              # cm^3 / cm^3
+    excess_gravimetric_loading = Column(Float)             # cm^3 / g
+    excess_molar_loading = Column(Float)                   # mol /kg
+    host_host_avg = Column(Float)                          # K
+    host_host_vdw = Column(Float)                          # K
+    host_host_cou = Column(Float)                          # K
+    adsorbate_adsorbate_avg = Column(Float)                # K
+    adsorbate_adsorbate_vdw = Column(Float)                # K
+    adsorbate_adsorbate_cou = Column(Float)                # K
+    host_adsorbate_avg = Column(Float)                     # K
+    host_adsorbate_vdw = Column(Float)                     # K
+    host_adsorbate_cou = Column(Float)                     # K
+
+    error_estimate = Column(Float)                         # cm^3 / cm^3
+    stop_cycle = Column(Integer)                           # cycles
+
+    def __init__(self, run_id, name, pressure):
+        """Init isotherm-point row.
+
+        Args:
+            run_id (str): identification string for run.
+            name (str): name of material.
+            pressure (float): external pressure [Pa].
+
+        """
+        self.run_id = run_id
+        self.name = name
+        self.pressure = pressure
@@ -2,10 +2,10 @@
 import sys
 import uuid
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Float, Boolean
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Float, Boolean
 from sqlalchemy.sql import text
 
-from non_pseudo.db import Base, session, engine
+from non_pseudo.db import Base
 
 class Material(Base):
     """Declarative class mapping to table storing material/simulation data.
@@ -13,6 +13,9 @@ class Material(Base):
     Attributes:
     """
     __tablename__ = 'materials'
+    __table_args__ = (
+        Index('ix_materials_run_id_name', 'run_id', 'name'),
+    )
     # COLUMN                                                 UNITS
     id = Column(Integer, primary_key=True)                 # dimm.
     name = Column(String(150))
@@ -54,13 +57,32 @@ class Material(Base):
     ga1_host_adsorbate_vdw = Column(Float)                     # K
     ga1_host_adsorbate_cou = Column(Float)                     # K
 
+    # gas adsorption convergence
+    ga_stop_cycle = Column(Integer)                            # cycles
+    ga0_error_estimate = Column(Float)                         # cm^3 / cm^3
+    ga1_error_estimate = Column(Float)                         # cm^3 / cm^3
+    ga_replicas = Column(Integer)                              # dimm.
+
+    # gas adsorption isotherm (points in the isotherm_points table)
+    ga_isotherm_points = Column(Integer)                       # dimm.
+    ga0_spread = Column(Float)                                 # cm^3 / cm^3
+    ga1_spread = Column(Float)                                 # cm^3 / cm^3
+
     # surface area
     sa_unit_cell_surface_area = Column(Float)                 # angstroms ^ 2
     sa_volumetric_surface_area = Column(Float)                # m^2 / cm^3
     sa_gravimetric_surface_area = Column(Float)               # m^2 / g
+    sa_stop_cycle = Column(Integer)                           # cycles
+    sa_error_estimate = Column(Float)                         # m^2 / cm^3
+    sa_replicas = Column(Integer)                             # dimm.
+    sa_spread = Column(Float)                                 # m^2 / cm^3
 
     # void fraction
     vf_helium_void_fraction = Column(Float)                   # dimm.
+    vf_stop_cycle = Column(Integer)                           # cycles
+    vf_error_estimate = Column(Float)                         # dimm.
+    vf_replicas = Column(Integer)                             # dimm.
+    vf_spread = Column(Float)                                 # dimm.
 
     # check that all data is present
     data_complete = Column(Boolean, server_default="0")
@@ -0,0 +1,58 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Index
+
+from non_pseudo.db import Base
+
+class StageTiming(Base):
+    """Declarative class mapping to table of per-stage timings and resource use.
+
+    Attributes:
+        run_id (str): identification string for run.
+        name (str): name of material.
+        stage (str): simulation name (ex. 'gas_adsorption'), 'energy_grid', or
+            'material' for everything done for the material.
+        started_at (float): start of the stage (s since the epoch).
+        wall_time (float): wall time of the stage.
+        cpu_time (float): CPU time of the stage's threads and RASPA processes.
+        raspa_time (float): wall time spent waiting on RASPA.
+        staging_time (float): wall time spent linking input files.
+        parse_time (float): wall time spent parsing RASPA output.
+        commit_time (float): wall time spent handing results to the database.
+        max_rss (int): peak resident set size of a RASPA process.
+        bytes_written (int): size of the files simulations left behind.
+        retries (int): number of retried RASPA runs.
+
+    """
+    __tablename__ = 'stage_timings'
+    __table_args__ = (
+        Index('ix_stage_timings_run_id_stage', 'run_id', 'stage'),
+    )
+    # COLUMN                                                 UNITS
+    id = Column(Integer, primary_key=True)                 # dimm.
+    run_id = Column(String(50), nullable=False)
+    name = Column(String(150), nullable=False)
+    stage = Column(String(50), nullable=False)
+    started_at = Column(Float, nullable=False)             # s
+    wall_time = Column(Float)                              # s
+    cpu_time = Column(Float)                               # s
+    raspa_time = Column(Float)                             # s
+    staging_time = Column(Float)                           # s
+    parse_time = Column(Float)                             # s
+    commit_time = Column(Float)                            # s
+    max_rss = Column(Integer)                              # kB
+    bytes_written = Column(BigInteger)                     # bytes
+    retries = Column(Integer)                              # dimm.
+
+    def __init__(self, run_id, name, stage, started_at):
+        """Init stage-timing row.
+
+        Args:
+            run_id (str): identification string for run.
+            name (str): name of material.
+            stage (str): stage name.
+            started_at (float): start of the stage (s since the epoch).
+
+        """
+        self.run_id = run_id
+        self.name = name
+        self.stage = stage
+        self.started_at = started_at
@@ -1,46 +1,110 @@
 import sys
 import uuid
 
-from sqlalchemy import MetaData, Table, select
-
-from non_pseudo.db import Base, session, engine
-
-meta = MetaData(bind=engine)
-materials = Table('materials', meta, autoload=True)
-
-#def check_for_data(name):
-#    result = engine.execute(select(
-##        
-##        [materials.c.name]))
-##
-##    exists = False
-##    name = None
-##    for row in result:
-##        name = row[0]
-##    result.close()
-##    if name != None:
-##        exists = True
-#
-#                [materials.c.ga0_absolute_volumetric_loading,
-#                    materials.c.ga1_absolute_volumetric_loading,
-#                    materials.c.sa_volumetric_surface_area,
-#                    materials.c.vf_helium_void_fraction],
-#                materials.c.name == name
-#            )
-#        )
-#    exists = False
-#    g0 = None
-#    g1 = None
-#    s = None
-#    v = None
-#    for row in result:
-#        g0 = row[0]
-#        g1 = row[1]
-#        s = row[2]
-#        v = row[3]
-#    result.close()
-#    if g0 != None and g1 != None and s != None and v != None:
-#        exists = True
-#
-#    return exists
-#
+from sqlalchemy import select, and_, or_
+
+from non_pseudo.db import get_engine, get_session
+from non_pseudo.db.material import Material
+from non_pseudo.db.isotherm_point import IsothermPoint
+from non_pseudo.db.stage_timing import StageTiming
+
+materials = Material.__table__
+
+def find_completed_materials(run_id):
+    """Find materials with all simulations finished.
+
+    Args:
+        run_id (str): identification string for run.
+
+    Returns:
+        names (set): names of materials with `data_complete` set.
+
+    """
+    result = get_engine().execute(
+        select([materials.c.name]).where(
+            and_(materials.c.run_id == run_id, materials.c.data_complete == True)))
+    names = {row[0] for row in result}
+    result.close()
+    return names
+
+def find_incomplete_materials(run_id):
+    """Find materials left partially simulated by an interrupted worker.
+
+    Args:
+        run_id (str): identification string for run.
+
+    Returns:
+        materials (dict): name -> Material, for rows without `data_complete`.
+
+    """
+    rows = get_session().query(Material).filter(
+        Material.run_id == run_id,
+        or_(Material.data_complete == False, Material.data_complete == None))
+    return {material.name : material for material in rows}
+
+def find_material(run_id, name):
+    """Find row for material, if one exists.
+
+    Args:
+        run_id (str): identification string for run.
+        name (str): name of material.
+
+    Returns:
+        material (Material): row, or None.
+
+    """
+    return get_session().query(Material).filter(
+        Material.run_id == run_id, Material.name == name).first()
+
+def store_isotherm_points(session, run_id, name, points):
+    """Add or update a material's isotherm points.
+
+    Args:
+        session (sqlalchemy.orm.Session): session to add rows to; not committed.
+        run_id (str): identification string for run.
+        name (str): name of material.
+        points (list): column values of each point, including `pressure`.
+
+    """
+    existing = {point.pressure : point for point in session.query(IsothermPoint).filter(
+        IsothermPoint.run_id == run_id, IsothermPoint.name == name)}
+    for values in points:
+        point = existing.get(values['pressure'])
+        if point is None:
+            point = IsothermPoint(run_id, name, values['pressure'])
+            session.add(point)
+        point.update_from_dict(values)
+
+def store_stage_timings(session, run_id, name, timings):
+    """Add a material's stage timings that aren't stored yet.
+
+    Args:
+        session (sqlalchemy.orm.Session): session to add rows to; not committed.
+        run_id (str): identification string for run.
+        name (str): name of material.
+        timings (list): column values of each stage, including `stage` and
+            `started_at`, which identify a row.
+
+    """
+    existing = {(stage, started_at) for stage, started_at in session.query(
+        StageTiming.stage, StageTiming.started_at).filter(
+        StageTiming.run_id == run_id, StageTiming.name == name)}
+    for values in timings:
+        if (values['stage'], values['started_at']) in existing:
+            continue
+        timing = StageTiming(run_id, name, values['stage'], values['started_at'])
+        timing.update_from_dict(values)
+        session.add(timing)
+
+def find_stage_timings(run_id):
+    """Find stage timings of a run.
+
+    Args:
+        run_id (str): identification string for run.
+
+    Returns:
+        timings (list): column values of each row, as dicts.
+
+    """
+    return [timing.to_dict() for timing in get_session().query(StageTiming).filter(
+        StageTiming.run_id == run_id)]
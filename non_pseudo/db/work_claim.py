@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, UniqueConstraint
+
+from non_pseudo.db import Base
+
+class WorkClaim(Base):
+    """Declarative class mapping to table of materials claimed by workers.
+
+    Attributes:
+        run_id (str): identification string for run.
+        material (str): name of material.
+        worker_id (str): host and pid of worker holding the claim, or None.
+        claimed_at (datetime): when the claim was taken (UTC).
+        heartbeat_at (datetime): last time the worker reported alive (UTC).
+        completed (bool): results for the material are in the database.
+
+    """
+    __tablename__ = 'work_claims'
+    __table_args__ = (
+        UniqueConstraint('run_id', 'material', name='uq_work_claims_run_id_material'),
+    )
+    id = Column(Integer, primary_key=True)
+    run_id = Column(String(50), nullable=False)
+    material = Column(String(150), nullable=False)
+    worker_id = Column(String(100))
+    claimed_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    completed = Column(Boolean, default=False, nullable=False)
+
+    def __init__(self, run_id, material):
+        """Init work-claim row.
+
+        Args:
+            run_id (str): identification string for run.
+            material (str): name of material.
+
+        """
+        self.run_id = run_id
+        self.material = material
+        self.completed = False
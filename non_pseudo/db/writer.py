@@ -0,0 +1,226 @@
+import glob
+import json
+import os
+import queue
+import socket
+import threading
+from time import time
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from non_pseudo.db import get_engine
+from non_pseudo.db.material import Material
+from non_pseudo.db.utilities import store_isotherm_points, store_stage_timings
+from non_pseudo.db.work_claim import WorkClaim
+
+def database_unavailable(err):
+    """Check whether a failed write is worth retrying later as it is.
+
+    Lost connections and operational errors (ex. the server restarting, or a
+    locked SQLite file) are; errors caused by the rows themselves (ex.
+    IntegrityError, DataError, or a TypeError from a bad value) are not.
+
+    """
+    return isinstance(err, DBAPIError) and (
+        err.connection_invalidated or isinstance(err, (OperationalError, InterfaceError)))
+
+class ResultWriter(object):
+    """Write material results to the database from a background thread.
+
+    Results are buffered and written with bulk inserts/updates every
+    `batch_size` materials or `flush_interval` seconds, whichever comes first.
+    Isotherm points and stage timings passed along under 'isotherm' and
+    'timings' keys are written to their own tables in the same transaction.
+    While the database can't be reached, results are spooled to a local file
+    and written on the next successful flush, so workers never wait on the
+    database. If a batch fails for another reason, its rows are written one at
+    a time and those that still fail are set aside in a quarantine file next
+    to the spool file, so one bad row doesn't hold up the others.
+
+    """
+
+    def __init__(self, spool_dir, batch_size=50, flush_interval=30.):
+        """Start writer thread.
+
+        Args:
+            spool_dir (str): directory for spool files (ex. run directory).
+            batch_size (int): number of buffered materials that triggers a flush.
+            flush_interval (float): maximum seconds between flushes.
+
+        """
+        self.spool_dir = spool_dir
+        self.spool_path = os.path.join(spool_dir, 'spool_{}_{}.jsonl'.format(
+            socket.gethostname(), os.getpid()))
+        self.quarantine_path = os.path.join(spool_dir, 'quarantine_{}_{}.jsonl'.format(
+            socket.gethostname(), os.getpid()))
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.session = sessionmaker(bind=get_engine())()
+        self._queue = queue.Queue()
+        self._buffer = {}
+        self._adopt_orphaned_spools()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, results):
+        """Queue snapshot of a material's results.
+
+        Args:
+            results (dict): column values, including `run_id` and `name`. A
+                later snapshot of the same material replaces an earlier one.
+
+        """
+        self._queue.put(dict(results))
+
+    def close(self):
+        """Flush remaining results and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+        self.session.close()
+
+    def _run(self):
+        last_flush = time()
+        while True:
+            timeout = max(self.flush_interval - (time() - last_flush), 0)
+            try:
+                results = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                results = False
+            if results:
+                self._buffer[(results['run_id'], results['name'])] = results
+            if (results is None or len(self._buffer) >= self.batch_size or
+                    time() - last_flush >= self.flush_interval):
+                try:
+                    self._flush()
+                except Exception as err:
+                    # keep the thread alive; results not written are still
+                    # buffered and retried on the next flush
+                    print('ERROR: flushing results failed : {!r}'.format(err))
+                last_flush = time()
+            if results is None:
+                return
+
+    def _flush(self):
+        """Write buffered and spooled results in one transaction."""
+        rows = self._read_spool(self.spool_path)
+        rows.update(self._buffer)
+        self._buffer = {}
+        if not rows:
+            return
+        unwritten = self._write_rows(rows)
+        if unwritten:
+            try:
+                self._write_spool(self.spool_path, unwritten)
+            except Exception:
+                unwritten.update(self._buffer)
+                self._buffer = unwritten
+                raise
+        elif os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
+
+    def _write_rows(self, rows):
+        """Write rows in one transaction, or one by one if that fails.
+
+        Args:
+            rows (dict): (run_id, name) -> results.
+
+        Returns:
+            unwritten (dict): rows to spool because the database is unavailable.
+
+        """
+        try:
+            self._write(list(rows.values()))
+            print('Wrote results for {} materials.'.format(len(rows)))
+            return {}
+        except Exception as err:
+            self.session.rollback()
+            if database_unavailable(err):
+                print('WARNING: database unavailable, spooling {} results to {} : {}'.format(
+                    len(rows), self.spool_path, err))
+                return rows
+            print('WARNING: writing {} results failed, writing them one at a time : {!r}'.format(
+                len(rows), err))
+        unwritten = dict(rows)
+        for key, row in rows.items():
+            try:
+                self._write([row])
+            except Exception as err:
+                self.session.rollback()
+                if database_unavailable(err):
+                    print('WARNING: database unavailable, spooling {} results to {} : {}'.format(
+                        len(unwritten), self.spool_path, err))
+                    return unwritten
+                self._quarantine(row, err)
+            del unwritten[key]
+        return {}
+
+    def _quarantine(self, row, err):
+        """Set aside a row the database rejects, with the error, for inspection."""
+        print('ERROR: results for {} rejected, quarantined in {} : {!r}'.format(
+            row.get('name'), self.quarantine_path, err))
+        with open(self.quarantine_path, 'a') as quarantine_file:
+            quarantine_file.write(json.dumps({'error' : repr(err), 'row' : row}, default=repr) + '\n')
+
+    def _write(self, rows):
+        for run_id in {row['run_id'] for row in rows}:
+            run_rows = [dict(row) for row in rows if row['run_id'] == run_id]
+            for row in run_rows:
+                points = row.pop('isotherm', None)
+                if points:
+                    store_isotherm_points(self.session, run_id, row['name'], points)
+                timings = row.pop('timings', None)
+                if timings:
+                    store_stage_timings(self.session, run_id, row['name'], timings)
+            names = [row['name'] for row in run_rows]
+            existing = dict(self.session.query(Material.name, Material.id).filter(
+                Material.run_id == run_id, Material.name.in_(names)))
+            inserts = [row for row in run_rows if row['name'] not in existing]
+            updates = [dict(row, id=existing[row['name']])
+                       for row in run_rows if row['name'] in existing]
+            self.session.bulk_insert_mappings(Material, inserts)
+            self.session.bulk_update_mappings(Material, updates)
+            completed = [row['name'] for row in run_rows if row.get('data_complete')]
+            if completed:
+                self.session.query(WorkClaim).filter(
+                    WorkClaim.run_id == run_id, WorkClaim.material.in_(completed)
+                ).update({'completed' : True}, synchronize_session=False)
+        self.session.commit()
+
+    def _adopt_orphaned_spools(self):
+        """Take over spool files left by dead writers on this host."""
+        pattern = os.path.join(self.spool_dir, 'spool_{}_*.jsonl'.format(socket.gethostname()))
+        for path in glob.glob(pattern):
+            pid = int(path[:-len('.jsonl')].rsplit('_', 1)[1])
+            try:
+                os.kill(pid, 0)
+                continue
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                continue
+            print('Adopting results spooled by dead worker : {}'.format(path))
+            rows = self._read_spool(self.spool_path)
+            rows.update(self._read_spool(path))
+            self._write_spool(self.spool_path, rows)
+            os.remove(path)
+
+    @staticmethod
+    def _read_spool(path):
+        rows = {}
+        if os.path.exists(path):
+            with open(path) as spool_file:
+                for line in spool_file:
+                    row = json.loads(line)
+                    rows[(row['run_id'], row['name'])] = row
+        return rows
+
+    @staticmethod
+    def _write_spool(path, rows):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as spool_file:
+            for row in rows.values():
+                spool_file.write(json.dumps(row) + '\n')
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+        os.replace(tmp_path, path)
@@ -0,0 +1,216 @@
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+from sqlalchemy import select, Boolean, Float, Integer
+
+from non_pseudo.db import get_engine
+from non_pseudo.db.material import Material
+
+materials = Material.__table__
+
+def column_dtype(column):
+    """NumPy dtype of a materials column in an export.
+
+    Integer columns other than the primary key may be NULL, so they are
+    exported as floats, with NaN for NULL like the float columns. Booleans are
+    False where NULL; strings are '' and their width is set by the longest one.
+
+    """
+    if column.primary_key:
+        return np.dtype('int64')
+    if isinstance(column.type, (Float, Integer)):
+        return np.dtype('float64')
+    if isinstance(column.type, Boolean):
+        return np.dtype('bool')
+    return np.dtype(str)
+
+def to_array(values, dtype):
+    """Convert a column of a batch of rows, replacing NULL as in column_dtype."""
+    if dtype.kind == 'f':
+        return np.array([np.nan if v is None else v for v in values], dtype=dtype)
+    if dtype.kind == 'U':
+        return np.array(['' if v is None else v for v in values], dtype=dtype)
+    return np.array([bool(v) if dtype.kind == 'b' else v for v in values], dtype=dtype)
+
+def stream_batches(run_id, batch_size=10000):
+    """Read a run's materials rows in fixed-size batches.
+
+    Args:
+        run_id (str): identification string for run.
+        batch_size (int): rows per batch.
+
+    Yields:
+        columns (dict): column name -> array of at most `batch_size` rows, in
+            order of row id. A run without materials yields one empty batch,
+            so exports of it still have every column.
+
+    The query runs on a server-side cursor (`stream_results`), so neither the
+    database driver nor SQLAlchemy hold more than one batch of rows; no ORM
+    objects are created.
+
+    """
+    query = select(list(materials.columns)).where(
+        materials.c.run_id == run_id).order_by(materials.c.id)
+    dtypes = [column_dtype(column) for column in materials.columns]
+    with get_engine().connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(query)
+        try:
+            empty = True
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    if empty:
+                        yield {column.name : np.array([], dtype=dtype)
+                               for column, dtype in zip(materials.columns, dtypes)}
+                    break
+                empty = False
+                yield {column.name : to_array(values, dtype) for column, dtype, values in zip(
+                    materials.columns, dtypes, zip(*rows))}
+        finally:
+            result.close()
+
+def join_descriptors(batches, catalog):
+    """Add catalog descriptors to batches of rows, joined by material name.
+
+    Args:
+        batches (iterator): column dicts, from stream_batches.
+        catalog (dict): column name -> array, from catalog.load_catalog.
+
+    Yields:
+        columns (dict): each batch with the catalog's columns added, except
+            those the materials table already has; materials missing from the
+            catalog get NaN, 0 or ''.
+
+    """
+    rows = {name : i for i, name in enumerate(catalog['name'].tolist())}
+    descriptors = {key : values for key, values in catalog.items()
+                   if key not in materials.columns}
+    for columns in batches:
+        index = np.array([rows.get(name, -1) for name in columns['name'].tolist()], dtype=int)
+        found = index >= 0
+        for key, values in descriptors.items():
+            if values.dtype.kind == 'f':
+                column = np.full(len(index), np.nan)
+            else:
+                column = np.zeros(len(index), dtype=values.dtype)
+            column[found] = values[index[found]]
+            columns[key] = column
+        yield columns
+
+def write_parquet(batches, path):
+    """Write batches of columns to a Parquet file, one row group per batch.
+
+    Args:
+        batches (iterator): column dicts with the same keys and dtypes.
+        path (str): output file; needs pyarrow.
+
+    Returns:
+        rows (int): number of rows written.
+
+    """
+    import pyarrow
+    import pyarrow.parquet
+    writer = None
+    count = 0
+    try:
+        for columns in batches:
+            table = pyarrow.table(columns)
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            count += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+def write_npz(batches, path, temp_dir=None):
+    """Write batches of columns to a `.npz` file, as np.savez would.
+
+    Args:
+        batches (iterator): column dicts with the same keys.
+        path (str): output file.
+        temp_dir (str): directory for the per-column files (default: next to
+            `path`).
+
+    Returns:
+        rows (int): number of rows written.
+
+    Each column is appended to its own file as batches arrive: raw values for
+    numbers, one line per value for strings, whose width is only known at the
+    end. The files are then copied into the archive behind .npy headers, a
+    block of rows at a time.
+
+    """
+    work_dir = tempfile.mkdtemp(dir=temp_dir or os.path.dirname(os.path.abspath(path)))
+    files, dtypes, widths = {}, {}, {}
+    count = 0
+    try:
+        for columns in batches:
+            for key, values in columns.items():
+                if key not in files:
+                    mode = 'w' if values.dtype.kind == 'U' else 'wb'
+                    files[key] = open(os.path.join(work_dir, '{}.col'.format(len(files))), mode)
+                    dtypes[key], widths[key] = values.dtype, 1
+                if values.dtype.kind == 'U':
+                    files[key].writelines(v + '\n' for v in values.tolist())
+                    widths[key] = max(widths[key], values.dtype.itemsize // 4)
+                else:
+                    files[key].write(values.astype(dtypes[key]).tobytes())
+            count += len(next(iter(columns.values())))
+        for column_file in files.values():
+            column_file.close()
+
+        with zipfile.ZipFile(path, 'w', allowZip64=True) as npz:
+            for key, column_file in files.items():
+                dtype = dtypes[key]
+                if dtype.kind == 'U':
+                    dtype = np.dtype('<U{}'.format(widths[key]))
+                with npz.open(key + '.npy', 'w', force_zip64=True) as member:
+                    np.lib.format.write_array_header_2_0(member, {
+                        'descr' : np.lib.format.dtype_to_descr(dtype),
+                        'fortran_order' : False,
+                        'shape' : (count, ),
+                    })
+                    if dtype.kind == 'U':
+                        with open(column_file.name) as values:
+                            block = [line[:-1] for _, line in zip(range(1 << 16), values)]
+                            while block:
+                                member.write(np.array(block, dtype=dtype).tobytes())
+                                block = [line[:-1] for _, line in zip(range(1 << 16), values)]
+                    else:
+                        with open(column_file.name, 'rb') as values:
+                            shutil.copyfileobj(values, member)
+    finally:
+        for column_file in files.values():
+            column_file.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return count
+
+def export_run(run_id, path, batch_size=10000, catalog_path=None):
+    """Export a run's materials table to a columnar file.
+
+    Args:
+        run_id (str): identification string for run.
+        path (str): `.parquet` (needs pyarrow) or `.npz` file.
+        batch_size (int): rows read from the database at once.
+        catalog_path (str): optional catalog (see `nps catalog`) whose
+            descriptors are joined to each material by name.
+
+    Returns:
+        rows (int): number of materials exported.
+
+    Memory use is set by `batch_size` and the catalog, not the number of
+    rows. The file reads back into arrays with catalog.load_catalog.
+
+    """
+    batches = stream_batches(run_id, batch_size)
+    if catalog_path:
+        from non_pseudo.catalog import load_catalog
+        batches = join_descriptors(batches, load_catalog(catalog_path))
+    if path.endswith('.parquet'):
+        return write_parquet(batches, path)
+    return write_npz(batches, path)
@@ -17,3 +17,16 @@ def load_config_file(file_name):
     with open(file_name) as config_file:
         config = yaml.load(config_file)
     return config
+
+def raspa2_directory():
+    """Directory of the installed RASPA2 package, found without importing it.
+
+    Returns:
+        path (str): directory containing RASPA2's __init__.py.
+
+    """
+    from importlib.util import find_spec
+    spec = find_spec('RASPA2')
+    if spec is None:
+        raise ImportError('RASPA2 is not installed')
+    return os.path.dirname(spec.origin)
@@ -1,143 +1,252 @@
+import multiprocessing
 import os
+import queue
 import sys
 from datetime import datetime
 
-import RASPA2
 import yaml
 
 import non_pseudo
 from non_pseudo import config
-from non_pseudo.db import session, Material
-from non_pseudo.files import load_config_file
+from non_pseudo import telemetry
+from non_pseudo.db import get_session, session_scope, Material
+from non_pseudo.db import claims
+from non_pseudo.db.writer import ResultWriter
+from non_pseudo.db.utilities import (find_material, find_completed_materials,
+    find_incomplete_materials, store_isotherm_points, store_stage_timings)
+from non_pseudo.files import load_config_file, raspa2_directory
 from non_pseudo import simulation
+from non_pseudo.scheduler import run_graph, critical_path
+from non_pseudo.simulation.result_cache import cached_run, statistics as cache_statistics
+from non_pseudo.simulation.retests import run_replicas
 
+np_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+cif_dir = os.path.join(np_dir, 'cif_files')
 
-from collections import Counter
+# simulations that need another simulation's result as input
+STAGE_DEPENDENCIES = {
+    'helium_void_fraction' : ['energy_grid'],
+    'gas_adsorption' : ['helium_void_fraction', 'energy_grid'],
+}
 
-import numpy as np
+# seconds between checks for pool workers that died
+POOL_POLL_INTERVAL = 10
 
-np_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
-cif_dir = os.path.join(np_dir, 'cif_files')
+# queue pool workers report ('cores', pid, core set) to when pinned, and
+# ('material', pid, name) when they start a material
+_reports = None
+
+def stage_complete(config, material, stage):
+    """Check whether a material already has results for a simulation.
+
+    Args:
+        config (dict): parameters specified in config.
+        material (Material): row, possibly loaded from an earlier attempt.
+        stage (str): simulation name (ex. 'gas_adsorption').
+
+    Returns:
+        complete (bool): True if the simulation does not need to be rerun.
+
+    """
+    if stage == 'helium_void_fraction':
+        return material.vf_helium_void_fraction is not None
+    elif stage == 'surface_area':
+        return material.sa_volumetric_surface_area is not None
+    elif stage == 'gas_adsorption':
+        if 'isotherm' in config['simulations']['gas_adsorption']:
+            return material.ga_isotherm_points is not None
+        pressure = config['simulations']['gas_adsorption']['external_pressure']
+        two_pressures = isinstance(pressure, list) and len(pressure) > 1
+        return material.ga0_absolute_volumetric_loading is not None and (
+            not two_pressures or material.ga1_absolute_volumetric_loading is not None)
+    return False
 
-def load_atom_types(name):
-    file_path = os.path.join(cif_dir, '{}.cif'.format(name))
-#    print('Loading data from : {}'.format(file_path))
-    if 'hypothetical' in name:
-        atom_types_raw = np.genfromtxt(file_path, usecols=0, skip_header=20, dtype=str)
-    else:
-        atom_types_raw = np.genfromtxt(file_path, usecols=0, skip_header=24, dtype=str)
-    atom_types = []
-    for atom_type in atom_types_raw:
-        atom_types.append(''.join([i for i in atom_type if not i.isdigit()]))
-    return atom_types
-
-def load_LCs(name):
-    file_path = os.path.join(cif_dir, '{}.cif'.format(name))
-#    print('Loading data from : {}'.format(file_path))
-    if 'hypothetical' in name:
-        LCs = np.genfromtxt(file_path, usecols=1, skip_header=8, max_rows=3)   
-    else:
-        LCs = np.genfromtxt(file_path, usecols=1, skip_header=9, max_rows=3)   
-    return LCs
+def cif_file(name):
+    """Path to a material's CIF in cif_files."""
+    return os.path.join(cif_dir, '{}.cif'.format(name))
 
 def calculate_vol_nden(name):
-    file_path = os.path.join(cif_dir, '{}.cif'.format(name))
-    if 'hypothetical' in name:
-        atom_sites = np.genfromtxt(file_path, usecols=0, skip_header=20, dtype=str)
-    else:
-        atom_sites = np.genfromtxt(file_path, usecols=0, skip_header=24, dtype=str)
-    site_count = len(atom_sites)
-    print('Atom-site count : {}'.format(site_count))
-    LCs = load_LCs(name)
-    v = LCs[0] * LCs[1] * LCs[2]
-    return v, site_count / v
-
-def load_LJ_parameters():
-    file_path = os.path.join(np_dir, 'non_pseudo', 'simulation', 'forcefield', 'force_field_mixing_rules.def')
-#    print('Loading LJ parameters from : {}'.format(file_path))
-    atom_types = np.genfromtxt(file_path, usecols=0, skip_header=7, skip_footer=4, dtype=str)
-    sigma = np.genfromtxt(file_path, usecols=3, skip_header=7, skip_footer=4)
-    epsilon = np.genfromtxt(file_path, usecols=2, skip_header=7, skip_footer=4)
-    LJ_parameters = {}
-    for i in range(len(atom_types)):
-        LJ_parameters[atom_types[i][:-1]] = {}
-        LJ_parameters[atom_types[i][:-1]]['sigma'] = sigma[i]
-        LJ_parameters[atom_types[i][:-1]]['epsilon'] = epsilon[i]
-    return LJ_parameters    
+    from non_pseudo import cif
+    crystal = cif.read_cif(cif_file(name))
+    print('Atom-site count : {}'.format(len(crystal.labels)))
+    return cif.volume(crystal), cif.number_density(crystal)
 
 def calculate_average_sigma_epsilon(name):
-    atom_types = load_atom_types(name)
-    counts = Counter(atom_types)
-    
-    print(counts)
-    
-    LJ_parameters = load_LJ_parameters()
-    
-    print('Chemical species :')
-    
-    sigma_products, epsilon_products = [], []
-    for i in counts:
-        print('\t', i)
-        count = counts[i]
-        
-        try:
-            sigma = LJ_parameters[i]['sigma']
-            sigma_product = count * sigma
-            sigma_products.append(sigma_product)
-            print('\t\tsigma : {}'.format(sigma))
-        except:
-            print('Sigma value not found!')
-            
-        try:
-            epsilon = LJ_parameters[i]['epsilon']
-            epsilon_product = count * epsilon
-            epsilon_products.append(epsilon_product)
-            print('\t\tepsilon : {}'.format(epsilon))
-        except:
-            print('Epsilon value not found!')
-            
-    return sum(sigma_products) / len(atom_types), sum(epsilon_products) / len(atom_types)
-
-def run_all_simulations(config, material):
+    from non_pseudo import catalog
+    descriptors = catalog.describe(cif_file(name))
+    print(descriptors['counts'])
+    return descriptors['sigma'], descriptors['epsilon']
+
+def run_all_simulations(config, material, on_stage_complete=None):
     """Simulate gas loading, surface area, and/or void fraction.
 
     Args:
         Material (sqlalchemy.orm.Query): material to be analyzed.
+        on_stage_complete (function): called with the material after each
+            simulation's results are added to it (ex. to commit them).
 
     Depending on properties specified in config, add simulated data for gas
     loading (including heat of adsorption), surface area, and/or void fraction
-    data to record for a particular material within database.
+    data to record for a particular material within database. Each simulation
+    runs in its own RASPA process as soon as the simulations it depends on are
+    done, so surface area runs alongside void fraction. Simulations the material
+    already has results for (from an interrupted attempt) are skipped, and with
+    `result_cache` set in config, results for identical inputs are reused across
+    runs. With `retests` set in config, each simulation runs as concurrent
+    replicas with different random seeds and stores their mean and spread.
+    With `energy_grid` set in config, the material's tabulated grids are built
+    (or found in the grid cache) first, and void fraction and gas adsorption
+    read them instead of summing framework interactions atom by atom.
+    Each simulation is measured (see telemetry) and its row appended to the
+    material's `timings`, along with the time spent in on_stage_complete.
 
     """
     simulations = config['simulations']
+    run_id, name = material.run_id, material.name
+    # results other simulations take as input, read in this thread only: after
+    # a commit the material's attributes are reloaded through this thread's
+    # session, which other threads must not use
+    inputs = {'vf_helium_void_fraction' : material.vf_helium_void_fraction}
 
-    # void fraction simulation
+    tasks = {}
     if 'helium_void_fraction' in simulations:
-        results = simulation.helium_void_fraction.run(config, material.run_id, material.name)
-        material.update_from_dict(results)
-
-    # gas loading simulation
+        tasks['helium_void_fraction'] = lambda: cached_run(
+            config, 'helium_void_fraction', name,
+            lambda: run_replicas(
+                config, 'helium_void_fraction', run_id, name,
+                lambda seed: simulation.helium_void_fraction.run(config, run_id, name, seed)))
     if 'gas_adsorption' in simulations:
-        results = simulation.gas_adsorption.run(config, material.run_id, material.name, material.vf_helium_void_fraction)
-        material.update_from_dict(results)
-
+        tasks['gas_adsorption'] = lambda: cached_run(
+            config, 'gas_adsorption', name,
+            lambda: run_replicas(
+                config, 'gas_adsorption', run_id, name,
+                lambda seed: simulation.gas_adsorption.run(
+                    config, run_id, name, inputs['vf_helium_void_fraction'], seed)),
+            inputs=inputs)
     if 'surface_area' in simulations:
-        results = simulation.surface_area.run(config, material.run_id, material.name)
+        tasks['surface_area'] = lambda: cached_run(
+            config, 'surface_area', name,
+            lambda: run_replicas(
+                config, 'surface_area', run_id, name,
+                lambda seed: simulation.surface_area.run(config, run_id, name, seed)))
+    for stage in [s for s in tasks if stage_complete(config, material, s)]:
+        print('Skipping {} for {}, already complete.'.format(stage, name))
+        del tasks[stage]
+
+    remaining = set(tasks)
+    molecules = simulation.energy_grid.grid_molecules(config, remaining)
+    if 'energy_grid' in config and molecules:
+        tasks['energy_grid'] = lambda: simulation.energy_grid.run(
+            config, run_id, name, molecules)
+
+    if getattr(material, 'timings', None) is None:
+        material.timings = []
+    for stage in tasks:
+        tasks[stage] = telemetry.measured(run_id, name, stage, tasks[stage], material.timings)
+
+    def on_complete(stage, results):
+        if stage not in remaining:
+            return
         material.update_from_dict(results)
+        inputs.update((key, results[key]) for key in inputs if key in results)
+        remaining.discard(stage)
+        if not remaining:
+            material.data_complete = True
+        if on_stage_complete is not None:
+            with telemetry.timed('commit_time'):
+                on_stage_complete(material)
 
-def add_material_to_database(config, name):
-    material = Material(name)
-    material.run_id = config['run_id']
-    session.add(material)
-    run_all_simulations(config, material)
+    if not tasks:
+        material.data_complete = True
+    results, timings = run_graph(
+        tasks, STAGE_DEPENDENCIES,
+        max_workers=config.get('concurrent_stages'),
+        on_complete=on_complete)
+
+    path, duration = critical_path(timings, STAGE_DEPENDENCIES)
+    print('Critical path ({}) :\t{} ({:.1f} s)'.format(
+        name, ' -> '.join(path), duration))
+
+def add_material_to_database(config, name, material=None, writer=None):
+    """Simulate material and store its results.
+
+    Args:
+        config (dict): parameters specified in config.
+        name (str): name of material (CIF filename without extension).
+        material (Material): row to complete; looked up by (run_id, name), or
+            created, if not passed.
+        writer (ResultWriter): background writer to hand results to; results
+            are committed from this thread if not passed.
+
+    Results are stored after each simulation, so an interrupted material only
+    reruns the simulations it is missing. Database access goes through a
+    session scoped to this call (ex. one rq job), which is removed afterwards.
+    Timings of each simulation and of the whole material are stored in the
+    stage_timings table.
+
+    """
+    with session_scope() as session:
+        if material is None:
+            material = find_material(config['run_id'], name)
+        if material is None:
+            material = Material(name)
+            material.run_id = config['run_id']
+        if material.data_complete:
+            print('Skipping {}, already complete.'.format(name))
+            return
+        if writer is not None:
+            commit = lambda m: writer.put(results_dict(m))
+        else:
+            session.add(material)
+            commit = commit_material
+        material.timings = []
+        with telemetry.measure(material.run_id, name, 'material', material.timings):
+            run_all_simulations(config, material, on_stage_complete=commit)
+        # the material's own timing row is only complete now
+        commit(material)
+
+def commit_material(material):
+    """Commit material's results, and its isotherm points and timings if it has any.
+
+    Args:
+        material (Material): row in the process's session.
+
+    """
+    session = get_session()
+    points = getattr(material, 'isotherm', None)
+    if points:
+        store_isotherm_points(session, material.run_id, material.name, points)
+    timings = getattr(material, 'timings', None)
+    if timings:
+        store_stage_timings(session, material.run_id, material.name, timings)
     session.commit()
 
+def results_dict(material):
+    """Column values of material, without its database id.
+
+    Args:
+        material (Material): row.
+
+    Returns:
+        results (dict): column name -> value, and the material's isotherm
+            points under 'isotherm' and stage timings under 'timings' if it
+            has any.
+
+    """
+    results = material.to_dict()
+    del results['id']
+    if getattr(material, 'isotherm', None):
+        results['isotherm'] = material.isotherm
+    if getattr(material, 'timings', None):
+        results['timings'] = list(material.timings)
+    return results
+
 def start_run(config_path):
     config = load_config_file(config_path)
     non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
     run_id = datetime.now().isoformat()
     config['run_id'] = run_id
-    config['raspa2_dir'] = os.path.dirname(RASPA2.__file__)
+    config['raspa2_dir'] = raspa2_directory()
     config['non_pseudo_dir'] = non_pseudo_dir
 
     run_dir = os.path.join(non_pseudo_dir, run_id)
@@ -149,21 +258,258 @@ def start_run(config_path):
 
     return config
 
-def worker_run_loop(run_id):
+def simulate_material(config, name, partial_results=None):
+    """Simulate material without touching the database.
+
+    Args:
+        config (dict): parameters specified in config.
+        name (str): name of material (CIF filename without extension).
+        partial_results (dict): column values from an interrupted attempt;
+            simulations these cover are skipped.
+
+    Returns:
+        name (str): name of material.
+        results (dict): column values for the material's row. If a simulation
+            failed, `data_complete` is left unset and the results of the
+            simulations that finished are kept, so a later attempt resumes
+            from them.
+
+    Runs inside worker processes in `--jobs` mode; results are sent back to the
+    supervisor, which is the only process writing to the database.
+
+    """
+    material = Material(name)
+    material.update_from_dict(partial_results or {})
+    material.run_id = config['run_id']
+    material.timings = []
+    try:
+        with telemetry.measure(material.run_id, name, 'material', material.timings):
+            run_all_simulations(config, material)
+    except Exception as err:
+        print('Simulations failed for {} : {}'.format(name, err))
+    return name, results_dict(material)
+
+def raspa_processes(config):
+    """Most RASPA processes one material runs at once.
+
+    Args:
+        config (dict): parameters specified in config.
+
+    Returns:
+        processes (int): concurrent simulations (`concurrent_stages`, default
+            all of them) x concurrent replicas (`retests: number`) x
+            concurrent isotherm points (gas_adsorption.concurrent_points).
+
+    """
+    simulations = config['simulations']
+    stages = min(config.get('concurrent_stages') or len(simulations), max(len(simulations), 1))
+    retests = config.get('retests')
+    replicas = retests.get('number', 3) if retests else 1
+    points = 1
+    isotherm = (simulations.get('gas_adsorption') or {}).get('isotherm')
+    if isotherm:
+        points = simulation.gas_adsorption.concurrent_points(isotherm)
+    return stages * replicas * points
+
+def core_sets(config, jobs):
+    """Split the cores this process may use between pool workers.
+
+    Args:
+        config (dict): parameters specified in config.
+        jobs (int): number of worker processes.
+
+    Returns:
+        core_sets (list): one set of raspa_processes(config) core ids per
+            worker.
+
+    Raises:
+        ValueError: if there are fewer cores than jobs x RASPA processes.
+
+    """
+    available = sorted(os.sched_getaffinity(0))
+    per_job = raspa_processes(config)
+    if len(available) < jobs * per_job:
+        raise ValueError(
+            'Pinning {} jobs of {} RASPA processes each needs {} cores, {} available; '
+            'lower --jobs, concurrent_stages or retests: number.'.format(
+                jobs, per_job, jobs * per_job, len(available)))
+    return [set(available[i * per_job:(i + 1) * per_job]) for i in range(jobs)]
+
+def _init_pool_worker(cores, reports):
+    """Set up pool worker; pin it (and the RASPA processes it starts) to its cores.
+
+    Args:
+        cores (multiprocessing.Queue): core sets not held by a live worker.
+        reports (multiprocessing.SimpleQueue): queue the worker reports its
+            core set and the materials it starts to.
+
+    """
+    global _reports
+    _reports = reports
+    if cores is not None:
+        core_set = cores.get()
+        reports.put(('cores', os.getpid(), core_set))
+        os.sched_setaffinity(0, core_set)
+        print('Worker {} pinned to cores {}'.format(
+            os.getpid(), ','.join(str(core) for core in core_set)))
+
+def _simulate_in_pool(config, name, partial_results=None):
+    """simulate_material, telling run_pool which worker process runs it."""
+    _reports.put(('material', os.getpid(), name))
+    return simulate_material(config, name, partial_results)
+
+def run_pool(config, next_material, jobs, writer, pin_cores=False, partial=None):
+    """Simulate materials in a pool of worker processes.
+
+    Args:
+        config (dict): parameters specified in config.
+        next_material (function): returns name of next material to simulate,
+            or None when there are no more.
+        jobs (int): number of materials simulated at once.
+        writer (ResultWriter): writer results are handed to.
+        pin_cores (bool): pin each worker process to its own cores, as many
+            as the RASPA processes a material runs at once (raspa_processes).
+        partial (dict): name -> column values of rows left incomplete by an
+            earlier attempt.
+
+    Workers are forked from this process, so they share its imports; results
+    are written to the database from this process only. Materials are only
+    requested from `next_material` when a worker is free. A material whose
+    job raises in the pool, or whose worker process dies (ex. killed when out
+    of memory), counts as failed. The cores of a dead worker are handed to
+    the worker the pool starts in its place.
+
+    """
+    partial = partial or {}
+    cores = None
+    if pin_cores:
+        cores = multiprocessing.Queue()
+        for core_set in core_sets(config, jobs):
+            cores.put(core_set)
+
+    finished = queue.Queue()
+    def failed(name):
+        # errors outside simulate_material (ex. pickling arguments or results)
+        def error_callback(err):
+            print('Simulations failed for {} : {!r}'.format(name, err))
+            finished.put((name, None))
+        return error_callback
+
+    # written synchronously, so a worker that dies right after starting has reported
+    reports = multiprocessing.SimpleQueue()
+    in_flight, workers, pinned = set(), {}, {}
+    def check_workers():
+        # the pool replaces a dead worker but drops its job without a callback
+        while not reports.empty():
+            kind, pid, value = reports.get()
+            if kind == 'cores':
+                pinned[pid] = value
+            elif value in in_flight:
+                workers[value] = pid
+        alive = {child.pid for child in multiprocessing.active_children()}
+        for name in [n for n, pid in workers.items() if pid not in alive]:
+            print('Simulations failed for {} : worker {} exited'.format(name, workers[name]))
+            del workers[name]
+            finished.put((name, None))
+        # its replacement waits for a core set until the dead worker's is returned
+        for pid in [pid for pid in pinned if pid not in alive]:
+            cores.put(pinned.pop(pid))
+
+    with multiprocessing.Pool(jobs, _init_pool_worker, (cores, reports)) as pool:
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < jobs:
+                name = next_material()
+                if name is None:
+                    exhausted = True
+                    break
+                pool.apply_async(_simulate_in_pool, (config, name, partial.get(name)),
+                                 callback=finished.put, error_callback=failed(name))
+                in_flight.add(name)
+            if not in_flight:
+                break
+            try:
+                name, results = finished.get(timeout=POOL_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            finally:
+                check_workers()
+            in_flight.discard(name)
+            workers.pop(name, None)
+            if results is not None:
+                writer.put(results)
+
+def worker_run_loop(run_id, jobs=1, pin_cores=False):
     """
     Args:
         run_id (str): identification string for run.
+        jobs (int): number of materials simulated at once (default = 1).
+        pin_cores (bool): pin each of the `jobs` worker processes to its own
+            cores (see core_sets).
 
     Finds next-to-be-simulated hypothetical or real material and calculates
-    properties of interest, saving results to database.
+    properties of interest, saving results to database. Materials are claimed
+    in batches through the work-claim table, so any number of workers, on any
+    number of nodes, can share a run without simulating a material twice.
+    Results are written by a background writer in batches.
     """
     config = load_config_file(os.path.join(run_id, 'config.yaml'))
+    claims_config = config.get('claims', {})
+    batch_size = claims_config.get('batch_size', max(jobs, 1))
+    expire_after = claims_config.get('expire_after', 600)
+    heartbeat_interval = claims_config.get('heartbeat_interval', 60)
+    writer_config = config.get('writer', {})
+    if pin_cores and jobs > 1:
+        # refuse before claiming materials if the cores can't be split
+        core_sets(config, jobs)
 
     non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
     materials_dir = config['materials_directory']
     mat_dir = os.path.join(non_pseudo_dir, materials_dir)
-    mat_names = os.listdir(mat_dir)
+    mat_names = [cif_name[:-4] for cif_name in os.listdir(mat_dir)]
+
+    completed = find_completed_materials(run_id)
+    partial = {name : results_dict(material)
+               for name, material in find_incomplete_materials(run_id).items()}
+    print('Skipping {} completed materials, resuming {} partially simulated.'.format(
+        len(completed), len(partial)))
+    claims.seed_claims(run_id, [name for name in mat_names if name not in completed])
+
+    worker = claims.worker_id()
+    def claimed_materials():
+        while True:
+            names = claims.claim_materials(run_id, worker, batch_size, expire_after)
+            if not names:
+                return
+            for name in names:
+                if name in completed:
+                    claims.complete_claim(run_id, name)
+                    continue
+                yield name
+    materials = claimed_materials()
+    next_material = lambda: next(materials, None)
+
+    writer = ResultWriter(
+        os.path.join(non_pseudo_dir, run_id),
+        batch_size=writer_config.get('batch_size', 50),
+        flush_interval=writer_config.get('flush_interval', 30))
+    stop_heartbeat = claims.start_heartbeat(run_id, worker, heartbeat_interval)
+    try:
+        if jobs > 1:
+            run_pool(config, next_material, jobs, writer, pin_cores, partial)
+            return
 
-    for cif_name in mat_names:
-        name = cif_name[:-4]
-        add_material_to_database(config, name)
+        for name in iter(next_material, None):
+            material = Material(name)
+            material.update_from_dict(partial.get(name, {}))
+            material.run_id = run_id
+            try:
+                add_material_to_database(config, name, material, writer)
+            except Exception as err:
+                print('Simulations failed for {} : {}'.format(name, err))
+    finally:
+        writer.close()
+        stop_heartbeat.set()
+        claims.release_claims(run_id, worker)
+        for (stage, outcome), count in sorted(cache_statistics.items()):
+            print('Result cache {} :\t{} {}'.format(outcome, stage, count))
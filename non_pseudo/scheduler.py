@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from time import time
+
+def run_graph(tasks, dependencies, max_workers=None, on_complete=None):
+    """Run tasks concurrently, starting each one as soon as its inputs are ready.
+
+    Args:
+        tasks (dict): task name -> callable, called without arguments.
+        dependencies (dict): task name -> list of task names that must finish
+            first. Dependencies on names not in `tasks` are ignored.
+        max_workers (int): maximum number of tasks running at once (default =
+            number of tasks).
+        on_complete (function): called as on_complete(name, result) in the
+            calling thread after each task finishes, before any dependent task
+            is started.
+
+    Returns:
+        results (dict): task name -> return value.
+        timings (dict): task name -> (start, end) wall-clock times.
+
+    Each task runs in its own thread; tasks are expected to spend their time
+    waiting on RASPA subprocesses, not in Python.
+
+    """
+    pending = {name : [d for d in dependencies.get(name, []) if d in tasks]
+               for name in tasks}
+    results, timings = {}, {}
+
+    def timed(name):
+        start = time()
+        result = tasks[name]()
+        timings[name] = (start, time())
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(tasks), 1)) as executor:
+        running = {}
+        while pending or running:
+            for name in [n for n, deps in pending.items() if not deps]:
+                del pending[name]
+                running[executor.submit(timed, name)] = name
+            if not running:
+                raise ValueError('Circular dependency between : {}'.format(
+                    ', '.join(sorted(pending))))
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name] = future.result()
+                if on_complete is not None:
+                    on_complete(name, results[name])
+                for deps in pending.values():
+                    if name in deps:
+                        deps.remove(name)
+    return results, timings
+
+def critical_path(timings, dependencies):
+    """Find the chain of tasks that determined total wall time.
+
+    Args:
+        timings (dict): task name -> (start, end), as returned by run_graph.
+        dependencies (dict): task name -> list of task names it waited on.
+
+    Returns:
+        path (list): task names, first to last.
+        duration (float): seconds from first start to last end along path.
+
+    """
+    if not timings:
+        return [], 0.
+    name = max(timings, key=lambda n: timings[n][1])
+    path = [name]
+    while True:
+        deps = [d for d in dependencies.get(name, []) if d in timings]
+        if not deps:
+            break
+        name = max(deps, key=lambda n: timings[n][1])
+        path.insert(0, name)
+    return path, timings[path[-1]][1] - timings[path[0]][0]
@@ -1,3 +1,4 @@
 import non_pseudo.simulation.helium_void_fraction
 import non_pseudo.simulation.gas_adsorption
 import non_pseudo.simulation.surface_area
+import non_pseudo.simulation.energy_grid
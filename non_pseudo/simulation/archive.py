@@ -0,0 +1,218 @@
+import glob
+import io
+import json
+import os
+import shutil
+import socket
+import tarfile
+import tempfile
+import threading
+import zlib
+from time import time
+
+import non_pseudo
+
+# compressed members are spooled in memory up to this size, then on disk
+_SPOOL_BYTES = 1 << 24
+
+_lock = threading.Lock()
+
+def archive_directory(config, run_id):
+    """Directory holding a run's archives.
+
+    Args:
+        config (dict): parameters specified in config.
+        run_id (str): identification string for run.
+
+    Returns:
+        path (str): `archive: directory` from config (default: archive in the
+            run directory).
+
+    """
+    non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+    default = os.path.join(non_pseudo_dir, run_id, 'archive')
+    return os.path.expandvars((config.get('archive') or {}).get('directory', default))
+
+def archive_path(config, run_id):
+    """Archive of the calling process, '<host>_<pid>.arc' in archive_directory.
+
+    Its index is next to it, with '.index' appended.
+
+    """
+    return os.path.join(archive_directory(config, run_id), '{}_{}.arc'.format(
+        socket.gethostname(), os.getpid()))
+
+def compressor(codec, level=3):
+    """Streaming compressor for a member.
+
+    Args:
+        codec (str): 'zstd' or 'zlib'.
+        level (int): compression level.
+
+    Returns:
+        codec (str): codec used; 'zlib' if zstd was asked for but the
+            zstandard package isn't installed.
+        compressor (object): with compress(data) and flush() methods.
+
+    """
+    if codec == 'zstd':
+        try:
+            import zstandard
+            return 'zstd', zstandard.ZstdCompressor(level=level).compressobj()
+        except ImportError:
+            pass
+    return 'zlib', zlib.compressobj(level)
+
+def decompressor(codec):
+    """Streaming decompressor for a member written with `codec`."""
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj()
+
+class _CompressedWriter(object):
+    """File-like object compressing what is written to it into another file."""
+
+    def __init__(self, compressor, output_file):
+        self.compressor = compressor
+        self.output_file = output_file
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        self.output_file.write(self.compressor.compress(data))
+
+    def close(self):
+        self.output_file.write(self.compressor.flush())
+
+def archived_files(output_dir):
+    """Files a simulation wrote, relative to its directory.
+
+    Links to staged inputs and to cached grids, and the RASPA_DIR overlay, are
+    left out, as in bytes_written.
+
+    """
+    found = []
+    for root, dirs, files in os.walk(output_dir):
+        for f in sorted(files):
+            path = os.path.join(root, f)
+            if os.path.islink(path) or os.lstat(path).st_nlink > 1:
+                continue
+            found.append(os.path.relpath(path, output_dir))
+    return found
+
+def add_directory(config, run_id, name, stage, output_dir, seed=None):
+    """Append a simulation directory to the process's archive as one member.
+
+    Args:
+        config (dict): parameters specified in config.
+        run_id (str): identification string for run.
+        name (str): name of material.
+        stage (str): simulation name (ex. 'gas_adsorption').
+        output_dir (str): simulation directory.
+        seed (int): random seed of the simulation, if it is a replica.
+
+    Returns:
+        entry (dict): index entry of the member.
+
+    The files are written as an uncompressed tar stream through the
+    compressor set by `archive: codec` ('zstd' or 'zlib', default 'zstd') and
+    `archive: level`, so each member can be read back on its own. The member
+    is compressed before taking the archive lock; only the append is
+    serialized between threads.
+
+    """
+    archive_config = config.get('archive') or {}
+    codec, compress = compressor(archive_config.get('codec', 'zstd'),
+                                 archive_config.get('level', 3))
+    files = archived_files(output_dir)
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES) as member:
+        writer = _CompressedWriter(compress, member)
+        with tarfile.open(fileobj=writer, mode='w|') as tar:
+            for f in files:
+                tar.add(os.path.join(output_dir, f), arcname=f, recursive=False)
+        writer.close()
+
+        path = archive_path(config, run_id)
+        entry = {
+            'run_id' : run_id,
+            'name' : name,
+            'stage' : stage,
+            'seed' : seed,
+            'codec' : codec,
+            'length' : member.tell(),
+            'size' : writer.size,
+            'files' : files,
+            'archived_at' : time(),
+        }
+        member.seek(0)
+        with _lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab') as archive_file:
+                entry['offset'] = archive_file.seek(0, os.SEEK_END)
+                shutil.copyfileobj(member, archive_file)
+            # a member only counts once its index line is written, so a crash
+            # in between leaves unreferenced bytes, never a broken entry
+            with open(path + '.index', 'a') as index_file:
+                index_file.write(json.dumps(entry) + '\n')
+    print('Archived {} files ({} bytes, {} compressed) to {}'.format(
+        len(files), entry['size'], entry['length'], path))
+    return entry
+
+def read_index(config, run_id):
+    """Index entries of every archive of a run.
+
+    Args:
+        config (dict): parameters specified in config.
+        run_id (str): identification string for run.
+
+    Returns:
+        entries (list): index entries in archiving order per archive, each
+            with the path of its archive under 'archive'.
+
+    """
+    entries = []
+    for index_path in sorted(glob.glob(os.path.join(
+            archive_directory(config, run_id), '*.arc.index'))):
+        with open(index_path) as index_file:
+            for line in index_file:
+                entry = json.loads(line)
+                entry['archive'] = index_path[:-len('.index')]
+                entries.append(entry)
+    return entries
+
+def find_members(config, run_id, name=None, stage=None):
+    """Index entries of a run, optionally only for a material and/or stage."""
+    return [entry for entry in read_index(config, run_id)
+            if (name is None or entry['name'] == name) and
+               (stage is None or entry['stage'] == stage)]
+
+def open_member(entry):
+    """Read one member of an archive without reading the rest.
+
+    Args:
+        entry (dict): index entry, from read_index.
+
+    Returns:
+        tar (tarfile.TarFile): the simulation directory's files.
+
+    """
+    with open(entry['archive'], 'rb') as archive_file:
+        archive_file.seek(entry['offset'])
+        data = archive_file.read(entry['length'])
+    return tarfile.open(fileobj=io.BytesIO(decompressor(entry['codec']).decompress(data)))
+
+def read_file(entry, file_name):
+    """Contents of a single file of an archived simulation directory.
+
+    Args:
+        entry (dict): index entry, from read_index.
+        file_name (str): path relative to the simulation directory (ex.
+            'Output/System_0/output_<name>_2.2.2_298.000000_0.data').
+
+    Returns:
+        data (bytes): file contents.
+
+    """
+    with open_member(entry) as tar:
+        return tar.extractfile(file_name).read()
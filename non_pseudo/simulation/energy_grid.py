@@ -0,0 +1,374 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from string import Template
+from time import time
+
+import non_pseudo
+from non_pseudo.simulation.staging import (FORCE_FIELD_FILES, cif_path, file_hash,
+    force_field_directory, stage_inputs)
+from non_pseudo.simulation.utilities import (output_directory, CUTOFF, RASPA_OVERLAY,
+    run_raspa, record_bytes_written)
+
+FORCE_FIELD = 'GenericMOFs'
+
+# pseudo-atom type RASPA tabulates for each molecule simulated with a grid
+GRID_TYPES = {
+    'helium' : 'He',
+    'methane' : 'CH4_sp3',
+}
+
+# grids used (linked into a simulation) more recently than this [s] are never
+# evicted, since a simulation may still be reading them through its overlay
+MIN_AGE = 86400
+
+# the cache is walked to evict grids once a process has stored this fraction
+# of `max_bytes` since its last walk
+EVICT_FRACTION = 0.05
+_stored_bytes = 0
+_lock = threading.Lock()
+
+def grid_spacing(config):
+    """Spacing [A] of tabulated grids, from `energy_grid: spacing` (default 0.1)."""
+    return float((config['energy_grid'] or {}).get('spacing', 0.1))
+
+def grid_options(config, molecule):
+    """RASPA input lines making a simulation read its tabulated grid.
+
+    Args:
+        config (dict): parameters specified in config.
+        molecule (str): molecule simulated (ex. 'methane').
+
+    Returns:
+        options (str): lines for the RASPA input file; empty unless `energy_grid`
+            is set in config and `molecule` has a grid type.
+
+    """
+    if 'energy_grid' not in config or molecule not in GRID_TYPES:
+        return ''
+    return ('UseTabularGrid          yes\n'
+            'SpacingVDWGrid          %g\n'
+            'NumberOfGrids           1\n'
+            'GridTypes               %s' % (grid_spacing(config), GRID_TYPES[molecule]))
+
+def grid_directory(config):
+    """Directory holding cached grids.
+
+    Args:
+        config (dict): parameters specified in config.
+
+    Returns:
+        path (str): `energy_grid: directory` from config (default: grid_cache
+            in the non_pseudo directory).
+
+    """
+    non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+    default = os.path.join(non_pseudo_dir, 'grid_cache')
+    return os.path.expandvars((config['energy_grid'] or {}).get('directory', default))
+
+def grid_key(config, name, molecule):
+    """Hash of everything a material's grid depends on.
+
+    Args:
+        config (dict): parameters specified in config.
+        name (str): name of material.
+        molecule (str): molecule the grid is for.
+
+    Returns:
+        key (str): hex digest over the CIF contents, the force field files,
+            the probe type, grid spacing and cutoff. The material's name is
+            not part of it, so identical frameworks share grids.
+
+    """
+    description = {
+        'cif' : file_hash(cif_path(config, name)),
+        'force_field' : [file_hash(os.path.join(force_field_directory(), f))
+                         for f in FORCE_FIELD_FILES],
+        'type' : GRID_TYPES[molecule],
+        'spacing' : grid_spacing(config),
+        'cutoff' : CUTOFF,
+    }
+    encoded = json.dumps(description, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+def _entry_path(config, key):
+    return os.path.join(grid_directory(config), key[:2], key)
+
+def raspa_directory():
+    """RASPA installation simulations normally run with ($RASPA_DIR, or RASPA2's)."""
+    if 'RASPA_DIR' in os.environ:
+        return os.environ['RASPA_DIR']
+    from non_pseudo.files import raspa2_directory
+    return raspa2_directory()
+
+def make_overlay(output_dir, name, entries=()):
+    """Build a RASPA_DIR for one simulation with its own grids directory.
+
+    Args:
+        output_dir (str): simulation directory.
+        name (str): name of material.
+        entries (list): cached grid directories to link in.
+
+    Returns:
+        grid_dir (str): directory RASPA reads and writes the material's grids
+            in, 'share/raspa/grids/<force field>/<name>' under the overlay.
+
+    Everything but grids is linked from the RASPA installation, so RASPA finds
+    molecule definitions as usual. run_raspa points RASPA_DIR at the overlay
+    when a simulation directory has one.
+
+    """
+    share = os.path.join(output_dir, RASPA_OVERLAY, 'share', 'raspa')
+    source = os.path.join(raspa_directory(), 'share', 'raspa')
+    grid_dir = os.path.join(share, 'grids', FORCE_FIELD, name)
+    os.makedirs(grid_dir, exist_ok=True)
+    for entry in os.listdir(source):
+        link_path = os.path.join(share, entry)
+        if entry != 'grids' and not os.path.lexists(link_path):
+            os.symlink(os.path.join(source, entry), link_path)
+    for entry in entries:
+        for root, dirs, files in os.walk(entry):
+            target_dir = os.path.join(grid_dir, os.path.relpath(root, entry))
+            os.makedirs(target_dir, exist_ok=True)
+            for f in files:
+                link_path = os.path.join(target_dir, f)
+                if not os.path.lexists(link_path):
+                    os.symlink(os.path.join(root, f), link_path)
+    return grid_dir
+
+def write_raspa_file(config, filename, name, molecule):
+    """Writes RASPA input file for tabulating a grid.
+
+    Args:
+        filename (str): path to input file.
+        name (str): name of material.
+        molecule (str): molecule the grid is for.
+
+    Writes RASPA input-file.
+
+    """
+    s = Template("""
+SimulationType                  MakeGrid
+
+Forcefield                      $ForceField
+CutOff                          $CutOff
+UseChargesFromCIFFile           no
+
+Framework                       0
+FrameworkName                   $FrameworkName
+
+NumberOfGrids                   1
+GridTypes                       $GridType
+SpacingVDWGrid                  $Spacing""")
+    with open(filename, 'w') as raspa_input_file:
+        raspa_input_file.write(
+                s.substitute(
+                    ForceField = FORCE_FIELD,
+                    CutOff = CUTOFF,
+                    FrameworkName = name,
+                    GridType = GRID_TYPES[molecule],
+                    Spacing = grid_spacing(config)))
+
+def lookup(config, key):
+    """Cached grid directory for key, or None; marks it as recently used."""
+    path = _entry_path(config, key)
+    if not os.path.isdir(path):
+        return None
+    os.utime(path)
+    return path
+
+def store(config, key, grid_dir):
+    """Move a tabulated grid into the cache, evicting old grids if it's too large.
+
+    Args:
+        config (dict): parameters specified in config.
+        key (str): from grid_key.
+        grid_dir (str): directory RASPA wrote the grid to.
+
+    Returns:
+        path (str): cached grid directory.
+
+    Grids are moved to a temporary name and renamed into place, so workers
+    tabulating the same grid concurrently keep whichever finishes first. Once
+    this process has stored EVICT_FRACTION of `energy_grid: max_bytes` since
+    it last did, evict runs in a background thread, so simulations don't wait
+    on the walk over the cache.
+
+    """
+    global _stored_bytes
+    path = _entry_path(config, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=os.path.dirname(path))
+    for entry in os.listdir(grid_dir):
+        shutil.move(os.path.join(grid_dir, entry), tmp_path)
+    size = _directory_size(tmp_path)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    max_bytes = (config['energy_grid'] or {}).get('max_bytes')
+    if max_bytes is None:
+        return path
+    with _lock:
+        _stored_bytes += size
+        due = _stored_bytes >= EVICT_FRACTION * max_bytes
+        if due:
+            _stored_bytes = 0
+    if due:
+        threading.Thread(target=evict, args=(config, max_bytes), daemon=True).start()
+    return path
+
+def _directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, f))
+               for root, dirs, files in os.walk(path) for f in files)
+
+def entries(config):
+    """List cached grids.
+
+    Args:
+        config (dict): parameters specified in config.
+
+    Returns:
+        entries (list): (path, size, last used) for every grid.
+
+    """
+    found = []
+    cache_dir = grid_directory(config)
+    if not os.path.isdir(cache_dir):
+        return found
+    for prefix in os.listdir(cache_dir):
+        prefix_dir = os.path.join(cache_dir, prefix)
+        for key in os.listdir(prefix_dir):
+            path = os.path.join(prefix_dir, key)
+            if key.startswith('tmp'):
+                continue
+            found.append((path, _directory_size(path), os.stat(path).st_mtime))
+    return found
+
+def evict(config, max_bytes):
+    """Delete least recently used grids until the cache fits in max_bytes.
+
+    Args:
+        config (dict): parameters specified in config.
+        max_bytes (int): size limit of the cache.
+
+    Grids used within `energy_grid: min_age` seconds (default MIN_AGE) are
+    kept even if the cache stays above max_bytes: lookup marks a grid as used
+    each time it is linked into a simulation, which may still be reading it.
+
+    """
+    min_age = (config['energy_grid'] or {}).get('min_age', MIN_AGE)
+    cached = sorted(entries(config), key=lambda entry: entry[2])
+    size = sum(entry[1] for entry in cached)
+    for path, entry_size, last_used in cached:
+        if size <= max_bytes or last_used > time() - min_age:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        size -= entry_size
+
+def make_grid(config, output_dir, name, molecule):
+    """Tabulate a material's grid for a molecule in RASPA and cache it.
+
+    Args:
+        config (dict): parameters specified in config.
+        output_dir (str): directory to run RASPA in; removed afterwards.
+        name (str): name of material.
+        molecule (str): molecule the grid is for.
+
+    Returns:
+        path (str): cached grid directory.
+
+    """
+    print("Output directory :\t%s" % output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    stage_inputs(config, output_dir, name)
+    grid_dir = make_overlay(output_dir, name)
+    write_raspa_file(config, os.path.join(output_dir, 'MakeGrid.input'), name, molecule)
+
+    print("Tabulating %s grid of %s..." % (molecule, name))
+    run_raspa(config, output_dir, 'MakeGrid.input', lambda: None)
+    record_bytes_written(output_dir)
+    path = store(config, grid_key(config, name, molecule), grid_dir)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    sys.stdout.flush()
+    return path
+
+def grid_entry(config, output_dir, name, molecule):
+    """Cached grid directory of a material, tabulating the grid if it's missing.
+
+    Args:
+        config (dict): parameters specified in config.
+        output_dir (str): directory to tabulate the grid in on a miss.
+        name (str): name of material.
+        molecule (str): molecule the grid is for.
+
+    Returns:
+        path (str): cached grid directory.
+
+    """
+    path = lookup(config, grid_key(config, name, molecule))
+    if path is None:
+        path = make_grid(config, output_dir, name, molecule)
+    return path
+
+def link_grid(config, name, molecule, output_dir):
+    """Give a simulation directory a RASPA_DIR overlay with the material's grid.
+
+    Args:
+        config (dict): parameters specified in config.
+        name (str): name of material.
+        molecule (str): molecule simulated.
+        output_dir (str): simulation directory.
+
+    Does nothing unless grid_options would enable the grid. A grid missing from
+    the cache (ex. evicted since the energy grid stage) is tabulated first, in
+    a subdirectory of `output_dir`. Grids cover one unit cell, so every unit
+    cell replication uses the same grid.
+
+    """
+    if grid_options(config, molecule):
+        entry = grid_entry(config, os.path.join(output_dir, 'energy_grid'), name, molecule)
+        make_overlay(output_dir, name, [entry])
+
+def grid_molecules(config, stages):
+    """Molecules a material's remaining simulations read grids for.
+
+    Args:
+        config (dict): parameters specified in config.
+        stages (list): simulations still to run.
+
+    Returns:
+        molecules (list): helium for RASPA void fraction simulations and the
+            adsorbate for gas adsorption, if they have grid types.
+
+    """
+    simulations = config['simulations']
+    molecules = []
+    if ('helium_void_fraction' in stages and
+            simulations['helium_void_fraction'].get('engine') != 'native'):
+        molecules.append('helium')
+    if 'gas_adsorption' in stages:
+        molecules.append(simulations['gas_adsorption']['adsorbate'])
+    return [m for m in molecules if m in GRID_TYPES]
+
+def run(config, run_id, name, molecules):
+    """Tabulates a material's grids ahead of the simulations reading them.
+
+    Args:
+        run_id (str): identification string for run.
+        name (str): name of material.
+        molecules (list): molecules to tabulate grids for.
+
+    Returns:
+        results (dict): empty; grids are kept in the grid cache, not the
+            database.
+
+    """
+    for molecule in molecules:
+        output_dir = output_directory(config, run_id, name, 'energy_grid_%s' % molecule)
+        grid_entry(config, output_dir, name, molecule)
+    return {}
@@ -1,21 +1,40 @@
 import sys
+import math
 import os
-import subprocess
 import shutil
-from datetime import datetime
-from uuid import uuid4
 from string import Template
 
 import non_pseudo
 from non_pseudo import config
+from non_pseudo import telemetry
+from non_pseudo.simulation.staging import stage_inputs
+from non_pseudo.simulation.energy_grid import grid_options, link_grid
+from non_pseudo.simulation.utilities import (output_directory, checkpoint_options,
+    seed_option, unit_cells, CUTOFF, run_cycles, print_every, record_bytes_written,
+    finish_output, discard_output)
+from non_pseudo.simulation.raspa_output import output_file_path, parse_output_file, restart_file_name
+from non_pseudo.scheduler import run_graph
 
-def write_raspa_file(config, filename, name, helium_void_fraction):
+# points per chain of an isotherm with warm starts, unless
+# `isotherm: concurrent_points` is set
+WARM_START_CHAIN_LENGTH = 4
+
+def write_raspa_file(config, filename, name, helium_void_fraction, cycles=None,
+                     initialization_cycles=None, restart=False, seed=None,
+                     pressures=None, cells=None):
     """Writes RASPA input file for calculating gas loading.
 
     Args:
         filename (str): path to input file.
         run_id (str): identification string for run.
         material_id (str): name for material.
+        cycles (int): number of cycles (default = simulation_cycles in config).
+        initialization_cycles (int): number of initialization cycles (default =
+            initialization_cycles in config).
+        restart (bool): start from the configurations in RestartInitial.
+        seed (int): random seed (default: chosen by RASPA).
+        pressures (list): external pressures [Pa] (default = external_pressure
+            in config).
 
     Writes RASPA input-file.
 
@@ -24,15 +43,18 @@ def write_raspa_file(config, filename, name, helium_void_fraction):
 SimulationType                  MonteCarlo
 NumberOfCycles                  $NumberOfCycles
 NumberOfInitializationCycles    $NumberOfInitializationCycles
-PrintEvery                      10
-RestartFile                     no
+PrintEvery                      $PrintEvery
+RestartFile                     $RestartFile
+$Checkpoint
+$RandomSeed
+$Grid
 
 Forcefield                      GenericMOFs
-CutOff                          12.8
+CutOff                          $CutOff
 
 Framework                       0
 FrameworkName                   $FrameworkName
-UnitCells                       2 2 2
+UnitCells                       $UnitCells
 HeliumVoidFraction              $HeliumVoidFraction
 ExternalTemperature             $ExternalTemperature
 ExternalPressure                $ExternalPressure
@@ -44,39 +66,48 @@ Component 0 MoleculeName                $MoleculeName
             SwapProbability             1.0
             CreateNumberOfMolecules     0""")
     simulation_config = config['simulations']['gas_adsorption']
+    if cycles is None:
+        cycles = simulation_config['simulation_cycles']
+    if initialization_cycles is None:
+        initialization_cycles = simulation_config['initialization_cycles']
+    if pressures is None:
+        pressures = simulation_config['external_pressure']
+    if cells is None:
+        cells = unit_cells(config, name)
+    if not isinstance(pressures, list):
+        pressures = [pressures]
     with open(filename, 'w') as raspa_input_file:
         raspa_input_file.write(
                 s.substitute(
-                    NumberOfCycles = simulation_config['simulation_cycles'],
-                    NumberOfInitializationCycles = simulation_config['initialization_cycles'],
+                    NumberOfCycles = cycles,
+                    NumberOfInitializationCycles = initialization_cycles,
+                    PrintEvery = print_every(config, initialization_cycles + cycles, 10),
+                    RestartFile = 'yes' if restart else 'no',
+                    Checkpoint = checkpoint_options(config),
+                    RandomSeed = seed_option(seed),
+                    Grid = grid_options(config, simulation_config['adsorbate']),
+                    CutOff = CUTOFF,
+                    UnitCells = '%d %d %d' % cells,
                     FrameworkName = name,
                     HeliumVoidFraction = helium_void_fraction,
                     ExternalTemperature = simulation_config['external_temperature'],
-                    ExternalPressure = '{} {}'.format(*simulation_config['external_pressure']),
+                    ExternalPressure = ' '.join(str(p) for p in pressures),
                     MoleculeName = simulation_config['adsorbate']))
 
-def find_output_file(output_dir, pressure):
-    if pressure >= 10 ** 6:
-        p_string = '{:.1e}'.format(pressure)
-    else:
-        p_string = str(pressure)
-
-    output_subdir = os.path.join(output_dir, 'Output', 'System_0')
-    for file_name in os.listdir(output_subdir):
-        if p_string in file_name:
-            return os.path.join(output_subdir, file_name)
-
-def parse_output(output_dir, simulation_config):
-    """Parse output file for gas loading data.
+def parse_output(output_dir, name, simulation_config, cells=(2, 2, 2)):
+    """Parse output files for gas loading data.
 
     Args:
-        output_file (str): path to simulation output file.
+        output_dir (str): directory the simulation ran in.
+        name (str): name of material.
+        simulation_config (dict): gas adsorption parameters from config.
+        cells (tuple): unit cells the simulation ran with.
 
     Returns:
         results (dict): absolute and excess molar, gravimetric, and volumetric
             gas loadings, as well as energy of average, van der Waals, and
             Coulombic host-host, host-adsorbate, and adsorbate-adsorbate
-            interations.
+            interations, and the error of the absolute volumetric loading.
 
     """
     results = {}
@@ -92,47 +123,17 @@ def parse_output(output_dir, simulation_config):
     f = 'ga0'
     for p in [ga0_pressure, ga1_pressure]:
         if p != None:
-            output_file = find_output_file(output_dir, p)
-            with open(output_file) as origin:
-                line_counter = 1
-                for line in origin:
-                    if "absolute [mol/kg" in line:
-                        results['{}_absolute_molar_loading'.format(f)] = float(line.split()[5])
-                    elif "absolute [cm^3 (STP)/g" in line:
-                        results['{}_absolute_gravimetric_loading'.format(f)] = float(line.split()[6])
-                    elif "absolute [cm^3 (STP)/c" in line:
-                        results['{}_absolute_volumetric_loading'.format(f)] = float(line.split()[6])
-                    elif "excess [mol/kg" in line:
-                        results['{}_excess_molar_loading'.format(f)] = float(line.split()[5])
-                    elif "excess [cm^3 (STP)/g" in line:
-                        results['{}_excess_gravimetric_loading'.format(f)] = float(line.split()[6])
-                    elif "excess [cm^3 (STP)/c" in line:
-                        results['{}_excess_volumetric_loading'.format(f)] = float(line.split()[6])
-                    elif "Average Host-Host energy:" in line:
-                        host_host_line = line_counter + 8
-                    elif "Average Adsorbate-Adsorbate energy:" in line:
-                        adsorbate_adsorbate_line = line_counter + 8
-                    elif "Average Host-Adsorbate energy:" in line:
-                        host_adsorbate_line = line_counter + 8
-                    line_counter += 1
-
-            with open(output_file) as origin:
-                line_counter = 1
-                for line in origin:
-                    if line_counter == host_host_line:
-                        results['{}_host_host_avg'.format(f)] = float(line.split()[1])
-                        results['{}_host_host_vdw'.format(f)] = float(line.split()[5])
-                        results['{}_host_host_cou'.format(f)] = float(line.split()[7])
-                    elif line_counter == adsorbate_adsorbate_line:
-                        results['{}_adsorbate_adsorbate_avg'.format(f)] = float(line.split()[1])
-                        results['{}_adsorbate_adsorbate_vdw'.format(f)] = float(line.split()[5])
-                        results['{}_adsorbate_adsorbate_cou'.format(f)] = float(line.split()[7])
-                    elif line_counter == host_adsorbate_line:
-                        results['{}_host_adsorbate_avg'.format(f)] = float(line.split()[1])
-                        results['{}_host_adsorbate_vdw'.format(f)] = float(line.split()[5])
-                        results['{}_host_adsorbate_cou'.format(f)] = float(line.split()[7])
-                    line_counter += 1
-        
+            output_file = output_file_path(
+                output_dir, name,
+                unit_cells = cells,
+                temperature = simulation_config['external_temperature'],
+                pressure = p)
+            parsed = parse_output_file(output_file)
+            for key, value in parsed.items():
+                if not key.endswith('_error'):
+                    results['{}_{}'.format(f, key)] = value
+            results['{}_error_estimate'.format(f)] = parsed.get('absolute_volumetric_loading_error')
+
             f = 'ga1'  # flag for second pressure gas adsorption simulations
 
             print('Pressure : {}'.format(p))
@@ -140,58 +141,249 @@ def parse_output(output_dir, simulation_config):
 
     return results
 
-def run(config, run_id, name, helium_void_fraction):
+def continue_from_restart(output_dir):
+    """Make RASPA's final configurations the starting point of the next run.
+
+    Args:
+        output_dir (str): simulation directory.
+
+    Copies Restart/System_0 to RestartInitial/System_0, which RASPA reads when
+    `RestartFile` is set.
+
+    """
+    source = os.path.join(output_dir, 'Restart', 'System_0')
+    target = os.path.join(output_dir, 'RestartInitial', 'System_0')
+    os.makedirs(target, exist_ok=True)
+    for file_name in os.listdir(source):
+        shutil.copy(os.path.join(source, file_name), target)
+
+def warm_start(source_dir, output_dir, name, temperature, source_pressure, pressure,
+               cells=(2, 2, 2)):
+    """Start a simulation from the final configuration of one at another pressure.
+
+    Args:
+        source_dir (str): directory of the finished simulation.
+        output_dir (str): directory of the simulation to start.
+        name (str): name of material.
+        temperature (float): external temperature [K] of both simulations.
+        source_pressure (float): external pressure [Pa] of the finished one.
+        pressure (float): external pressure [Pa] of the one to start.
+        cells (tuple): unit cells both simulations run with.
+
+    Copies the finished simulation's restart file to RestartInitial/System_0,
+    renamed for `pressure` so RASPA reads it when `RestartFile` is set.
+
+    """
+    source = os.path.join(source_dir, 'Restart', 'System_0', restart_file_name(
+        name, cells, temperature, source_pressure))
+    target_dir = os.path.join(output_dir, 'RestartInitial', 'System_0')
+    os.makedirs(target_dir, exist_ok=True)
+    shutil.copy(source, os.path.join(target_dir, restart_file_name(
+        name, cells, temperature, pressure)))
+
+def run_point(config, output_dir, name, helium_void_fraction, pressure, seed=None,
+              warm_start_from=None, cells=None):
+    """Runs gas loading simulation at a single pressure of an isotherm.
+
+    Args:
+        output_dir (str): simulation directory.
+        name (str): name of material.
+        helium_void_fraction (float): void fraction of material.
+        pressure (float): external pressure [Pa].
+        seed (int): random seed (default: chosen by RASPA).
+        warm_start_from (tuple): (directory, pressure) of a finished point to
+            start from, with `isotherm: warm_start_initialization_cycles`
+            instead of `initialization_cycles`.
+        cells (tuple): unit cells (default: from unit_cells).
+
+    Returns:
+        point (dict): loadings and energies, with `pressure`, `temperature`,
+            `error_estimate` and `stop_cycle`.
+
+    """
+    simulation_config = config['simulations']['gas_adsorption']
+    temperature = simulation_config['external_temperature']
+    warm_cycles = simulation_config['isotherm'].get(
+        'warm_start_initialization_cycles', simulation_config['initialization_cycles'])
+
+    print("Output directory :\t%s" % output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, "GasAdsorption.input")
+
+    stage_inputs(config, output_dir, name)
+    link_grid(config, name, simulation_config['adsorbate'], output_dir)
+    if cells is None:
+        cells = unit_cells(config, name)
+    if warm_start_from is not None:
+        warm_start(warm_start_from[0], output_dir, name, temperature,
+                   warm_start_from[1], pressure, cells)
+
+    def write_input(cycles, first):
+        if not first:
+            continue_from_restart(output_dir)
+            initialization_cycles = 0
+        elif warm_start_from is not None:
+            initialization_cycles = warm_cycles
+        else:
+            initialization_cycles = None
+        write_raspa_file(config, filename, name, helium_void_fraction, cycles,
+                         initialization_cycles = initialization_cycles,
+                         restart = not first or warm_start_from is not None,
+                         seed = seed, pressures = [pressure], cells = cells)
+
+    def parse():
+        parsed = parse_output_file(output_file_path(
+            output_dir, name, unit_cells=cells, temperature=temperature, pressure=pressure))
+        point = {key : value for key, value in parsed.items() if not key.endswith('_error')}
+        point['error_estimate'] = parsed.get('absolute_volumetric_loading_error')
+        point['pressure'] = pressure
+        point['temperature'] = temperature
+        print('Pressure : {}'.format(pressure))
+        print('\n', point, '\n')
+        return point
+
+    print("Calculating gas loading in %s at %s Pa..." % (name, pressure))
+    return run_cycles(
+        config, 'gas_adsorption', output_dir, 'GasAdsorption.input', write_input, parse,
+        [('absolute_volumetric_loading', 'error_estimate')], 'stop_cycle')
+
+def concurrent_points(isotherm):
+    """Number of isotherm points simulated at once.
+
+    Args:
+        isotherm (dict): `isotherm` block of the gas adsorption config.
+
+    Returns:
+        points (int): `concurrent_points` from the block. The default is
+            every point, or with `warm_start` enough points for chains of
+            WARM_START_CHAIN_LENGTH, since a point can only start warm once
+            the point below it has finished.
+
+    """
+    points = len(isotherm['pressures'])
+    if isotherm.get('warm_start'):
+        default = int(math.ceil(points / WARM_START_CHAIN_LENGTH))
+    else:
+        default = points
+    return max(isotherm.get('concurrent_points', default), 1)
+
+def run_isotherm(config, run_id, name, helium_void_fraction, seed=None):
+    """Runs gas loading simulations at every pressure of an isotherm.
+
+    Args:
+        run_id (str): identification string for run.
+        name (str): name of material.
+        helium_void_fraction (float): void fraction of material.
+        seed (int): random seed (default: chosen by RASPA).
+
+    Returns:
+        results (dict): isotherm points, ordered by pressure, under 'isotherm'
+            and their number in `ga_isotherm_points`; the highest pressure
+            point is also stored in the `ga0_*` columns and the lowest in the
+            `ga1_*` columns.
+
+    Each pressure runs as its own RASPA process, concurrent_points at a time.
+    With `isotherm: warm_start`, every point after the first
+    concurrent_points starts from the final configuration of the point
+    concurrent_points below it, so the isotherm runs as that many chains of
+    increasing pressure; with every point at once, none starts warm.
+
+    """
+    simulation_config = config['simulations']['gas_adsorption']
+    isotherm = simulation_config['isotherm']
+    pressures = sorted(isotherm['pressures'])
+    concurrent = concurrent_points(isotherm)
+    output_dirs = [output_directory(config, run_id, name, 'gas_adsorption_%g' % p, seed)
+                   for p in pressures]
+    cells = unit_cells(config, name)
+
+    tasks, dependencies = {}, {}
+    for i, pressure in enumerate(pressures):
+        warm_start_from = None
+        if isotherm.get('warm_start') and i >= concurrent:
+            warm_start_from = (output_dirs[i - concurrent], pressures[i - concurrent])
+            dependencies[i] = [i - concurrent]
+        tasks[i] = telemetry.bind(lambda i=i, warm_start_from=warm_start_from: run_point(
+            config, output_dirs[i], name, helium_void_fraction, pressures[i], seed,
+            warm_start_from, cells))
+    try:
+        points, timings = run_graph(tasks, dependencies, max_workers=concurrent)
+    except Exception:
+        # run_graph waits for the points still running, so no directory is in use
+        for output_dir in output_dirs:
+            discard_output(config, output_dir)
+        raise
+    points = [points[i] for i in range(len(pressures))]
+
+    record_bytes_written(*output_dirs)
+    for pressure, output_dir in zip(pressures, output_dirs):
+        finish_output(config, run_id, name, 'gas_adsorption_%g' % pressure, output_dir, seed)
+    sys.stdout.flush()
+
+    results = {
+        'isotherm' : points,
+        'ga_isotherm_points' : len(points),
+        'ga_stop_cycle' : max(point['stop_cycle'] for point in points),
+    }
+    labelled = [('ga0', points[-1])] + ([('ga1', points[0])] if len(points) > 1 else [])
+    for f, point in labelled:
+        for key, value in point.items():
+            if key not in ('pressure', 'temperature', 'stop_cycle'):
+                results['{}_{}'.format(f, key)] = value
+    return results
+
+def run(config, run_id, name, helium_void_fraction, seed=None):
     """Runs gas loading simulation.
 
     Args:
         run_id (str): identification string for run.
         material_id (str): unique identifier for material.
+        seed (int): random seed (default: chosen by RASPA).
 
     Returns:
         results (dict): gas loading simulation results.
 
+    With an `isotherm` block in the gas adsorption config, runs run_isotherm
+    instead of a single simulation at `external_pressure`.
+
     """
-    simulation_directory  = config['simulations_directory']
+    simulation_config = config['simulations']['gas_adsorption']
+    if 'isotherm' in simulation_config:
+        return run_isotherm(config, run_id, name, helium_void_fraction, seed)
 
-    if simulation_directory == 'non_pseudo':
-        non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
-        path = os.path.join(non_pseudo_dir, run_id, name)
-    elif simulation_directory == 'scratch':
-        path = os.environ['LOCAL']
-    else:
-        print('OUTPUT DIRECTORY NOT FOUND.')
-    output_dir = os.path.join(path, 'output_%s_%s' % (name, uuid4()))
+    output_dir = output_directory(config, run_id, name, 'gas_adsorption', seed)
 
     print("Output directory :\t%s" % output_dir)
-    os.makedirs(output_dir, exist_ok=True)
-    filename = os.path.join(output_dir, "GasAdsorption.input")
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        filename = os.path.join(output_dir, "GasAdsorption.input")
+
+        stage_inputs(config, output_dir, name)
+        link_grid(config, name, simulation_config['adsorbate'], output_dir)
+        cells = unit_cells(config, name)
+
+        def write_input(cycles, first):
+            if not first:
+                continue_from_restart(output_dir)
+            write_raspa_file(config, filename, name, helium_void_fraction, cycles,
+                             initialization_cycles = None if first else 0,
+                             restart = not first, seed = seed, cells = cells)
+
+        quantities = [('ga0_absolute_volumetric_loading', 'ga0_error_estimate')]
+        pressure = simulation_config['external_pressure']
+        if isinstance(pressure, list) and len(pressure) > 1:
+            quantities.append(('ga1_absolute_volumetric_loading', 'ga1_error_estimate'))
 
-    write_raspa_file(config, filename, name, helium_void_fraction)
-    force_field_path = os.path.join(non_pseudo_dir, 'non_pseudo', 'simulation', 'forcefield')
-    shutil.copy(os.path.join(force_field_path, 'force_field_mixing_rules.def'), output_dir)
-    shutil.copy(os.path.join(force_field_path, 'force_field.def'), output_dir)
-    shutil.copy(os.path.join(force_field_path, 'pseudo_atoms.def'), output_dir)
-    cif_path = os.path.join(non_pseudo_dir, 'cif_files')
-    mat_path = os.path.join(cif_path, '%s.cif' % name)
-    print(mat_path)
-    shutil.copy(mat_path, output_dir)
-
-    while True:
-        try:
-            print("Date :\t%s" % datetime.now().date().isoformat())
-            print("Time :\t%s" % datetime.now().time().isoformat())
-            print("Calculating gas loading in %s..." % (name))
-            print('Running...')
-            print(output_dir)
-            subprocess.run('simulate GasAdsorption.input', shell=True, check=True, cwd=output_dir)
-            print('...done running?')
-            results = parse_output(output_dir, config['simulations']['gas_adsorption'])
-            shutil.rmtree(path, ignore_errors=True)
-            sys.stdout.flush()
-        except (subprocess.CalledProcessError, FileNotFoundError, IndexError, KeyError) as err:
-            print(err)
-            print(err.args)
-            continue
-        break
+        print("Calculating gas loading in %s..." % (name))
+        results = run_cycles(
+            config, 'gas_adsorption', output_dir, 'GasAdsorption.input', write_input,
+            lambda: parse_output(output_dir, name, simulation_config, cells),
+            quantities, 'ga_stop_cycle')
+    except Exception:
+        discard_output(config, output_dir)
+        raise
+    record_bytes_written(output_dir)
+    finish_output(config, run_id, name, 'gas_adsorption', output_dir, seed)
+    sys.stdout.flush()
 
     return results
@@ -1,21 +1,26 @@
 import sys
 import os
-import subprocess
-import shutil
-from datetime import datetime
-from uuid import uuid4
 from string import Template
 
 import non_pseudo
 from non_pseudo import config
-
-def write_raspa_file(config, filename, name):
+from non_pseudo.simulation.staging import stage_inputs
+from non_pseudo.simulation.energy_grid import grid_options, link_grid
+from non_pseudo.simulation.utilities import (output_directory, checkpoint_options,
+    seed_option, unit_cells, CUTOFF, run_cycles, print_every, record_bytes_written,
+    finish_output, discard_output)
+from non_pseudo.simulation.raspa_output import output_file_path, parse_output_file
+
+def write_raspa_file(config, filename, name, cycles=None, seed=None, cells=None):
     """Writes RASPA input file for calculating helium void fraction.
 
     Args:
         filename (str): path to input file.
         run_id (str): identification string for run.
         material_id (str): name for material.
+        cycles (int): number of cycles (default = simulation_cycles in config).
+        seed (int): random seed (default: chosen by RASPA).
+        cells (tuple): unit cells along a, b and c (default: from unit_cells).
 
     Writes RASPA input-file.
 
@@ -23,25 +28,38 @@ def write_raspa_file(config, filename, name):
     s = Template("""
 SimulationType          MonteCarlo
 NumberOfCycles          $NumberOfCycles
-PrintEvery              10
-PrintPropertiesEvery    10
+PrintEvery              $PrintEvery
+PrintPropertiesEvery    $PrintEvery
+$Checkpoint
+$RandomSeed
+$Grid
 
 Forcefield              GenericMOFs
-CutOff                  12.8
+CutOff                  $CutOff
 
 Framework               0
 FrameworkName           $FrameworkName
-UnitCells               2 2 2
+UnitCells               $UnitCells
 ExternalTemperature     298.0
 
 Component 0 MoleculeName                helium
             MoleculeDefinition          TraPPE
             WidomProbability            1.0
             CreateNumberOfMolecules     0""")
+    if cycles is None:
+        cycles = config['simulations']['helium_void_fraction']['simulation_cycles']
+    if cells is None:
+        cells = unit_cells(config, name)
     with open(filename, 'w') as raspa_input_file:
         raspa_input_file.write(
                 s.substitute(
-                    NumberOfCycles = config['simulations']['helium_void_fraction']['simulation_cycles'],
+                    NumberOfCycles = cycles,
+                    PrintEvery = print_every(config, cycles, 10),
+                    Checkpoint = checkpoint_options(config),
+                    RandomSeed = seed_option(seed),
+                    Grid = grid_options(config, 'helium'),
+                    CutOff = CUTOFF,
+                    UnitCells = '%d %d %d' % cells,
                     FrameworkName = name))
 
 def parse_output(output_file):
@@ -51,70 +69,59 @@ def parse_output(output_file):
         output_file (str): path to simulation output file.
 
     Returns:
-        results (dict): average Widom Rosenbluth-weight.
+        results (dict): average Widom Rosenbluth-weight and its error.
 
     """
-    results = {}
-    with open(output_file) as origin:
-        for line in origin:
-            if not "Average Widom Rosenbluth-weight:" in line:
-                continue
-            results['vf_helium_void_fraction'] = float(line.split()[4])
-        print("\nVOID FRACTION :   %s\n" % (results['vf_helium_void_fraction']))
+    parsed = parse_output_file(output_file)
+    results = {
+        'vf_helium_void_fraction' : parsed['helium_void_fraction'],
+        'vf_error_estimate' : parsed.get('helium_void_fraction_error'),
+    }
+    print("\nVOID FRACTION :   %s\n" % (results['vf_helium_void_fraction']))
     return results
 
-def run(config, run_id, name):
+def run(config, run_id, name, seed=None):
     """Runs void fraction simulation.
 
     Args:
         run_id (str): identification string for run.
         material_id (str): unique identifier for material.
+        seed (int): random seed (default: chosen by RASPA).
 
     Returns:
         results (dict): void fraction simulation results.
 
-    """
-    simulation_directory  = config['simulations_directory']
+    With `engine: native` in the void fraction config, the Widom insertions
+    run in-process (see native_void_fraction) instead of in RASPA.
 
-    if simulation_directory == 'non_pseudo':
-        non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
-        path = os.path.join(non_pseudo_dir, run_id, name)
-    elif simulation_directory == 'scratch':
-        path = os.environ['LOCAL']
-    else:
-        print('OUTPUT DIRECTORY NOT FOUND.')
-    output_dir = os.path.join(path, 'output_%s_%s' % (name, uuid4()))
+    """
+    if config['simulations']['helium_void_fraction'].get('engine') == 'native':
+        from non_pseudo.simulation import native_void_fraction
+        return native_void_fraction.run(config, run_id, name, seed)
 
+    output_dir = output_directory(config, run_id, name, 'helium_void_fraction', seed)
 
     print("Output directory :\t%s" % output_dir)
-    os.makedirs(output_dir, exist_ok=True)
-    filename = os.path.join(output_dir, "VoidFraction.input")
-     
-    write_raspa_file(config, filename, name)
-    force_field_path = os.path.join(non_pseudo_dir, 'non_pseudo', 'simulation', 'forcefield')
-    shutil.copy(os.path.join(force_field_path, 'force_field_mixing_rules.def'), output_dir)
-    shutil.copy(os.path.join(force_field_path, 'force_field.def'), output_dir)
-    shutil.copy(os.path.join(force_field_path, 'pseudo_atoms.def'), output_dir)
-    cif_path = os.path.join(non_pseudo_dir, 'cif_files')
-    mat_path = os.path.join(cif_path, '%s.cif' % name)
-    print(mat_path)
-    shutil.copy(mat_path, output_dir)
-
-    while True:
-        try:
-            print("Date :\t%s" % datetime.now().date().isoformat())
-            print("Time :\t%s" % datetime.now().time().isoformat())
-            print("Calculating void fraction of %s..." % (name))
-            subprocess.run(['simulate', 'VoidFraction.input'], check=True, cwd=output_dir)
-            filename = "output_%s_2.2.2_298.000000_0.data" % (name)
-            output_file = os.path.join(output_dir, 'Output', 'System_0', filename)
-            results = parse_output(output_file)
-#            shutil.rmtree(path, ignore_errors=True)
-            sys.stdout.flush()
-        except (subprocess.CalledProcessError, FileNotFoundError, IndexError, KeyError) as err:
-            print(err)
-            print(err.args)
-            continue
-        break
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        filename = os.path.join(output_dir, "VoidFraction.input")
+
+        stage_inputs(config, output_dir, name)
+        link_grid(config, name, 'helium', output_dir)
+        cells = unit_cells(config, name)
+
+        print("Calculating void fraction of %s..." % (name))
+        results = run_cycles(
+            config, 'helium_void_fraction', output_dir, 'VoidFraction.input',
+            lambda cycles, first: write_raspa_file(config, filename, name, cycles, seed, cells),
+            lambda: parse_output(output_file_path(output_dir, name, unit_cells=cells)),
+            [('vf_helium_void_fraction', 'vf_error_estimate')], 'vf_stop_cycle')
+    except Exception:
+        discard_output(config, output_dir)
+        raise
+    record_bytes_written(output_dir)
+    finish_output(config, run_id, name, 'helium_void_fraction', output_dir, seed,
+                  keep = config['simulations_directory'] != 'tmpfs' and 'checkpoint' not in config)
+    sys.stdout.flush()
 
     return results
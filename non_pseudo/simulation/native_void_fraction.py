@@ -0,0 +1,223 @@
+import os
+import sys
+from itertools import product
+from time import process_time
+
+import numpy as np
+
+from non_pseudo.cif import read_cif, lattice_vectors, atom_types
+from non_pseudo.simulation.staging import cif_path, force_field_directory
+from non_pseudo.simulation.utilities import CUTOFF
+
+# match the RASPA input written by helium_void_fraction.write_raspa_file
+TEMPERATURE = 298.
+PROBE = 'He'
+
+# largest (points x atoms) distance array computed at once
+_BATCH_ELEMENTS = 1 << 21
+
+def load_mixing_rules(path):
+    """Read Lennard-Jones parameters from a RASPA mixing rules file.
+
+    Args:
+        path (str): path to force_field_mixing_rules.def.
+
+    Returns:
+        parameters (dict): pseudo-atom type -> (epsilon [K], sigma [A]); types
+            without interactions have epsilon 0.
+        shifted (bool): True if potentials are shifted to 0 at the cutoff.
+
+    """
+    with open(path) as rules_file:
+        lines = [line.split() for line in rules_file
+                 if line.strip() and not line.startswith('#')]
+    shifted = lines[0][0] == 'shifted'
+    parameters = {}
+    for fields in lines[3:3 + int(lines[2][0])]:
+        if fields[1] == 'lennard-jones':
+            parameters[fields[0]] = (float(fields[2]), float(fields[3]))
+        else:
+            parameters[fields[0]] = (0., 0.)
+    return parameters, shifted
+
+def framework_type(element, parameters):
+    """Pseudo-atom type of a framework element in a mixing rules table.
+
+    Args:
+        element (str): atom-site label without digits (ex. 'Zn').
+        parameters (dict): from load_mixing_rules.
+
+    Returns:
+        type (str): `element` if it is defined, else the generic type
+            '<element>_' (ex. 'Zn_'); None if neither is.
+
+    """
+    for key in (element, '{}_'.format(element)):
+        if key in parameters:
+            return key
+    return None
+
+def probe_parameters(labels, parameters, probe=PROBE):
+    """Probe-framework Lennard-Jones parameters, by Lorentz-Berthelot mixing.
+
+    Args:
+        labels (array): atom-site labels of the framework.
+        parameters (dict): from load_mixing_rules.
+        probe (str): pseudo-atom type of the probe.
+
+    Returns:
+        epsilon (array): mixed epsilon [K] of each framework atom.
+        sigma (array): mixed sigma [A] of each framework atom.
+
+    Framework labels are matched to generic types by their element, as in
+    `<element>_` (ex. 'Zn12' -> 'Zn_').
+
+    """
+    probe_epsilon, probe_sigma = parameters[probe]
+    mixed = {}
+    for element in set(atom_types(labels)):
+        key = framework_type(element, parameters)
+        if key is None:
+            raise KeyError('No Lennard-Jones parameters for framework atom : {}'.format(element))
+        epsilon, sigma = parameters[key]
+        mixed[element] = (np.sqrt(epsilon * probe_epsilon), (sigma + probe_sigma) / 2.)
+    pairs = np.array([mixed[element] for element in atom_types(labels)]).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+def cell_lists(fractional, lattice, cutoff, bin_width):
+    """Bin the unit cell and find the framework atoms near each bin.
+
+    Args:
+        fractional (array): (atoms, 3) fractional coordinates in the unit cell.
+        lattice (array): lattice vectors as rows.
+        cutoff (float): interaction cutoff [A].
+        bin_width (float): target bin width [A].
+
+    Returns:
+        bins (array): number of bins along a, b and c.
+        positions (array): Cartesian coordinates of periodic images of the
+            framework atoms within `cutoff` of the unit cell.
+        atoms (array): index of the framework atom of each image.
+        neighbors (list): for each bin (in C order), indices into `positions`
+            of the images within `cutoff` of any point in the bin.
+
+    """
+    volume = abs(np.linalg.det(lattice))
+    widths = volume / np.linalg.norm(np.cross(lattice[[1, 2, 0]], lattice[[2, 0, 1]]), axis=1)
+    bins = np.maximum((widths // bin_width).astype(int), 1)
+
+    reach = cutoff / widths
+    images = np.ceil(reach).astype(int)
+    shifts = np.array(list(product(*[range(-n, n + 1) for n in images])), dtype=float)
+    image_fractional = (fractional[None, :, :] + shifts[:, None, :]).reshape(-1, 3)
+    atoms = np.tile(np.arange(len(fractional)), len(shifts))
+    inside = np.all((image_fractional >= -reach) & (image_fractional <= 1 + reach), axis=1)
+    positions = image_fractional[inside] @ lattice
+    atoms = atoms[inside]
+
+    steps = lattice / bins[:, None]
+    half_diagonal = max(np.linalg.norm(sa * steps[0] + sb * steps[1] + steps[2])
+                        for sa, sb in product((-1, 1), repeat=2)) / 2.
+    centers = (np.array(list(np.ndindex(*bins))) + 0.5) / bins @ lattice
+    neighbors = []
+    for center in centers:
+        distance = np.sqrt(((positions - center) ** 2).sum(axis=1))
+        neighbors.append(np.flatnonzero(distance <= cutoff + half_diagonal))
+    return bins, positions, atoms, neighbors
+
+def widom_void_fraction(crystal, parameters, insertions=100000, temperature=TEMPERATURE,
+                        cutoff=CUTOFF, shifted=True, bin_width=4., blocks=5, seed=None):
+    """Helium void fraction by Widom insertion of a probe.
+
+    Args:
+        crystal (Crystal): framework.
+        parameters (dict): from load_mixing_rules.
+        insertions (int): number of random insertion points.
+        temperature (float): temperature [K].
+        cutoff (float): interaction cutoff [A].
+        shifted (bool): shift potentials to 0 at the cutoff.
+        bin_width (float): target width of cell-list bins [A].
+        blocks (int): number of blocks the error is estimated from.
+        seed (int): seed of the random insertion points.
+
+    Returns:
+        void_fraction (float): average Boltzmann factor exp(-U / kT) of the
+            probe at uniformly random points in the unit cell.
+        error (float): standard error of the block averages, or None with
+            fewer than two blocks.
+
+    Insertion points are grouped by cell-list bin; each group is evaluated
+    against only the atoms near its bin, as one array operation per batch.
+
+    """
+    lattice = lattice_vectors(crystal.lengths, crystal.angles)
+    epsilon, sigma = probe_parameters(crystal.labels, parameters)
+    interacting = epsilon > 0
+    fractional = np.mod(crystal.fractional[interacting], 1.)
+    epsilon, sigma = epsilon[interacting], sigma[interacting]
+    bins, positions, atoms, neighbors = cell_lists(fractional, lattice, cutoff, bin_width)
+    epsilon4, sigma2 = 4 * epsilon[atoms], sigma[atoms] ** 2
+    if shifted:
+        sr6 = (sigma2 / cutoff ** 2) ** 3
+        shift = epsilon4 * (sr6 ** 2 - sr6)
+    else:
+        shift = np.zeros(len(atoms))
+
+    rng = np.random.RandomState(seed)
+    points = rng.random_sample((insertions, 3))
+    bin_index = np.ravel_multi_index(
+        tuple(np.minimum((points * bins).astype(int), bins - 1).T), tuple(bins))
+    order = np.argsort(bin_index, kind='mergesort')
+    bounds = np.searchsorted(bin_index[order], np.arange(len(neighbors) + 1))
+    cartesian = points @ lattice
+
+    weights = np.ones(insertions)
+    for b, near in enumerate(neighbors):
+        members = order[bounds[b]:bounds[b + 1]]
+        if len(near) == 0 or len(members) == 0:
+            continue
+        batch = max(_BATCH_ELEMENTS // len(near), 1)
+        for start in range(0, len(members), batch):
+            index = members[start:start + batch]
+            delta = cartesian[index, None, :] - positions[None, near, :]
+            r2 = np.maximum(np.einsum('ijk,ijk->ij', delta, delta), 1e-12)
+            sr6 = (sigma2[near] / r2) ** 3
+            energy = np.where(r2 < cutoff ** 2,
+                              epsilon4[near] * (sr6 ** 2 - sr6) - shift[near], 0.)
+            weights[index] = np.exp(-energy.sum(axis=1) / temperature)
+
+    block_averages = np.array([w.mean() for w in np.array_split(weights, blocks)])
+    error = block_averages.std(ddof=1) / np.sqrt(blocks) if blocks > 1 else None
+    return weights.mean(), error
+
+def run(config, run_id, name, seed=None):
+    """Calculates helium void fraction in-process, without RASPA.
+
+    Args:
+        run_id (str): identification string for run.
+        name (str): name of material.
+        seed (int): seed of the random insertion points.
+
+    Returns:
+        results (dict): void fraction and its error.
+
+    Uses `insertions` (default 100000) from the helium void fraction config.
+
+    """
+    simulation_config = config['simulations']['helium_void_fraction']
+    crystal = read_cif(cif_path(config, name))
+    parameters, shifted = load_mixing_rules(
+        os.path.join(force_field_directory(), 'force_field_mixing_rules.def'))
+
+    print("Calculating void fraction of %s (native)..." % (name))
+    start = process_time()
+    void_fraction, error = widom_void_fraction(
+        crystal, parameters, insertions=simulation_config.get('insertions', 100000),
+        shifted=shifted, seed=seed)
+    print("\nVOID FRACTION :   %s\n" % (void_fraction))
+    print("CPU time :\t%.2f s" % (process_time() - start))
+    sys.stdout.flush()
+    return {
+        'vf_helium_void_fraction' : float(void_fraction),
+        'vf_error_estimate' : None if error is None else float(error),
+    }
@@ -0,0 +1,154 @@
+import mmap
+import os
+import re
+
+# every line the parser reads a value from matches this pattern; it has no
+# groups, which keeps it on the regex engine's fast literal-scanning path
+_PATTERN = re.compile(
+    br'Average (?:loading (?:absolute|excess) \[|Host-Host energy:|'
+    br'Adsorbate-Adsorbate energy:|Host-Adsorbate energy:|Widom Rosenbluth-weight:)'
+    br'|Surface area')
+
+# loading units -> (result key suffix, index of value in split line)
+_LOADINGS = [
+    (b'mol/kg',          'molar_loading', 5),
+    (b'cm^3 (STP)/g',    'gravimetric_loading', 6),
+    (b'cm^3 (STP)/c',    'volumetric_loading', 6),
+]
+
+_ENERGIES = {
+    b'Average Host-Host energy:'             : 'host_host',
+    b'Average Adsorbate-Adsorbate energy:'   : 'adsorbate_adsorbate',
+    b'Average Host-Adsorbate energy:'        : 'host_adsorbate',
+}
+
+# the average of an energy block is printed this many lines after its header
+_ENERGY_OFFSET = 8
+
+_SURFACE_AREAS = [
+    'unit_cell_surface_area',
+    'gravimetric_surface_area',
+    'volumetric_surface_area',
+]
+
+def output_file_name(name, unit_cells=(2, 2, 2), temperature=298., pressure=0.):
+    """Name of the output file RASPA writes for a simulation.
+
+    Args:
+        name (str): framework name.
+        unit_cells (tuple): unit cells along a, b and c.
+        temperature (float): external temperature [K].
+        pressure (float): external pressure [Pa] (0 if none).
+
+    Returns:
+        file_name (str): ex. 'output_name_2.2.2_298.000000_3.5e+06.data'.
+
+    Uses the same formatting as RASPA (`%d.%d.%d_%lf_%lg`), so the file can be
+    opened directly instead of searched for.
+
+    """
+    return 'output_%s_%d.%d.%d_%f_%g.data' % (
+        (name,) + tuple(unit_cells) + (float(temperature), float(pressure)))
+
+def restart_file_name(name, unit_cells=(2, 2, 2), temperature=298., pressure=0.):
+    """Name of the restart file RASPA writes and reads for a simulation.
+
+    Args:
+        name (str): framework name.
+        unit_cells (tuple): unit cells along a, b and c.
+        temperature (float): external temperature [K].
+        pressure (float): external pressure [Pa] (0 if none).
+
+    Returns:
+        file_name (str): ex. 'restart_name_2.2.2_298.000000_3.5e+06', found in
+            Restart/System_0 after a run and read from RestartInitial/System_0
+            when `RestartFile` is set.
+
+    """
+    return 'restart_%s_%d.%d.%d_%f_%g' % (
+        (name,) + tuple(unit_cells) + (float(temperature), float(pressure)))
+
+def output_file_path(output_dir, name, **kwargs):
+    """Path to a RASPA output file in a simulation directory.
+
+    Args:
+        output_dir (str): directory RASPA ran in.
+        name (str): framework name.
+        **kwargs: passed to output_file_name.
+
+    Returns:
+        path (str): path to output file of System_0.
+
+    """
+    return os.path.join(output_dir, 'Output', 'System_0', output_file_name(name, **kwargs))
+
+def parse_output_file(output_file):
+    """Read every quantity the simulations use from a RASPA output file.
+
+    Args:
+        output_file (str): path to simulation output file.
+
+    Returns:
+        results (dict): quantities found in the file, keyed without a stage
+            prefix (ex. 'absolute_volumetric_loading', 'host_host_vdw',
+            'helium_void_fraction', 'unit_cell_surface_area').
+
+    The file is memory-mapped and scanned once with a single precompiled
+    pattern, so only the few matching lines are ever looked at in Python. Where a
+    quantity is printed more than once the last value is kept. Surface areas
+    are read in order from "Surface area" lines: unit cell, gravimetric, then
+    volumetric from the last one, as the surface area stage always has.
+    Loadings, the void fraction and surface areas are printed as 'value +/-
+    error'; the error is returned as '<key>_error'.
+
+    """
+    results = {}
+    surface_count = 0
+    with open(output_file, 'rb') as origin:
+        if os.fstat(origin.fileno()).st_size == 0:
+            return results
+        with mmap.mmap(origin.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for match in _PATTERN.finditer(data):
+                text = match.group()
+                if text in _ENERGIES:
+                    fields = _line_after(data, match.end(), _ENERGY_OFFSET).split()
+                    key = _ENERGIES[text]
+                    results['{}_avg'.format(key)] = float(fields[1])
+                    results['{}_vdw'.format(key)] = float(fields[5])
+                    results['{}_cou'.format(key)] = float(fields[7])
+                    continue
+                fields = _line_at(data, match.start()).split()
+                if text.startswith(b'Average loading'):
+                    kind = 'absolute' if b'absolute' in text else 'excess'
+                    units = data[match.end():match.end() + 12]
+                    for prefix, key, index in _LOADINGS:
+                        if units.startswith(prefix):
+                            _read_value(results, '{}_{}'.format(kind, key), fields, index)
+                elif text == b'Average Widom Rosenbluth-weight:':
+                    _read_value(results, 'helium_void_fraction', fields, 4)
+                else:
+                    key = _SURFACE_AREAS[min(surface_count, len(_SURFACE_AREAS) - 1)]
+                    results.pop('{}_error'.format(key), None)
+                    _read_value(results, key, fields, 2)
+                    surface_count += 1
+    return results
+
+def _read_value(results, key, fields, index):
+    """Store value at `index` of a split line, and its error if printed."""
+    results[key] = float(fields[index])
+    if len(fields) > index + 2 and fields[index + 1] == b'+/-':
+        results['{}_error'.format(key)] = float(fields[index + 2])
+
+def _line_at(data, position):
+    """Line of `data` containing `position`."""
+    start = data.rfind(b'\n', 0, position) + 1
+    end = data.find(b'\n', position)
+    return data[start:end if end != -1 else len(data)]
+
+def _line_after(data, position, offset):
+    """Line `offset` lines below the one containing `position`."""
+    for i in range(offset):
+        position = data.find(b'\n', position) + 1
+        if position == 0:
+            return b''
+    return _line_at(data, position)
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+
+import non_pseudo
+from non_pseudo.simulation.energy_grid import grid_molecules, grid_spacing
+from non_pseudo.simulation.staging import FORCE_FIELD_FILES, cif_path, file_hash, force_field_directory
+
+# lookups made by this process, as (stage, 'hit' | 'miss') -> count
+statistics = Counter()
+_lock = threading.Lock()
+
+# the cache is walked to evict entries once a process has stored this fraction
+# of `max_bytes` since its last walk, not on every store
+EVICT_FRACTION = 0.05
+_stored_bytes = 0
+
+# lookups.log is rotated to lookups.log.1 above this size
+LOG_MAX_BYTES = 1 << 20
+
+def cache_directory(config):
+    """Directory holding cached results.
+
+    Args:
+        config (dict): parameters specified in config.
+
+    Returns:
+        path (str): `result_cache: directory` from config (default:
+            result_cache in the non_pseudo directory).
+
+    """
+    non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+    default = os.path.join(non_pseudo_dir, 'result_cache')
+    return os.path.expandvars((config.get('result_cache') or {}).get('directory', default))
+
+def result_key(config, stage, name, inputs=None):
+    """Hash of everything a simulation's results depend on.
+
+    Args:
+        config (dict): parameters specified in config.
+        stage (str): simulation name (ex. 'surface_area').
+        name (str): name of material.
+        inputs (dict): results of other simulations used as input (ex. the
+            helium void fraction for gas adsorption).
+
+    Returns:
+        key (str): hex digest over the CIF contents, the force field files,
+            the stage's parameters and retests settings in config, the grid
+            spacing if the stage reads a grid (see grid_molecules), and
+            `inputs`. The material's name and run are not part of it, so
+            identical inputs share results across runs.
+
+    """
+    grid = None
+    if 'energy_grid' in config and grid_molecules(config, [stage]):
+        grid = grid_spacing(config)
+    description = {
+        'stage' : stage,
+        'cif' : file_hash(cif_path(config, name)),
+        'force_field' : [file_hash(os.path.join(force_field_directory(), f))
+                         for f in FORCE_FIELD_FILES],
+        'parameters' : config['simulations'][stage],
+        'retests' : config.get('retests'),
+        'energy_grid' : grid,
+        'inputs' : inputs or {},
+    }
+    encoded = json.dumps(description, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+def _entry_path(config, stage, key):
+    return os.path.join(cache_directory(config), stage, key[:2], '%s.json' % key)
+
+def _record(config, stage, outcome):
+    with _lock:
+        statistics[(stage, outcome)] += 1
+    log_path = os.path.join(cache_directory(config), 'lookups.log')
+    with open(log_path, 'a') as log:
+        log.write('%s %s\n' % (stage, outcome))
+        size = log.tell()
+    if size > LOG_MAX_BYTES:
+        try:
+            os.replace(log_path, log_path + '.1')
+        except FileNotFoundError:
+            # another worker rotated it first
+            pass
+
+def lookup(config, stage, key):
+    """Find cached results.
+
+    Args:
+        config (dict): parameters specified in config.
+        stage (str): simulation name.
+        key (str): from result_key.
+
+    Returns:
+        results (dict): cached results, or None on a miss.
+
+    """
+    path = _entry_path(config, stage, key)
+    try:
+        with open(path) as entry:
+            results = json.load(entry)
+    except (FileNotFoundError, ValueError):
+        _record(config, stage, 'miss')
+        return None
+    os.utime(path)
+    _record(config, stage, 'hit')
+    return results
+
+def store(config, stage, key, results):
+    """Add results to the cache and evict old entries if it's too large.
+
+    Args:
+        config (dict): parameters specified in config.
+        stage (str): simulation name.
+        key (str): from result_key.
+        results (dict): simulation results.
+
+    Walking the cache to find its size costs a stat per entry, so it is only
+    done once this process has stored EVICT_FRACTION of `result_cache:
+    max_bytes` since it last did; `nps cache-stats --max-bytes` evicts on
+    demand.
+
+    """
+    global _stored_bytes
+    path = _entry_path(config, stage, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as entry:
+        json.dump(results, entry)
+        size = entry.tell()
+    os.replace(tmp_path, path)
+    max_bytes = (config.get('result_cache') or {}).get('max_bytes')
+    if max_bytes is None:
+        return
+    with _lock:
+        _stored_bytes += size
+        due = _stored_bytes >= EVICT_FRACTION * max_bytes
+        if due:
+            _stored_bytes = 0
+    if due:
+        evict(config, max_bytes)
+
+def entries(config):
+    """List cached results.
+
+    Args:
+        config (dict): parameters specified in config.
+
+    Returns:
+        entries (list): (path, stage, size, last used) for every entry.
+
+    """
+    cache_dir = cache_directory(config)
+    found = []
+    for root, dirs, files in os.walk(cache_dir):
+        for f in files:
+            if not f.endswith('.json'):
+                continue
+            path = os.path.join(root, f)
+            stat = os.stat(path)
+            stage = os.path.relpath(path, cache_dir).split(os.sep)[0]
+            found.append((path, stage, stat.st_size, stat.st_mtime))
+    return found
+
+def evict(config, max_bytes):
+    """Delete least recently used entries until the cache fits in max_bytes.
+
+    Args:
+        config (dict): parameters specified in config.
+        max_bytes (int): size limit of the cache.
+
+    """
+    cached = sorted(entries(config), key=lambda entry: entry[3])
+    size = sum(entry[2] for entry in cached)
+    for path, stage, entry_size, last_used in cached:
+        if size <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        size -= entry_size
+
+def cached_run(config, stage, name, run, inputs=None):
+    """Return cached results for a simulation, or run it and cache them.
+
+    Args:
+        config (dict): parameters specified in config.
+        stage (str): simulation name.
+        name (str): name of material.
+        run (function): runs the simulation; called without arguments.
+        inputs (dict): results of other simulations the simulation uses.
+
+    Returns:
+        results (dict): simulation results.
+
+    Does nothing but call `run` unless `result_cache` is set in config.
+
+    """
+    if 'result_cache' not in config:
+        return run()
+    os.makedirs(cache_directory(config), exist_ok=True)
+    key = result_key(config, stage, name, inputs)
+    results = lookup(config, stage, key)
+    if results is not None:
+        print('Using cached {} results for {}.'.format(stage, name))
+        return results
+    results = run()
+    store(config, stage, key, results)
+    return results
+
+def lookup_statistics(config):
+    """Count cache hits and misses of all workers using the cache.
+
+    Args:
+        config (dict): parameters specified in config.
+
+    Returns:
+        counts (Counter): (stage, 'hit' | 'miss') -> count, over the recent
+            lookups kept in lookups.log and lookups.log.1 (up to twice
+            LOG_MAX_BYTES of them).
+
+    """
+    counts = Counter()
+    log_path = os.path.join(cache_directory(config), 'lookups.log')
+    for path in [log_path + '.1', log_path]:
+        if os.path.exists(path):
+            with open(path) as log:
+                for line in log:
+                    fields = line.split()
+                    if len(fields) == 2:
+                        counts[tuple(fields)] += 1
+    return counts
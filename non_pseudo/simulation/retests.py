@@ -0,0 +1,149 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from non_pseudo import telemetry
+
+# stage -> (prefix of its result columns, (value column, spread column) pairs
+# for the quantities whose spread decides whether more replicas are needed)
+STAGE_QUANTITIES = {
+    'helium_void_fraction' : ('vf', [('vf_helium_void_fraction', 'vf_spread')]),
+    'surface_area' : ('sa', [('sa_volumetric_surface_area', 'sa_spread')]),
+    'gas_adsorption' : ('ga', [('ga0_absolute_volumetric_loading', 'ga0_spread'),
+                               ('ga1_absolute_volumetric_loading', 'ga1_spread')]),
+}
+
+def replica_seed(run_id, name, stage, replica):
+    """Random seed of a replica.
+
+    Args:
+        run_id (str): identification string for run.
+        name (str): name of material.
+        stage (str): simulation name.
+        replica (int): index of replica.
+
+    Returns:
+        seed (int): derived from run, material and stage, so a rerun (ex. after
+            a crash) repeats the same replicas.
+
+    """
+    key = '{} {} {}'.format(run_id, name, stage).encode('utf-8')
+    return zlib.crc32(key) % 1000000000 + replica
+
+def merge_replicas(stage, replicas):
+    """Combine results of independent replicas.
+
+    Args:
+        stage (str): simulation name.
+        replicas (list): results of each replica.
+
+    Returns:
+        results (dict): mean of every result, with error estimates combined as
+            the error of the mean, the sample standard deviation of each main
+            quantity in its spread column, and the number of replicas in
+            '<prefix>_replicas'. Lists of results (ex. isotherm points) are
+            combined element by element. Integer counts (ex.
+            `ga_isotherm_points`) are the same for every replica and kept as
+            they are.
+
+    Raises:
+        ValueError: if replicas disagree on an integer count.
+
+    """
+    prefix, quantities = STAGE_QUANTITIES[stage]
+    n = len(replicas)
+    results = _mean(replicas)
+    for value, spread in quantities:
+        if results.get(value) is None:
+            continue
+        if n > 1:
+            results[spread] = (sum((r[value] - results[value]) ** 2
+                                   for r in replicas) / (n - 1)) ** 0.5
+        else:
+            results[spread] = None
+    results['{}_replicas'.format(prefix)] = n
+    return results
+
+def _mean(replicas):
+    n = len(replicas)
+    results = {}
+    for key in replicas[0]:
+        values = [r.get(key) for r in replicas]
+        if any(v is None for v in values):
+            results[key] = None
+        elif isinstance(values[0], list):
+            results[key] = [_mean(list(items)) for items in zip(*values)]
+        elif key.endswith('stop_cycle'):
+            results[key] = max(values)
+        elif key.endswith('error_estimate'):
+            results[key] = sum(v ** 2 for v in values) ** 0.5 / n
+        elif isinstance(values[0], int):
+            if any(v != values[0] for v in values):
+                raise ValueError('Replicas disagree on {} : {}'.format(key, values))
+            results[key] = values[0]
+        else:
+            results[key] = sum(values) / n
+    return results
+
+def relative_spread(stage, results):
+    """Largest spread of the replicas relative to the mean of a stage's quantities.
+
+    Args:
+        stage (str): simulation name.
+        results (dict): from merge_replicas.
+
+    Returns:
+        spread (float): max over quantities of spread / |mean|; infinite while
+            it can't be estimated.
+
+    """
+    prefix, quantities = STAGE_QUANTITIES[stage]
+    spreads = []
+    for value, spread in quantities:
+        if value not in results:
+            continue
+        if results[value] and results.get(spread) is not None:
+            spreads.append(results[spread] / abs(results[value]))
+        else:
+            spreads.append(float('inf'))
+    return max(spreads) if spreads else 0.
+
+def run_replicas(config, stage, run_id, name, run):
+    """Run a simulation as concurrent replicas with different random seeds.
+
+    Args:
+        config (dict): parameters specified in config.
+        stage (str): simulation name.
+        run_id (str): identification string for run.
+        name (str): name of material.
+        run (function): runs one replica; called as run(seed), with seed None
+            when retests are off.
+
+    Returns:
+        results (dict): from merge_replicas, or of the single run without a
+            `retests` block in config.
+
+    `retests: number` replicas run at once, so they take about as long as a
+    single run. While the spread of the replicas relative to their mean is
+    above `retests: tolerance`, another `number` replicas are run, up to
+    `retests: max_number` (default: three times `number`) in total.
+
+    """
+    retests = config.get('retests')
+    if not retests:
+        return run(None)
+    number = retests.get('number', 3)
+    tolerance = retests.get('tolerance')
+    max_number = retests.get('max_number', 3 * number)
+
+    replicas = []
+    with ThreadPoolExecutor(max_workers=number) as executor:
+        while True:
+            seeds = [replica_seed(run_id, name, stage, i) for i in range(
+                len(replicas), min(len(replicas) + number, max_number))]
+            replicas.extend(executor.map(telemetry.bind(run), seeds))
+            results = merge_replicas(stage, replicas)
+            spread = relative_spread(stage, results)
+            print('{} replicas of {} for {} : relative spread {}'.format(
+                len(replicas), stage, name, spread))
+            if tolerance is None or spread <= tolerance or len(replicas) >= max_number:
+                return results
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+import non_pseudo
+from non_pseudo import telemetry
+
+FORCE_FIELD_FILES = [
+    'force_field_mixing_rules.def',
+    'force_field.def',
+    'pseudo_atoms.def',
+]
+
+_hashes = {}
+_lock = threading.Lock()
+
+def force_field_directory():
+    """Directory holding the force field definition files."""
+    non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+    return os.path.join(non_pseudo_dir, 'non_pseudo', 'simulation', 'forcefield')
+
+def cif_path(config, name):
+    """Path to a material's CIF in the materials directory.
+
+    Args:
+        config (dict): parameters specified in config.
+        name (str): name of material.
+
+    Returns:
+        path (str): path to '<name>.cif'.
+
+    """
+    non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+    materials_dir = config.get('materials_directory', 'cif_files')
+    return os.path.join(non_pseudo_dir, materials_dir, '%s.cif' % name)
+
+def staging_directory(config):
+    """Node-local directory input files are staged to.
+
+    Args:
+        config (dict): parameters specified in config.
+
+    Returns:
+        path (str): `staging_directory` from config, or a per-user directory
+            in the system temp directory.
+
+    """
+    path = config.get('staging_directory')
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), 'non_pseudo_staging_%d' % os.getuid())
+    return os.path.expandvars(path)
+
+def file_hash(path):
+    """SHA-256 of a file's contents, computed once per process.
+
+    Args:
+        path (str): path to file.
+
+    Returns:
+        digest (str): hex digest.
+
+    The digest is remembered per (path, size, mtime), so a file is only read
+    again after it changes.
+
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        if key in _hashes:
+            return _hashes[key]
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    with _lock:
+        _hashes[key] = sha.hexdigest()
+    return _hashes[key]
+
+def stage_file(path, cache_dir):
+    """Copy file into the staging cache, unless an identical copy is there.
+
+    Args:
+        path (str): path to file on the shared filesystem.
+        cache_dir (str): staging cache directory.
+
+    Returns:
+        staged_path (str): path to the cached copy,
+            '<cache_dir>/<digest[:2]>/<digest>/<basename>'.
+
+    Copies are written to a temporary name and renamed into place, so workers
+    sharing a node can stage the same file concurrently.
+
+    """
+    digest = file_hash(path)
+    target_dir = os.path.join(cache_dir, digest[:2], digest)
+    staged_path = os.path.join(target_dir, os.path.basename(path))
+    if not os.path.exists(staged_path):
+        os.makedirs(target_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=target_dir)
+        os.close(fd)
+        shutil.copyfile(path, tmp_path)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, staged_path)
+    return staged_path
+
+def link_file(staged_path, output_dir):
+    """Make a staged file available in a simulation directory.
+
+    Args:
+        staged_path (str): path to file in the staging cache.
+        output_dir (str): simulation directory.
+
+    Hardlinks when the cache and simulation directory share a filesystem,
+    symlinks otherwise, and only copies if neither is supported.
+
+    """
+    link_path = os.path.join(output_dir, os.path.basename(staged_path))
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+    try:
+        os.link(staged_path, link_path)
+        return
+    except OSError:
+        pass
+    try:
+        os.symlink(staged_path, link_path)
+    except OSError:
+        shutil.copy(staged_path, link_path)
+
+def stage_inputs(config, output_dir, name):
+    """Link force field files and a material's CIF into a simulation directory.
+
+    Args:
+        config (dict): parameters specified in config.
+        output_dir (str): simulation directory.
+        name (str): name of material.
+
+    Each input is read from the shared filesystem once per worker and content
+    hash; every simulation after that gets a link to the node-local copy.
+
+    """
+    cache_dir = staging_directory(config)
+    paths = [os.path.join(force_field_directory(), f) for f in FORCE_FIELD_FILES]
+    paths.append(cif_path(config, name))
+    with telemetry.timed('staging_time'):
+        for path in paths:
+            link_file(stage_file(path, cache_dir), output_dir)
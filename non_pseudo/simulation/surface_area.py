@@ -1,21 +1,25 @@
 import sys
 import os
-import subprocess
-import shutil
-from datetime import datetime
-from uuid import uuid4
 from string import Template
 
 import non_pseudo
 from non_pseudo import config
+from non_pseudo.simulation.staging import stage_inputs
+from non_pseudo.simulation.utilities import (output_directory, checkpoint_options,
+    seed_option, unit_cells, CUTOFF, run_cycles, print_every, record_bytes_written,
+    finish_output, discard_output)
+from non_pseudo.simulation.raspa_output import output_file_path, parse_output_file
 
-def write_raspa_file(config, filename, name):
+def write_raspa_file(config, filename, name, cycles=None, seed=None, cells=None):
     """Writes RASPA input file for calculating surface area.
 
     Args:
         filename (str): path to input file.
         run_id (str): identification string for run.
         material_id (str): name for material.
+        cycles (int): number of cycles (default = simulation_cycles in config).
+        seed (int): random seed (default: chosen by RASPA).
+        cells (tuple): unit cells along a, b and c (default: from unit_cells).
 
     Writes RASPA input-file.
 
@@ -24,15 +28,17 @@ def write_raspa_file(config, filename, name):
 SimulationType          MonteCarlo
 NumberOfCycles          $NumberOfCycles
 
-PrintEvery              1
-PrintPropertiesEvery    1
+PrintEvery              $PrintEvery
+PrintPropertiesEvery    $PrintEvery
+$Checkpoint
+$RandomSeed
 
 Forcefield              GenericMOFs
-CutOff                  12.8
+CutOff                  $CutOff
 
 Framework               0
 FrameworkName           $FrameworkName
-UnitCells               2 2 2
+UnitCells               $UnitCells
 SurfaceProbeDistance    Sigma
 
 Component 0 MoleculeName                N2
@@ -40,10 +46,19 @@ Component 0 MoleculeName                N2
             MoleculeDefinition          TraPPE
             SurfaceAreaProbability      1.0
             CreateNumberOfMolecules     0""")
+    if cycles is None:
+        cycles = config['simulations']['surface_area']['simulation_cycles']
+    if cells is None:
+        cells = unit_cells(config, name)
     with open(filename, 'w') as raspa_input_file:
         raspa_input_file.write(
                 s.substitute(
-                    NumberOfCycles = config['simulations']['surface_area']['simulation_cycles'],
+                    NumberOfCycles = cycles,
+                    PrintEvery = print_every(config, cycles, 1),
+                    Checkpoint = checkpoint_options(config),
+                    RandomSeed = seed_option(seed),
+                    CutOff = CUTOFF,
+                    UnitCells = '%d %d %d' % cells,
                     FrameworkName = name))
 
 def parse_output(output_file):
@@ -54,22 +69,14 @@ def parse_output(output_file):
 
     Returns:
         results (dict): total unit cell, gravimetric, and volumetric surface
-            areas.
+            areas, and the error of the volumetric surface area.
 
     """
+    parsed = parse_output_file(output_file)
     results = {}
-    with open(output_file) as origin:
-        count = 0
-        for line in origin:
-            if "Surface area" in line:
-                if count == 0:
-                    results['sa_unit_cell_surface_area'] = float(line.split()[2])
-                    count = count + 1
-                elif count == 1:
-                    results['sa_gravimetric_surface_area'] = float(line.split()[2])
-                    count = count + 1
-                elif count == 2:
-                    results['sa_volumetric_surface_area'] = float(line.split()[2])
+    for key in ['unit_cell_surface_area', 'gravimetric_surface_area', 'volumetric_surface_area']:
+        results['sa_{}'.format(key)] = parsed[key]
+    results['sa_error_estimate'] = parsed.get('volumetric_surface_area_error')
 
     print(
         "\nSURFACE AREA\n" +
@@ -78,57 +85,39 @@ def parse_output(output_file):
         "%s\tm^2/cm^3"   % (results['sa_volumetric_surface_area']))
     return results
 
-def run(config, run_id, name):
+def run(config, run_id, name, seed=None):
     """Runs surface area simulation.
 
     Args:
         run_id (str): identification string for run.
         material_id (str): unique identifier for material.
+        seed (int): random seed (default: chosen by RASPA).
 
     Returns:
         results (dict): surface area simulation results.
 
     """
-    simulation_directory  = config['simulations_directory']
-
-    if simulation_directory == 'non_pseudo':
-        non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
-        path = os.path.join(non_pseudo_dir, run_id, name)
-    elif simulation_directory == 'scratch':
-        path = os.environ['LOCAL']
-    else:
-        print('OUTPUT DIRECTORY NOT FOUND.')
-    output_dir = os.path.join(path, 'output_%s_%s' % (name, uuid4()))
+    output_dir = output_directory(config, run_id, name, 'surface_area', seed)
 
     print("Output directory :\t%s" % output_dir)
-    os.makedirs(output_dir, exist_ok=True)
-    filename = os.path.join(output_dir, "SurfaceArea.input")
-
-    write_raspa_file(config, filename, name)
-    force_field_path = os.path.join(non_pseudo_dir, 'non_pseudo', 'simulation', 'forcefield')
-    shutil.copy(os.path.join(force_field_path, 'force_field_mixing_rules.def'), output_dir)
-    shutil.copy(os.path.join(force_field_path, 'force_field.def'), output_dir)
-    shutil.copy(os.path.join(force_field_path, 'pseudo_atoms.def'), output_dir)
-    cif_path = os.path.join(non_pseudo_dir, 'cif_files')
-    mat_path = os.path.join(cif_path, '%s.cif' % name)
-    print(mat_path)
-    shutil.copy(mat_path, output_dir)
-
-    while True:
-        try:
-            print("Date :\t%s" % datetime.now().date().isoformat())
-            print("Time :\t%s" % datetime.now().time().isoformat())
-            print("Calculating surface area of %s..." % (name))
-            subprocess.run('simulate SurfaceArea.input', shell=True, check=True, cwd=output_dir)
-            filename = "output_%s_2.2.2_298.000000_0.data" % (name)
-            output_file = os.path.join(output_dir, 'Output', 'System_0', filename)
-            results = parse_output(output_file)
-            shutil.rmtree(path, ignore_errors=True)
-            sys.stdout.flush()
-        except (subprocess.CalledProcessError, FileNotFoundError, IndexError, KeyError) as err:
-            print(err)
-            print(err.args)
-            continue
-        break
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        filename = os.path.join(output_dir, "SurfaceArea.input")
+
+        stage_inputs(config, output_dir, name)
+        cells = unit_cells(config, name)
+
+        print("Calculating surface area of %s..." % (name))
+        results = run_cycles(
+            config, 'surface_area', output_dir, 'SurfaceArea.input',
+            lambda cycles, first: write_raspa_file(config, filename, name, cycles, seed, cells),
+            lambda: parse_output(output_file_path(output_dir, name, unit_cells=cells)),
+            [('sa_volumetric_surface_area', 'sa_error_estimate')], 'sa_stop_cycle')
+    except Exception:
+        discard_output(config, output_dir)
+        raise
+    record_bytes_written(output_dir)
+    finish_output(config, run_id, name, 'surface_area', output_dir, seed)
+    sys.stdout.flush()
 
     return results
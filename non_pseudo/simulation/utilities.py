@@ -0,0 +1,377 @@
+import math
+import os
+import shutil
+import subprocess
+from datetime import datetime
+from time import sleep, time
+from uuid import uuid4
+
+import non_pseudo
+from non_pseudo import telemetry
+from non_pseudo.simulation.archive import add_directory
+from non_pseudo.simulation.staging import cif_path
+
+# interaction cutoff [A] of every simulation
+CUTOFF = 12.8
+
+# RASPA_DIR overlay in a simulation directory (see energy_grid.make_overlay)
+RASPA_OVERLAY = 'RASPA_DIR'
+
+def simulation_path(config, run_id, name):
+    """Directory simulation directories for a material are created in.
+
+    Args:
+        config (dict): parameters specified in config.
+        run_id (str): identification string for run.
+        name (str): name of material.
+
+    Returns:
+        path (str): depends on `simulations_directory` in config:
+            'non_pseudo' : <non_pseudo_dir>/<run_id>/<name>
+            'scratch'    : $LOCAL
+            'tmpfs'      : <tmpfs_directory>/non_pseudo/<run_id>/<name>, with
+                           `tmpfs_directory` defaulting to /dev/shm
+
+    """
+    simulation_directory = config['simulations_directory']
+    if simulation_directory == 'non_pseudo':
+        non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+        return os.path.join(non_pseudo_dir, run_id, name)
+    elif simulation_directory == 'scratch':
+        return os.environ['LOCAL']
+    elif simulation_directory == 'tmpfs':
+        tmpfs_dir = os.path.expandvars(config.get('tmpfs_directory', '/dev/shm'))
+        return os.path.join(tmpfs_dir, 'non_pseudo', run_id, name)
+    raise ValueError('Unknown simulations_directory : {}'.format(simulation_directory))
+
+def output_directory(config, run_id, name, stage, seed=None):
+    """Directory a single RASPA simulation runs in.
+
+    Args:
+        config (dict): parameters specified in config.
+        run_id (str): identification string for run.
+        name (str): name of material.
+        stage (str): simulation name (ex. 'gas_adsorption').
+        seed (int): random seed of the simulation, if it is one of several
+            replicas.
+
+    Returns:
+        output_dir (str): in checkpoint mode, a fixed directory per material and
+            stage (and seed) under the checkpoint directory, so a rerun finds
+            RASPA's restart files; otherwise a new directory in simulation_path.
+
+    """
+    if 'checkpoint' in config:
+        if seed is not None:
+            stage = '%s_%d' % (stage, seed)
+        return os.path.join(checkpoint_directory(config, run_id), name, stage)
+    return os.path.join(simulation_path(config, run_id, name), 'output_%s_%s' % (name, uuid4()))
+
+def checkpoint_directory(config, run_id):
+    """Persistent directory for checkpointed simulations.
+
+    Args:
+        config (dict): parameters specified in config.
+        run_id (str): identification string for run.
+
+    Returns:
+        path (str): the run's directory in `checkpoint: directory` from config
+            (default: checkpoints in the run directory). Runs sharing a config
+            never resume from each other's restart files.
+
+    """
+    directory = (config['checkpoint'] or {}).get('directory')
+    if directory is not None:
+        return os.path.join(os.path.expandvars(directory), run_id)
+    non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+    return os.path.join(non_pseudo_dir, run_id, 'checkpoints')
+
+def checkpoint_options(config):
+    """RASPA input lines enabling crash-restart files.
+
+    Args:
+        config (dict): parameters specified in config.
+
+    Returns:
+        options (str): lines for the RASPA input file; empty unless checkpoint
+            mode is enabled. RASPA then writes CrashRestart/binary_restart.dat
+            every `checkpoint: every` cycles and, when started again in the same
+            directory, continues from it instead of from cycle 0.
+
+    """
+    if 'checkpoint' not in config:
+        return ''
+    every = (config['checkpoint'] or {}).get('every', 100)
+    return 'ContinueAfterCrash              yes\nWriteBinaryRestartFileEvery     %d' % every
+
+def unit_cells(config, name, cutoff=CUTOFF):
+    """Smallest replication of a material's unit cell RASPA can simulate.
+
+    Args:
+        config (dict): parameters specified in config.
+        name (str): name of material.
+        cutoff (float): interaction cutoff [A].
+
+    Returns:
+        unit_cells (tuple): number of unit cells along a, b and c, such that
+            every perpendicular width of the supercell is at least twice the
+            cutoff.
+
+    """
+    from non_pseudo import cif
+    widths = cif.perpendicular_widths(cif.read_cif(cif_path(config, name)))
+    return tuple(max(int(math.ceil(2 * cutoff / width - 1e-9)), 1) for width in widths)
+
+def seed_option(seed):
+    """RASPA input line setting the random seed.
+
+    Args:
+        seed (int): random seed, or None to let RASPA seed from the clock.
+
+    Returns:
+        option (str): line for the RASPA input file.
+
+    """
+    if seed is None:
+        return ''
+    return 'RandomSeed              %d' % seed
+
+def run_simulate(input_file, output_dir, env=None):
+    """Run RASPA's `simulate` and record its resource use.
+
+    Args:
+        input_file (str): name of RASPA input file.
+        output_dir (str): directory to run in.
+        env (dict): environment of the RASPA process (default: inherited).
+
+    Raises:
+        subprocess.CalledProcessError: if RASPA exits with an error.
+
+    The process is reaped with wait4, whose resource usage gives its CPU time
+    and peak resident set size.
+
+    """
+    start = time()
+    with subprocess.Popen(['simulate', input_file], cwd=output_dir, env=env) as process:
+        pid, status, usage = os.wait4(process.pid, 0)
+        if os.WIFSIGNALED(status):
+            process.returncode = -os.WTERMSIG(status)
+        else:
+            process.returncode = os.WEXITSTATUS(status)
+    telemetry.add('raspa_time', time() - start)
+    telemetry.add('cpu_time', usage.ru_utime + usage.ru_stime)
+    telemetry.peak('max_rss', usage.ru_maxrss)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+
+def run_raspa(config, output_dir, input_file, parse):
+    """Run RASPA and parse its output, retrying failed attempts.
+
+    Args:
+        config (dict): parameters specified in config.
+        output_dir (str): simulation directory holding `input_file`.
+        input_file (str): name of RASPA input file.
+        parse (function): called without arguments after RASPA finishes;
+            returns results.
+
+    Returns:
+        results: return value of `parse`.
+
+    Failed attempts are retried up to `retries: max_retries` times, waiting
+    `retries: backoff` seconds before the first retry and doubling the wait
+    after each one. In checkpoint mode retries continue from the last restart
+    file. If `output_dir` has a RASPA_DIR overlay, RASPA runs with it as
+    RASPA_DIR. RASPA's wall and CPU time, peak memory, parsing time and
+    retries are added to the stage being measured (see telemetry).
+
+    """
+    retries = config.get('retries', {})
+    max_retries = retries.get('max_retries', 5)
+    backoff = retries.get('backoff', 10)
+    env = None
+    overlay = os.path.join(output_dir, RASPA_OVERLAY)
+    if os.path.isdir(overlay):
+        env = dict(os.environ, RASPA_DIR=overlay)
+    attempt = 0
+    while True:
+        try:
+            print("Date :\t%s" % datetime.now().date().isoformat())
+            print("Time :\t%s" % datetime.now().time().isoformat())
+            run_simulate(input_file, output_dir, env)
+            with telemetry.timed('parse_time'):
+                return parse()
+        except (subprocess.CalledProcessError, FileNotFoundError, IndexError, KeyError) as err:
+            print(err)
+            print(err.args)
+            if attempt >= max_retries:
+                raise RuntimeError('%s in %s failed after %d attempts' % (
+                    input_file, output_dir, attempt + 1)) from err
+            delay = backoff * 2 ** attempt
+            attempt += 1
+            telemetry.add('retries', 1)
+            print("Retry %d of %d in %d s..." % (attempt, max_retries, delay))
+            sleep(delay)
+
+def run_cycles(config, stage, output_dir, input_file, write_input, parse,
+               quantities, stop_column):
+    """Run a simulation for a fixed number of cycles, or until it converges.
+
+    Args:
+        config (dict): parameters specified in config.
+        stage (str): simulation name (ex. 'surface_area').
+        output_dir (str): simulation directory.
+        input_file (str): name of RASPA input file.
+        write_input (function): called as write_input(cycles, first) to write
+            the input file for a run of `cycles` cycles; `first` is False when
+            continuing from an earlier run in the same directory.
+        parse (function): returns results of the last run, including an error
+            estimate column for each of `quantities`.
+        quantities (list): (value column, error column) pairs that must
+            converge.
+        stop_column (str): column the number of simulated cycles is stored in.
+
+    Returns:
+        results (dict): simulation results.
+
+    Without an `adaptive` block in the stage's config the simulation runs
+    `simulation_cycles` cycles. With one, it runs in chunks of `check_every`
+    cycles; after each chunk the chunk averages are combined (weighted by
+    cycles) and the run stops once every quantity's estimated error relative
+    to its value is within `tolerance`, after at least `min_cycles` cycles.
+    `simulation_cycles` remains the ceiling.
+
+    """
+    simulation_config = config['simulations'][stage]
+    max_cycles = simulation_config['simulation_cycles']
+    adaptive = simulation_config.get('adaptive')
+    if adaptive is None:
+        write_input(max_cycles, True)
+        results = run_raspa(config, output_dir, input_file, parse)
+        results[stop_column] = max_cycles
+        return results
+
+    tolerance = adaptive['tolerance']
+    check_every = adaptive.get('check_every', 100)
+    min_cycles = adaptive.get('min_cycles', check_every)
+    error_columns = {error for value, error in quantities}
+    chunks = []
+    total = 0
+    while total < max_cycles:
+        cycles = min(check_every, max_cycles - total)
+        write_input(cycles, not chunks)
+        chunks.append((cycles, run_raspa(config, output_dir, input_file, parse)))
+        total += cycles
+        # a finished chunk's crash-restart file must not be continued from
+        shutil.rmtree(os.path.join(output_dir, 'CrashRestart'), ignore_errors=True)
+
+        results = {}
+        for key in chunks[0][1]:
+            if any(r.get(key) is None for n, r in chunks):
+                results[key] = None
+            elif key in error_columns:
+                results[key] = sum((n * r[key]) ** 2 for n, r in chunks) ** 0.5 / total
+            else:
+                results[key] = sum(n * r[key] for n, r in chunks) / total
+        relative_errors = [
+            results[error] / abs(results[value])
+            if results[error] is not None and results[value] else float('inf')
+            for value, error in quantities]
+        print("Cycles : %d\tRelative error : %s" % (total, max(relative_errors)))
+        if total >= min_cycles and max(relative_errors) <= tolerance:
+            print("Converged after %d of %d cycles." % (total, max_cycles))
+            break
+    results[stop_column] = total
+    return results
+
+def print_every(config, cycles, default):
+    """Cycles between RASPA's periodic prints.
+
+    Args:
+        config (dict): parameters specified in config.
+        cycles (int): total cycles of the simulation.
+        default (int): interval used unless output is minimized.
+
+    Returns:
+        interval (int): `cycles` if `minimal_output` is set in config (the
+            default for 'tmpfs' simulation directories), so only the final
+            averages the parsers read are written; `default` otherwise.
+
+    """
+    minimal = config.get('minimal_output', config['simulations_directory'] == 'tmpfs')
+    return max(int(cycles), 1) if minimal else default
+
+def bytes_written(output_dir):
+    """Size of the files a simulation wrote.
+
+    Args:
+        output_dir (str): simulation directory.
+
+    Returns:
+        size (int): total bytes of regular files in the directory tree, not
+            counting staged inputs (links into the staging cache).
+
+    """
+    size = 0
+    for root, dirs, files in os.walk(output_dir):
+        for f in files:
+            stat = os.lstat(os.path.join(root, f))
+            if os.path.islink(os.path.join(root, f)) or stat.st_nlink > 1:
+                continue
+            size += stat.st_size
+    return size
+
+def record_bytes_written(*output_dirs):
+    """Print and record the size of the files simulations wrote.
+
+    Args:
+        output_dirs (str): simulation directories.
+
+    Returns:
+        size (int): bytes_written of all the directories, which is also added
+            to the stage being measured.
+
+    """
+    size = sum(bytes_written(output_dir) for output_dir in output_dirs)
+    print("Bytes written :\t%s" % size)
+    telemetry.add('bytes_written', size)
+    return size
+
+def finish_output(config, run_id, name, stage, output_dir, seed=None, keep=False):
+    """Archive a finished simulation directory and remove it.
+
+    Args:
+        config (dict): parameters specified in config.
+        run_id (str): identification string for run.
+        name (str): name of material.
+        stage (str): simulation the directory belongs to, as it is indexed in
+            the archive (ex. 'gas_adsorption').
+        output_dir (str): simulation directory.
+        seed (int): random seed of the simulation, if it is a replica.
+        keep (bool): leave the directory in place when it isn't archived.
+
+    With `archive` in config the directory's files are first appended to the
+    worker's archive (see archive.add_directory), and the directory is always
+    removed.
+
+    """
+    if 'archive' in config:
+        add_directory(config, run_id, name, stage, output_dir, seed)
+    elif keep:
+        return
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+def discard_output(config, output_dir):
+    """Remove the directory of a failed simulation.
+
+    Args:
+        config (dict): parameters specified in config.
+        output_dir (str): simulation directory.
+
+    In checkpoint mode the directory is kept, so a rerun continues from
+    RASPA's restart files; otherwise nothing would ever remove it, and with
+    `simulations_directory: tmpfs` it would hold on to memory.
+
+    """
+    if 'checkpoint' in config:
+        return
+    shutil.rmtree(output_dir, ignore_errors=True)
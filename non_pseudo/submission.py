@@ -0,0 +1,111 @@
+import os
+
+import non_pseudo
+
+def cycles_per_material(config):
+    """Total RASPA cycles simulated for each material.
+
+    Args:
+        config (dict): parameters specified in config.
+
+    Returns:
+        cycles (int): initialization and production cycles of every configured
+            simulation, times the number of retest replicas and pressures.
+
+    """
+    cycles = 0
+    for stage, simulation_config in config['simulations'].items():
+        stage_cycles = (simulation_config.get('simulation_cycles', 0) +
+                        simulation_config.get('initialization_cycles', 0))
+        if 'isotherm' in simulation_config:
+            stage_cycles *= len(simulation_config['isotherm']['pressures'])
+        cycles += stage_cycles
+    return cycles * (config.get('retests') or {}).get('number', 1)
+
+def estimate_costs(config, names):
+    """Estimate the relative cost of simulating materials.
+
+    Args:
+        config (dict): parameters specified in config.
+        names (list): names of materials.
+
+    Returns:
+        costs (dict): name -> atom sites x cell volume x cycles.
+
+    Atom counts and volumes come from the catalog file at `catalog` in config
+    (see `nps catalog`) when it has the material, and from its CIF otherwise.
+
+    """
+    from non_pseudo import cif
+    from non_pseudo.simulation.staging import cif_path
+    sizes = {}
+    catalog_path = config.get('catalog')
+    if catalog_path and os.path.exists(catalog_path):
+        from non_pseudo.catalog import load_catalog
+        columns = load_catalog(catalog_path)
+        sizes = {name : atoms * volume for name, atoms, volume in zip(
+            columns['name'].tolist(), columns['atoms'].tolist(), columns['volume'].tolist())}
+    cycles = cycles_per_material(config)
+    costs = {}
+    for name in names:
+        if name not in sizes:
+            crystal = cif.read_cif(cif_path(config, name))
+            sizes[name] = len(crystal.labels) * float(cif.volume(crystal))
+        costs[name] = sizes[name] * cycles
+    return costs
+
+def cost_ordered_chunks(costs, max_chunk_size=20, chunk_cost=None):
+    """Group materials into jobs of similar cost, most expensive first.
+
+    Args:
+        costs (dict): name -> estimated cost.
+        max_chunk_size (int): most materials in a chunk.
+        chunk_cost (float): cost at which a chunk is closed (default: cost of
+            the most expensive material, so it runs alone).
+
+    Returns:
+        chunks (list): lists of names, ordered by decreasing total cost.
+
+    Materials are taken most expensive first, so large frameworks get chunks
+    of their own and small ones are bundled until a chunk reaches `chunk_cost`.
+
+    """
+    ordered = sorted(costs, key=costs.get, reverse=True)
+    if not ordered:
+        return []
+    if chunk_cost is None:
+        chunk_cost = costs[ordered[0]]
+    chunks, chunk, total = [], [], 0.
+    for name in ordered:
+        chunk.append(name)
+        total += costs[name]
+        if total >= chunk_cost or len(chunk) >= max_chunk_size:
+            chunks.append((total, chunk))
+            chunk, total = [], 0.
+    if chunk:
+        chunks.append((total, chunk))
+    return [names for total, names in sorted(chunks, key=lambda c: c[0], reverse=True)]
+
+def add_materials_to_database(run_id, names):
+    """Simulate a chunk of materials; run as a single rq job.
+
+    Args:
+        run_id (str): identification string for run; its config is loaded
+            from the run directory, so jobs don't carry it.
+        names (list): names of materials.
+
+    A material that fails doesn't stop the rest of the chunk; the job fails
+    afterwards, naming every failed material.
+
+    """
+    from non_pseudo.non_pseudo import add_material_to_database
+    config = non_pseudo._init(run_id)
+    failed = []
+    for name in names:
+        try:
+            add_material_to_database(config, name)
+        except Exception as err:
+            print('Simulations failed for {} : {}'.format(name, err))
+            failed.append(name)
+    if failed:
+        raise RuntimeError('Simulations failed for : {}'.format(', '.join(failed)))
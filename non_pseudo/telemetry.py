@@ -0,0 +1,171 @@
+import resource
+import threading
+from contextlib import contextmanager
+from time import time, process_time
+
+# quantities summed over a stage; times in s
+COUNTERS = ['cpu_time', 'raspa_time', 'staging_time', 'parse_time', 'commit_time',
+            'bytes_written', 'retries']
+
+_local = threading.local()
+_lock = threading.Lock()
+
+def thread_cpu_time():
+    """CPU time [s] of the calling thread (of the whole process where unsupported)."""
+    try:
+        usage = resource.getrusage(resource.RUSAGE_THREAD)
+    except (AttributeError, ValueError):
+        return process_time()
+    return usage.ru_utime + usage.ru_stime
+
+def current():
+    """Measurements the calling thread records to, or None."""
+    return getattr(_local, 'stats', None)
+
+def add(key, value):
+    """Add to a counter of the current stage and of the stages enclosing it."""
+    with _lock:
+        stats = current()
+        while stats is not None:
+            stats[key] += value
+            stats = stats['_parent']
+
+def peak(key, value):
+    """Raise a maximum (ex. max_rss) of the current stage and the stages enclosing it."""
+    with _lock:
+        stats = current()
+        while stats is not None:
+            stats[key] = max(stats[key], value)
+            stats = stats['_parent']
+
+@contextmanager
+def timed(key):
+    """Add the wall time of a block to a counter (ex. 'staging_time')."""
+    start = time()
+    try:
+        yield
+    finally:
+        add(key, time() - start)
+
+@contextmanager
+def measure(run_id, name, stage, rows=None, parent=None):
+    """Record wall time, CPU time and counters of a stage.
+
+    Args:
+        run_id (str): identification string for run.
+        name (str): name of material.
+        stage (str): stage name (ex. 'gas_adsorption', or 'material' for all of
+            a material's stages).
+        rows (list): list the stage's row is appended to when it ends, whether
+            or not it succeeded.
+        parent (dict): measurements of the enclosing stage, which counters are
+            also added to (default: the calling thread's).
+
+    Yields:
+        stats (dict): counters, and `max_rss` [kB] of the RASPA processes.
+
+    CPU time is the calling thread's, plus that of threads running functions
+    wrapped with bind, plus that of the RASPA processes run_raspa starts.
+
+    """
+    previous = current()
+    stats = {key : 0 for key in COUNTERS}
+    stats['max_rss'] = 0
+    stats['_parent'] = previous if parent is None else parent
+    _local.stats = stats
+    started, cpu = time(), thread_cpu_time()
+    try:
+        yield stats
+    finally:
+        add('cpu_time', thread_cpu_time() - cpu)
+        _local.stats = previous
+        row = {key : value for key, value in stats.items() if not key.startswith('_')}
+        row.update(run_id=run_id, name=name, stage=stage,
+                   started_at=started, wall_time=time() - started)
+        if rows is not None:
+            rows.append(row)
+
+def measured(run_id, name, stage, run, rows=None):
+    """Wrap a function so each call is measured as a stage.
+
+    Args:
+        run_id (str): identification string for run.
+        name (str): name of material.
+        stage (str): stage name.
+        run (function): called without arguments.
+        rows (list): list each call's row is appended to.
+
+    Returns:
+        wrapper (function): calls `run` inside measure; the stage is nested in
+            the one measured where the wrapper was created, so it can run in
+            another thread.
+
+    """
+    parent = current()
+    def wrapper():
+        with measure(run_id, name, stage, rows, parent):
+            return run()
+    return wrapper
+
+def bind(run):
+    """Wrap a function so it records to the calling thread's stage from any thread.
+
+    Args:
+        run (function): function to call in another thread (ex. one replica).
+
+    Returns:
+        wrapper (function): calls `run` with the same arguments, adding the CPU
+            time of the thread it runs in to the stage.
+
+    """
+    stats = current()
+    def wrapper(*args):
+        previous = current()
+        _local.stats = stats
+        cpu = thread_cpu_time()
+        try:
+            return run(*args)
+        finally:
+            add('cpu_time', thread_cpu_time() - cpu)
+            _local.stats = previous
+    return wrapper
+
+def summarize(rows, percentiles=(50, 90, 99)):
+    """Throughput and per-stage wall time percentiles of a run.
+
+    Args:
+        rows (list): stage timing rows as dicts.
+        percentiles (tuple): percentiles of wall time to report.
+
+    Returns:
+        summary (dict): `materials`, `hours` from the first start to the last
+            end of a material, `materials_per_hour`, and `stages`: stage name ->
+            dict with `count`, `wall_time` percentiles, mean `cpu_time`,
+            `raspa_time`, `staging_time`, `parse_time` and `commit_time`,
+            largest `max_rss`, and total `bytes_written` and `retries`.
+
+    """
+    import numpy as np
+    materials = [row for row in rows if row['stage'] == 'material']
+    summary = {'materials' : len(materials), 'hours' : 0., 'materials_per_hour' : None,
+               'stages' : {}}
+    if materials:
+        start = min(row['started_at'] for row in materials)
+        end = max(row['started_at'] + row['wall_time'] for row in materials)
+        summary['hours'] = (end - start) / 3600.
+        if end > start:
+            summary['materials_per_hour'] = len(materials) / summary['hours']
+    for stage in sorted({row['stage'] for row in rows}):
+        stage_rows = [row for row in rows if row['stage'] == stage]
+        column = lambda key: np.array([row[key] or 0 for row in stage_rows], dtype=float)
+        stats = {
+            'count' : len(stage_rows),
+            'wall_time' : dict(zip(percentiles, np.percentile(column('wall_time'), percentiles))),
+            'max_rss' : int(column('max_rss').max()),
+            'bytes_written' : int(column('bytes_written').sum()),
+            'retries' : int(column('retries').sum()),
+        }
+        for key in ['cpu_time', 'raspa_time', 'staging_time', 'parse_time', 'commit_time']:
+            stats[key] = column(key).mean()
+        summary['stages'][stage] = stats
+    return summary
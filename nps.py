@@ -4,13 +4,10 @@ from datetime import datetime
 import os
 
 import click
-import RASPA2
 import yaml
 
 import non_pseudo
-from non_pseudo.files import load_config_file
-from non_pseudo.non_pseudo import worker_run_loop, run_all_simulations, calculate_average_sigma_epsilon, calculate_vol_nden
-from non_pseudo.db import Material
+from non_pseudo.files import load_config_file, raspa2_directory
 
 @click.group()
 def nps():
@@ -31,7 +28,7 @@ def start(config_path):
     non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
     run_id = datetime.now().isoformat()
     config['run_id'] = run_id
-    config['raspa2_dir'] = os.path.dirname(RASPA2.__file__)
+    config['raspa2_dir'] = raspa2_directory()
     config['non_pseudo_dir'] = non_pseudo_dir
 
     run_dir = os.path.join(non_pseudo_dir, run_id)
@@ -43,21 +40,214 @@ def start(config_path):
 
 @nps.command()
 @click.argument('run_id')
-def launch_worker(run_id):
+@click.option('--jobs', '-j', default=1, help='Number of materials simulated at once.')
+@click.option('--pin-cores', is_flag=True,
+              help='Pin each job to its own cores, one per RASPA process it runs at once.')
+def launch_worker(run_id, jobs, pin_cores):
     """Start process to manage run.
 
     Args:
         run_id (str): identification string for run.
+        jobs (int): number of materials simulated at once.
+        pin_cores (bool): pin each job to its own CPU cores.
 
     Launches worker to identify next material, simulate its properties, and
-    store results in database.
+    store results in database. With `--jobs N` one supervisor keeps N RASPA
+    jobs busy and is the only process writing to the database.
     """
-    non_pseudo._init(run_id)
-    worker_run_loop(run_id)
+    from non_pseudo.non_pseudo import worker_run_loop, core_sets
+    config = non_pseudo._init(run_id)
+    if pin_cores and jobs > 1:
+        try:
+            core_sets(config, jobs)
+        except ValueError as err:
+            raise click.ClickException(str(err))
+    worker_run_loop(run_id, jobs, pin_cores)
+
+@nps.command()
+@click.argument('config_path', type=click.Path())
+@click.option('--max-bytes', type=int, help='Evict least recently used entries down to this size.')
+def cache_stats(config_path, max_bytes):
+    """Report on the cross-run result cache.
+
+    Args:
+        config_path (str): path to config file with a `result_cache` block.
+        max_bytes (int): optional size to evict the cache down to.
+
+    Prints hit/miss counts, entries and size per simulation.
+
+    """
+    from non_pseudo.simulation import result_cache
+    config = load_config_file(config_path)
+    if max_bytes is not None:
+        result_cache.evict(config, max_bytes)
+    counts = result_cache.lookup_statistics(config)
+    cached = result_cache.entries(config)
+    print('Result cache :\t{}'.format(result_cache.cache_directory(config)))
+    print('{:<24}{:>10}{:>10}{:>10}{:>10}{:>14}'.format(
+        'stage', 'hits', 'misses', 'hit rate', 'entries', 'bytes'))
+    stages = sorted({stage for stage, outcome in counts} | {entry[1] for entry in cached})
+    for stage in stages:
+        hits, misses = counts[(stage, 'hit')], counts[(stage, 'miss')]
+        rate = hits / (hits + misses) if hits + misses else 0.
+        stage_entries = [entry for entry in cached if entry[1] == stage]
+        print('{:<24}{:>10}{:>10}{:>10.1%}{:>10}{:>14}'.format(
+            stage, hits, misses, rate, len(stage_entries),
+            sum(entry[2] for entry in stage_entries)))
+
+@nps.command()
+@click.argument('config_path', type=click.Path())
+@click.option('--output', '-o', default='catalog.npz',
+              help='Catalog file; .npz, or .parquet if pyarrow is installed.')
+@click.option('--processes', '-p', type=int, help='Worker processes (default: CPU count).')
+def catalog(config_path, output, processes):
+    """Compute descriptors of every CIF in the materials directory.
+
+    Args:
+        config_path (str): path to config file with `materials_directory`.
+        output (str): path to catalog file.
+        processes (int): number of worker processes.
+
+    Writes name, file hash, cell volume, number density, atom counts and
+    average Lennard-Jones sigma/epsilon of each material as columns.
+
+    """
+    from non_pseudo.catalog import build_catalog, write_catalog
+    config = load_config_file(config_path)
+    non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+    materials_dir = os.path.join(non_pseudo_dir, config.get('materials_directory', 'cif_files'))
+    paths = sorted(os.path.join(materials_dir, f)
+                   for f in os.listdir(materials_dir) if f.endswith('.cif'))
+    columns = build_catalog(paths, processes)
+    write_catalog(columns, output)
+    print('Catalog of {} materials written to {}'.format(len(paths), output))
+
+@nps.command()
+@click.argument('run_id')
+@click.option('--slowest', '-n', default=10, help='Number of slowest materials listed.')
+def stats(run_id, slowest):
+    """Report throughput and stage timings of a run.
+
+    Args:
+        run_id (str): identification string for run.
+        slowest (int): number of slowest materials listed.
+
+    Prints materials per hour, wall time percentiles and mean resource use of
+    each stage, and the materials that took longest.
+
+    """
+    from non_pseudo.db.utilities import find_stage_timings
+    from non_pseudo.telemetry import summarize
+    rows = find_stage_timings(run_id)
+    summary = summarize(rows)
+    rate = summary['materials_per_hour']
+    print('Materials :\t{} in {:.2f} h'.format(summary['materials'], summary['hours']))
+    print('Throughput :\t{} materials / h'.format('-' if rate is None else '{:.1f}'.format(rate)))
+    print('\n{:<22}{:>7}{:>9}{:>9}{:>9}{:>9}{:>9}{:>9}{:>9}{:>11}{:>8}{:>14}'.format(
+        'stage', 'count', 'p50 [s]', 'p90 [s]', 'p99 [s]', 'cpu [s]', 'raspa', 'staging',
+        'parse', 'rss [kB]', 'retries', 'bytes'))
+    for stage, s in summary['stages'].items():
+        print('{:<22}{:>7}{:>9.1f}{:>9.1f}{:>9.1f}{:>9.1f}{:>9.1f}{:>9.2f}{:>9.2f}{:>11}{:>8}{:>14}'.format(
+            stage, s['count'], s['wall_time'][50], s['wall_time'][90], s['wall_time'][99],
+            s['cpu_time'], s['raspa_time'], s['staging_time'], s['parse_time'],
+            s['max_rss'], s['retries'], s['bytes_written']))
+    if 'material' in summary['stages']:
+        print('Mean commit time :\t{:.3f} s'.format(summary['stages']['material']['commit_time']))
+    materials = sorted([row for row in rows if row['stage'] == 'material'],
+                       key=lambda row: row['wall_time'], reverse=True)[:slowest]
+    print('\n{:<40}{:>10}{:>10}{:>10}{:>8}'.format('slowest materials', 'wall [s]', 'cpu [s]',
+                                                  'raspa [s]', 'retries'))
+    for row in materials:
+        print('{:<40}{:>10.1f}{:>10.1f}{:>10.1f}{:>8}'.format(
+            row['name'], row['wall_time'], row['cpu_time'], row['raspa_time'], row['retries']))
+
+@nps.command()
+@click.argument('run_id')
+@click.option('--name', '-n', help='Only simulations of this material.')
+@click.option('--stage', '-s', help='Only simulations of this stage (ex. gas_adsorption).')
+@click.option('--file', '-f', 'file_name', help='Print this file of the (first) matching simulation.')
+@click.option('--output', '-o', type=click.Path(), help='Extract matching simulations here.')
+def archive(run_id, name, stage, file_name, output):
+    """List or read archived simulation outputs.
+
+    Args:
+        run_id (str): identification string for run.
+        name (str): material to select.
+        stage (str): stage to select.
+        file_name (str): file to print, relative to the simulation directory.
+        output (str): directory to extract selected simulations to, as
+            <output>/<name>/<stage>[_<seed>]_<n>.
+
+    Without --file or --output, lists the selected simulations and their
+    files. Only the selected members are read and decompressed.
+
+    """
+    import sys
+    from non_pseudo.simulation import archive as simulation_archive
+    config = non_pseudo._init(run_id)
+    if 'archive' not in config:
+        raise click.ClickException(
+            'Run {} does not archive simulation outputs (no `archive` block in its config).'.format(
+                run_id))
+    entries = simulation_archive.find_members(config, run_id, name, stage)
+    if file_name is not None:
+        if not entries:
+            raise click.ClickException('No archived simulation matches.')
+        sys.stdout.buffer.write(simulation_archive.read_file(entries[0], file_name))
+        return
+    for i, entry in enumerate(entries):
+        if output is not None:
+            label = entry['stage'] if entry['seed'] is None else '{}_{}'.format(
+                entry['stage'], entry['seed'])
+            target = os.path.join(output, entry['name'], '{}_{}'.format(label, i))
+            with simulation_archive.open_member(entry) as tar:
+                tar.extractall(target)
+            print('Extracted {} files to {}'.format(len(entry['files']), target))
+            continue
+        print('{:<40}{:<28}{:>12}{:>12}   {}'.format(
+            entry['name'], entry['stage'] if entry['seed'] is None else '{} ({})'.format(
+                entry['stage'], entry['seed']),
+            entry['size'], entry['length'], os.path.basename(entry['archive'])))
+        for f in entry['files']:
+            print('    {}'.format(f))
+
+@nps.command()
+@click.argument('run_id')
+@click.option('--output', '-o', type=click.Path(),
+              help='.npz, or .parquet if pyarrow is installed (default: <run_id>.npz).')
+@click.option('--batch-size', '-b', default=10000, help='Rows read from the database at once.')
+@click.option('--catalog', '-c', 'catalog_path', type=click.Path(),
+              help='Catalog whose descriptors are joined by name (default: `catalog` in config).')
+def export(run_id, output, batch_size, catalog_path):
+    """Export a run's materials table to a columnar file.
+
+    Args:
+        run_id (str): identification string for run.
+        output (str): path to output file.
+        batch_size (int): rows read from the database at once.
+        catalog_path (str): path to catalog file written by `nps catalog`.
+
+    Streams the rows in batches, so memory use doesn't grow with the run. The
+    output loads into NumPy arrays with np.load (or catalog.load_catalog).
+
+    """
+    from non_pseudo.export import export_run
+    if catalog_path is None:
+        non_pseudo_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+        config_file = os.path.join(non_pseudo_dir, run_id, 'config.yaml')
+        if os.path.exists(config_file):
+            catalog_path = load_config_file(config_file).get('catalog')
+    if output is None:
+        output = '{}.npz'.format(run_id)
+    rows = export_run(run_id, output, batch_size, catalog_path)
+    print('Exported {} materials to {}'.format(rows, output))
 
 @nps.command()
 @click.argument('crystal_name')
 def one_off(crystal_name):
+    from non_pseudo.non_pseudo import (run_all_simulations,
+        calculate_average_sigma_epsilon, calculate_vol_nden)
+    from non_pseudo.db import Material
     config = load_config_file(
             os.path.join(
                 os.path.dirname(os.path.dirname(non_pseudo.__file__)),
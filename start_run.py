@@ -5,11 +5,21 @@ import os
 import sjs
 
 import non_pseudo
-from non_pseudo.non_pseudo import start_run, add_material_to_database
+from non_pseudo.files import load_config_file
+from non_pseudo.non_pseudo import start_run
+from non_pseudo.submission import estimate_costs, cost_ordered_chunks, add_materials_to_database
+from non_pseudo.db.utilities import find_completed_materials
 
+# pass a config file to start a new run, or a run_id to resume one
 config_path = sys.argv[1]
 
-config = start_run(config_path)
+np_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
+run_config = os.path.join(np_dir, config_path, 'config.yaml')
+if os.path.isfile(run_config):
+    config = load_config_file(run_config)
+    print('Resuming run :\t{}'.format(config['run_id']))
+else:
+    config = start_run(config_path)
 run_id = config['run_id']
 
 sjs.load(os.path.join('settings', 'sjs.yaml'))
@@ -17,12 +27,20 @@ job_queue = sjs.get_job_queue()
 
 if job_queue is not None:
     print('Queueing jobs onto queue :\t{}'.format(job_queue))
-    np_dir = os.path.dirname(os.path.dirname(non_pseudo.__file__))
     materials_dir = config['materials_directory']
     mat_dir = os.path.join(np_dir, materials_dir)
-    mat_names = [e[:-4] for e in os.listdir(mat_dir)]
+    mat_names = [e[:-4] for e in os.listdir(mat_dir) if e.endswith('.cif')]
 
-    output_dir = os.path.join(np_dir, run_id)
-    for name in mat_names:
-        print(name)
-        job_queue.enqueue(add_material_to_database, config, name)
+    completed = find_completed_materials(run_id)
+    print('Skipping {} completed materials.'.format(len(completed)))
+
+    # one job per chunk of materials, most expensive chunks first, so large
+    # frameworks don't start at the end of the run
+    submission = config.get('submission', {})
+    costs = estimate_costs(config, [name for name in mat_names if name not in completed])
+    chunks = cost_ordered_chunks(costs, submission.get('max_chunk_size', 20),
+                                 submission.get('chunk_cost'))
+    for chunk in chunks:
+        print(', '.join(chunk))
+        job_queue.enqueue(add_materials_to_database, run_id, chunk)
+    print('Queued {} materials in {} jobs.'.format(len(costs), len(chunks)))
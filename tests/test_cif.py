@@ -0,0 +1,48 @@
+import pytest
+
+from non_pseudo import cif
+
+CIF = """data_{name}
+_cell_length_a {a}
+_cell_length_b {b}
+_cell_length_c {c}(2)
+_cell_angle_alpha {alpha}
+_cell_angle_beta {beta}
+_cell_angle_gamma {gamma}
+loop_
+_symmetry_equiv_pos_as_xyz
+x,y,z
+loop_
+_atom_site_label
+_atom_site_type_symbol
+_atom_site_fract_x
+_atom_site_fract_y
+_atom_site_fract_z
+Zn1 Zn 0.5 0.25 0.125(3)
+O2 O 0.1 0.2 0.3
+# a comment
+_symmetry_space_group_name_H-M 'P 1'
+"""
+
+def write_cif(directory, name, lengths, angles):
+    path = directory.join('{}.cif'.format(name))
+    path.write(CIF.format(name=name, a=lengths[0], b=lengths[1], c=lengths[2],
+                          alpha=angles[0], beta=angles[1], gamma=angles[2]))
+    return str(path)
+
+def test_read_cif(tmpdir):
+    crystal = cif.read_cif(write_cif(tmpdir, 'test', (10., 11., 12.), (90., 90., 90.)))
+    assert list(crystal.lengths) == [10., 11., 12.]
+    assert list(crystal.angles) == [90., 90., 90.]
+    assert list(crystal.labels) == ['Zn1', 'O2']
+    assert crystal.fractional.tolist() == [[0.5, 0.25, 0.125], [0.1, 0.2, 0.3]]
+    assert cif.atom_types(crystal.labels) == ['Zn', 'O']
+    # cached, so shared by every caller
+    assert not crystal.fractional.flags.writeable
+    assert cif.volume(crystal) == pytest.approx(1320.)
+
+def test_read_cif_rereads_changed_file(tmpdir):
+    path = write_cif(tmpdir, 'test', (10., 10., 10.), (90., 90., 90.))
+    assert cif.read_cif(path) is cif.read_cif(path)
+    write_cif(tmpdir, 'test', (20., 20., 20.5), (90., 90., 90.))
+    assert cif.read_cif(path).lengths[2] == 20.5
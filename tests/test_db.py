@@ -0,0 +1,29 @@
+import sqlite3
+
+from sqlalchemy import create_engine, inspect
+
+from non_pseudo.db import add_missing_columns, Base
+
+def test_add_missing_columns_upgrades_earlier_database(tmpdir):
+    path = str(tmpdir.join('non_pseudo.db'))
+    # materials as written before stop cycles, error estimates and replicas
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE materials (id INTEGER PRIMARY KEY, run_id VARCHAR(50), '
+                       'name VARCHAR(100), vf_helium_void_fraction FLOAT)')
+    connection.execute("INSERT INTO materials (run_id, name, vf_helium_void_fraction) "
+                       "VALUES ('run', 'material', 0.5)")
+    connection.commit()
+    connection.close()
+
+    engine = create_engine('sqlite:///' + path)
+    Base.metadata.create_all(engine)
+    add_missing_columns(engine)
+    columns = {column['name'] for column in inspect(engine).get_columns('materials')}
+    assert columns == set(Base.metadata.tables['materials'].columns.keys())
+    with engine.connect() as connection:
+        row = connection.exec_driver_sql(
+            'SELECT vf_helium_void_fraction, vf_stop_cycle, ga_isotherm_points FROM materials').one()
+    assert tuple(row) == (0.5, None, None)
+
+    # nothing left to add
+    add_missing_columns(engine)
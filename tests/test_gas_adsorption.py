@@ -0,0 +1,15 @@
+from non_pseudo.simulation.gas_adsorption import concurrent_points
+
+PRESSURES = [1.0e+4, 5.0e+4, 1.0e+5, 2.5e+5, 5.0e+5, 1.0e+6, 2.0e+6, 3.5e+6, 5.0e+6, 6.5e+6]
+
+def test_concurrent_points_default_to_all():
+    assert concurrent_points({'pressures' : PRESSURES}) == 10
+
+def test_concurrent_points_leave_warm_starts_by_default():
+    assert concurrent_points({'pressures' : PRESSURES, 'warm_start' : True}) == 3
+    assert concurrent_points({'pressures' : PRESSURES[:2], 'warm_start' : True}) == 1
+
+def test_concurrent_points_from_config():
+    isotherm = {'pressures' : PRESSURES, 'warm_start' : True, 'concurrent_points' : 5}
+    assert concurrent_points(isotherm) == 5
+    assert concurrent_points({'pressures' : PRESSURES, 'concurrent_points' : 0}) == 1
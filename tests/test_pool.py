@@ -0,0 +1,50 @@
+import importlib
+import os
+import threading
+
+from non_pseudo.non_pseudo import run_pool
+
+# the package's own `import non_pseudo` shadows the module as an attribute
+non_pseudo = importlib.import_module('non_pseudo.non_pseudo')
+
+CONFIG = {'run_id' : 'run', 'simulations' : {'surface_area' : {}}}
+
+class Writer(object):
+    def __init__(self):
+        self.rows = []
+
+    def put(self, row):
+        self.rows.append(row)
+
+def simulate_material(config, name, partial_results=None):
+    if name == 'killed':
+        os._exit(1)
+    return name, {'name' : name, 'cores' : sorted(os.sched_getaffinity(0))}
+
+def test_pinned_worker_replaced_after_being_killed(monkeypatch):
+    monkeypatch.setattr(non_pseudo, 'simulate_material', simulate_material)
+    monkeypatch.setattr(non_pseudo, 'POOL_POLL_INTERVAL', 0.1)
+    names = iter(['killed', 'first', 'second'])
+    writer = Writer()
+    pool = threading.Thread(target=run_pool, args=(
+        CONFIG, lambda: next(names, None), 1, writer, True))
+    pool.daemon = True
+    pool.start()
+    pool.join(60)
+    # the replacement of the killed worker got its cores back, and ran the rest
+    assert not pool.is_alive()
+    core_set = sorted(os.sched_getaffinity(0))[:1]
+    assert writer.rows == [{'name' : 'first', 'cores' : core_set},
+                           {'name' : 'second', 'cores' : core_set}]
+
+def test_failed_material_keeps_finished_simulations(monkeypatch):
+    def run_all_simulations(config, material):
+        material.sa_volumetric_surface_area = 1000.
+        raise RuntimeError('gas adsorption failed')
+    monkeypatch.setattr(non_pseudo, 'run_all_simulations', run_all_simulations)
+    name, results = non_pseudo.simulate_material(
+        CONFIG, 'material', {'vf_helium_void_fraction' : 0.5})
+    assert name == 'material'
+    assert results['vf_helium_void_fraction'] == 0.5
+    assert results['sa_volumetric_surface_area'] == 1000.
+    assert not results['data_complete']
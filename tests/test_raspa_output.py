@@ -0,0 +1,121 @@
+import pytest
+
+from non_pseudo.simulation.raspa_output import parse_output_file
+from synthetic_output import write_gas_adsorption, write_void_fraction, write_surface_area
+
+# The line scans each stage used before raspa_output, kept as a reference.
+
+def line_scan_gas_adsorption(output_file):
+    results = {}
+    with open(output_file) as origin:
+        line_counter = 1
+        for line in origin:
+            if "absolute [mol/kg" in line:
+                results['absolute_molar_loading'] = float(line.split()[5])
+            elif "absolute [cm^3 (STP)/g" in line:
+                results['absolute_gravimetric_loading'] = float(line.split()[6])
+            elif "absolute [cm^3 (STP)/c" in line:
+                results['absolute_volumetric_loading'] = float(line.split()[6])
+            elif "excess [mol/kg" in line:
+                results['excess_molar_loading'] = float(line.split()[5])
+            elif "excess [cm^3 (STP)/g" in line:
+                results['excess_gravimetric_loading'] = float(line.split()[6])
+            elif "excess [cm^3 (STP)/c" in line:
+                results['excess_volumetric_loading'] = float(line.split()[6])
+            elif "Average Host-Host energy:" in line:
+                host_host_line = line_counter + 8
+            elif "Average Adsorbate-Adsorbate energy:" in line:
+                adsorbate_adsorbate_line = line_counter + 8
+            elif "Average Host-Adsorbate energy:" in line:
+                host_adsorbate_line = line_counter + 8
+            line_counter += 1
+
+    energy_lines = {
+        host_host_line : 'host_host',
+        adsorbate_adsorbate_line : 'adsorbate_adsorbate',
+        host_adsorbate_line : 'host_adsorbate',
+    }
+    with open(output_file) as origin:
+        line_counter = 1
+        for line in origin:
+            if line_counter in energy_lines:
+                key = energy_lines[line_counter]
+                results['{}_avg'.format(key)] = float(line.split()[1])
+                results['{}_vdw'.format(key)] = float(line.split()[5])
+                results['{}_cou'.format(key)] = float(line.split()[7])
+            line_counter += 1
+    return results
+
+def line_scan_void_fraction(output_file):
+    results = {}
+    with open(output_file) as origin:
+        for line in origin:
+            if not "Average Widom Rosenbluth-weight:" in line:
+                continue
+            results['helium_void_fraction'] = float(line.split()[4])
+    return results
+
+def line_scan_surface_area(output_file):
+    results = {}
+    with open(output_file) as origin:
+        count = 0
+        for line in origin:
+            if "Surface area" in line:
+                if count == 0:
+                    results['unit_cell_surface_area'] = float(line.split()[2])
+                    count = count + 1
+                elif count == 1:
+                    results['gravimetric_surface_area'] = float(line.split()[2])
+                    count = count + 1
+                elif count == 2:
+                    results['volumetric_surface_area'] = float(line.split()[2])
+    return results
+
+def without_errors(results):
+    return {key : value for key, value in results.items() if not key.endswith('_error')}
+
+@pytest.mark.parametrize('size', [0, 200000])
+def test_gas_adsorption_matches_line_scan(tmpdir, size):
+    path = str(tmpdir.join('ga.data'))
+    write_gas_adsorption(path, size, loading=123.456)
+    parsed = parse_output_file(path)
+    assert without_errors(parsed) == line_scan_gas_adsorption(path)
+    assert len(without_errors(parsed)) == 15
+    assert parsed['absolute_volumetric_loading'] == pytest.approx(123.456)
+    assert parsed['absolute_volumetric_loading_error'] == pytest.approx(123.456 / 50)
+
+@pytest.mark.parametrize('size', [0, 200000])
+def test_void_fraction_matches_line_scan(tmpdir, size):
+    path = str(tmpdir.join('vf.data'))
+    write_void_fraction(path, size, void_fraction=0.4321)
+    parsed = parse_output_file(path)
+    assert without_errors(parsed) == line_scan_void_fraction(path)
+    assert parsed['helium_void_fraction'] == pytest.approx(0.4321)
+    assert parsed['helium_void_fraction_error'] == pytest.approx(0.004321, abs=1e-5)
+
+@pytest.mark.parametrize('size', [0, 200000])
+def test_surface_area_matches_line_scan(tmpdir, size):
+    path = str(tmpdir.join('sa.data'))
+    write_surface_area(path, size, surface_area=1000.)
+    parsed = parse_output_file(path)
+    assert without_errors(parsed) == line_scan_surface_area(path)
+    assert parsed['unit_cell_surface_area'] == pytest.approx(2000.)
+    assert parsed['gravimetric_surface_area'] == pytest.approx(1500.)
+    assert parsed['volumetric_surface_area'] == pytest.approx(1000.)
+
+def test_surface_area_volumetric_from_last_line(tmpdir):
+    path = str(tmpdir.join('sa.data'))
+    write_surface_area(path, surface_area=1000.)
+    with open(path, 'a') as output_file:
+        output_file.write('\tSurface area:   900.00000 [m^2/cm^3]\n')
+    parsed = parse_output_file(path)
+    assert without_errors(parsed) == line_scan_surface_area(path)
+    assert parsed['unit_cell_surface_area'] == pytest.approx(2000.)
+    assert parsed['gravimetric_surface_area'] == pytest.approx(1500.)
+    assert parsed['volumetric_surface_area'] == pytest.approx(900.)
+    assert 'volumetric_surface_area_error' not in parsed
+
+def test_empty_file(tmpdir):
+    path = tmpdir.join('empty.data')
+    path.write('')
+    assert parse_output_file(str(path)) == {}
@@ -0,0 +1,35 @@
+from non_pseudo.simulation.result_cache import result_key
+from synthetic_output import write_cif
+
+def config_with(tmpdir, **settings):
+    config = {
+        'materials_directory' : str(tmpdir),
+        'simulations' : {
+            'helium_void_fraction' : {'simulation_cycles' : 500},
+            'surface_area' : {'simulation_cycles' : 100},
+            'gas_adsorption' : {'simulation_cycles' : 500, 'adsorbate' : 'methane'},
+        },
+    }
+    config.update(settings)
+    return config
+
+def test_grid_settings_only_key_stages_reading_grids(tmpdir):
+    write_cif(str(tmpdir.join('material.cif')), (10., 10., 10.), atoms=5)
+    plain = config_with(tmpdir)
+    grid = config_with(tmpdir, energy_grid={'spacing' : 0.1, 'max_bytes' : 1000})
+    finer = config_with(tmpdir, energy_grid={'spacing' : 0.05})
+    native = config_with(tmpdir, energy_grid={'spacing' : 0.1})
+    native['simulations']['helium_void_fraction']['engine'] = 'native'
+
+    def key(config, stage):
+        return result_key(config, stage, 'material')
+    assert key(plain, 'surface_area') == key(grid, 'surface_area')
+    assert key(plain, 'helium_void_fraction') != key(grid, 'helium_void_fraction')
+    assert key(grid, 'gas_adsorption') != key(finer, 'gas_adsorption')
+    assert key(plain, 'gas_adsorption') != key(grid, 'gas_adsorption')
+    # cache housekeeping settings don't change results
+    assert key(grid, 'gas_adsorption') == key(
+        config_with(tmpdir, energy_grid={'spacing' : 0.1}), 'gas_adsorption')
+    # the native engine doesn't read grids; its parameters differ from plain's
+    assert key(native, 'helium_void_fraction') == key(
+        config_with(tmpdir, simulations=native['simulations']), 'helium_void_fraction')
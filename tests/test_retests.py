@@ -0,0 +1,99 @@
+import pytest
+
+from non_pseudo.simulation.retests import merge_replicas, relative_spread, replica_seed
+
+def void_fraction(value, error, stop_cycle):
+    """Results of a helium void fraction run, as returned by helium_void_fraction.run."""
+    return {
+        'vf_helium_void_fraction' : value,
+        'vf_error_estimate' : error,
+        'vf_stop_cycle' : stop_cycle,
+    }
+
+def isotherm_point(pressure, loading, error, stop_cycle):
+    """Point of an isotherm, as returned by gas_adsorption.run_point."""
+    return {
+        'absolute_volumetric_loading' : loading,
+        'absolute_molar_loading' : loading / 10,
+        'error_estimate' : error,
+        'pressure' : pressure,
+        'temperature' : 298.,
+        'stop_cycle' : stop_cycle,
+    }
+
+def isotherm(points):
+    """Results of an isotherm, as returned by gas_adsorption.run_isotherm."""
+    results = {
+        'isotherm' : points,
+        'ga_isotherm_points' : len(points),
+        'ga_stop_cycle' : max(point['stop_cycle'] for point in points),
+    }
+    for f, point in [('ga0', points[-1]), ('ga1', points[0])]:
+        for key, value in point.items():
+            if key not in ('pressure', 'temperature', 'stop_cycle'):
+                results['{}_{}'.format(f, key)] = value
+    return results
+
+def test_merge_replicas_error_of_mean_and_spread():
+    replicas = [void_fraction(0.40, 0.03, 2000), void_fraction(0.44, 0.04, 5000),
+                void_fraction(0.42, 0.00, 3000)]
+    results = merge_replicas('helium_void_fraction', replicas)
+    assert results['vf_helium_void_fraction'] == pytest.approx(0.42)
+    assert results['vf_error_estimate'] == pytest.approx(0.05 / 3)
+    assert results['vf_spread'] == pytest.approx(0.02)
+    assert results['vf_stop_cycle'] == 5000
+    assert results['vf_replicas'] == 3
+    assert relative_spread('helium_void_fraction', results) == pytest.approx(0.02 / 0.42)
+
+def test_merge_single_replica_has_no_spread():
+    results = merge_replicas('helium_void_fraction', [void_fraction(0.4, 0.01, 100)])
+    assert results['vf_helium_void_fraction'] == pytest.approx(0.4)
+    assert results['vf_error_estimate'] == pytest.approx(0.01)
+    assert results['vf_spread'] is None
+    assert results['vf_replicas'] == 1
+    assert relative_spread('helium_void_fraction', results) == float('inf')
+
+def test_merge_replicas_propagates_missing_values():
+    replicas = [void_fraction(0.4, 0.01, 100), void_fraction(None, None, 100)]
+    results = merge_replicas('helium_void_fraction', replicas)
+    assert results['vf_helium_void_fraction'] is None
+    assert results['vf_error_estimate'] is None
+    assert 'vf_spread' not in results
+
+def test_merge_replicas_of_isotherm():
+    replicas = [
+        isotherm([isotherm_point(1e4, 1., 0.3, 10), isotherm_point(1e5, 10., 3., 100)]),
+        isotherm([isotherm_point(1e4, 3., 0.4, 20), isotherm_point(1e5, 14., 4., 200)]),
+    ]
+    results = merge_replicas('gas_adsorption', replicas)
+    assert results['ga0_absolute_volumetric_loading'] == pytest.approx(12.)
+    assert results['ga0_error_estimate'] == pytest.approx(2.5)
+    assert results['ga0_spread'] == pytest.approx(8 ** 0.5)
+    assert results['ga1_absolute_volumetric_loading'] == pytest.approx(2.)
+    assert results['ga1_spread'] == pytest.approx(2 ** 0.5)
+    assert results['ga_stop_cycle'] == 200
+    assert results['ga_isotherm_points'] == 2
+    assert isinstance(results['ga_isotherm_points'], int)
+    assert results['ga_replicas'] == 2
+    # the low pressure point is the noisier one
+    assert relative_spread('gas_adsorption', results) == pytest.approx(2 ** 0.5 / 2)
+    low, high = results['isotherm']
+    assert low['pressure'] == 1e4 and high['pressure'] == 1e5
+    assert low['absolute_volumetric_loading'] == pytest.approx(2.)
+    assert low['error_estimate'] == pytest.approx(0.25)
+    assert low['stop_cycle'] == 20
+    assert high['absolute_molar_loading'] == pytest.approx(1.2)
+
+def test_merge_replicas_rejects_different_counts():
+    replicas = [
+        isotherm([isotherm_point(1e4, 1., 0.3, 10), isotherm_point(1e5, 10., 3., 100)]),
+        isotherm([isotherm_point(1e5, 14., 4., 200)]),
+    ]
+    with pytest.raises(ValueError, match='ga_isotherm_points'):
+        merge_replicas('gas_adsorption', replicas)
+
+def test_replica_seed_is_repeatable():
+    seed = replica_seed('run', 'material', 'surface_area', 0)
+    assert replica_seed('run', 'material', 'surface_area', 0) == seed
+    assert replica_seed('run', 'material', 'surface_area', 2) == seed + 2
+    assert replica_seed('run', 'material', 'gas_adsorption', 0) != seed
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+from non_pseudo.scheduler import run_graph, critical_path
+
+DIAMOND = {
+    'b' : ['a'],
+    'c' : ['a'],
+    'd' : ['b', 'c'],
+}
+
+def test_run_graph_starts_tasks_after_their_dependencies():
+    finished = []
+    lock = threading.Lock()
+    def task(name):
+        def run():
+            with lock:
+                finished.append(name)
+            return name.upper()
+        return run
+    completed = []
+    results, timings = run_graph({name : task(name) for name in 'abcd'}, DIAMOND,
+                                 on_complete=lambda name, result: completed.append(name))
+    assert results == {'a' : 'A', 'b' : 'B', 'c' : 'C', 'd' : 'D'}
+    assert finished[0] == 'a' and finished[-1] == 'd'
+    assert sorted(completed) == ['a', 'b', 'c', 'd']
+    assert set(timings) == set('abcd')
+
+def test_run_graph_ignores_dependencies_on_missing_tasks():
+    results, timings = run_graph({'d' : lambda: 1}, DIAMOND)
+    assert results == {'d' : 1}
+
+def test_run_graph_rejects_cycles():
+    tasks = {name : lambda: None for name in 'xyz'}
+    with pytest.raises(ValueError, match='Circular dependency'):
+        run_graph(tasks, {'x' : ['z'], 'y' : ['x'], 'z' : ['y']})
+
+def test_run_graph_raises_task_errors():
+    def fail():
+        raise RuntimeError('simulation failed')
+    with pytest.raises(RuntimeError):
+        run_graph({'a' : fail, 'b' : lambda: None}, {'b' : ['a']})
+
+def test_critical_path_follows_slowest_branch_of_diamond():
+    timings = {
+        'a' : (0., 1.),
+        'b' : (1., 5.),
+        'c' : (1., 2.),
+        'd' : (5., 6.),
+    }
+    assert critical_path(timings, DIAMOND) == (['a', 'b', 'd'], 6.)
+    timings['c'] = (1., 5.5)
+    assert critical_path(timings, DIAMOND) == (['a', 'c', 'd'], 6.)
+
+def test_critical_path_of_nothing():
+    assert critical_path({}, DIAMOND) == ([], 0.)
@@ -0,0 +1,133 @@
+import math
+import os
+
+import pytest
+
+from non_pseudo import cif
+from non_pseudo.simulation import utilities
+from non_pseudo.simulation.utilities import CUTOFF, run_cycles, unit_cells
+from synthetic_output import write_cif
+
+def triclinic_widths(lengths, angles):
+    """Volume and perpendicular widths from the cell parameters alone."""
+    a, b, c = lengths
+    ca, cb, cg = [math.cos(math.radians(angle)) for angle in angles]
+    sa, sb, sg = [math.sin(math.radians(angle)) for angle in angles]
+    volume = a * b * c * math.sqrt(1 - ca ** 2 - cb ** 2 - cg ** 2 + 2 * ca * cb * cg)
+    return volume, [volume / (b * c * sa), volume / (c * a * sb), volume / (a * b * sg)]
+
+def test_triclinic_widths_and_volume(tmpdir):
+    lengths, angles = (30., 28., 26.), (70., 80., 110.)
+    path = str(tmpdir.join('tri.cif'))
+    write_cif(path, lengths, atoms=5, angles=angles)
+    crystal = cif.read_cif(path)
+    volume, widths = triclinic_widths(lengths, angles)
+    assert cif.volume(crystal) == pytest.approx(volume)
+    assert list(cif.perpendicular_widths(crystal)) == pytest.approx(widths)
+
+def test_unit_cells_of_triclinic_cell(tmpdir):
+    lengths, angles = (30., 28., 26.), (70., 80., 110.)
+    write_cif(str(tmpdir.join('tri.cif')), lengths, atoms=5, angles=angles)
+    volume, widths = triclinic_widths(lengths, angles)
+    # every length is over twice the cutoff, but only the first width is
+    assert min(lengths) > 2 * CUTOFF
+    assert [width > 2 * CUTOFF for width in widths] == [True, False, False]
+    assert unit_cells({'materials_directory' : str(tmpdir)}, 'tri') == (1, 2, 2)
+
+def test_unit_cells_of_hexagonal_and_large_cells(tmpdir):
+    write_cif(str(tmpdir.join('hex.cif')), (26., 26., 26.), atoms=5, angles=(90., 90., 120.))
+    write_cif(str(tmpdir.join('big.cif')), (60., 60., 25.6), atoms=5)
+    config = {'materials_directory' : str(tmpdir)}
+    assert unit_cells(config, 'hex') == (2, 2, 1)
+    assert unit_cells(config, 'big') == (1, 1, 1)
+
+QUANTITIES = [('loading', 'loading_error')]
+
+def fake_raspa(monkeypatch, chunks):
+    """Make each RASPA run return the next of `chunks`; returns the calls."""
+    calls = []
+    def run_raspa(config, output_dir, input_file, parse):
+        calls.append(input_file)
+        return dict(chunks[len(calls) - 1])
+    monkeypatch.setattr(utilities, 'run_raspa', run_raspa)
+    return calls
+
+def cycles_config(adaptive=None):
+    simulation_config = {'simulation_cycles' : 1000}
+    if adaptive is not None:
+        simulation_config['adaptive'] = adaptive
+    return {'simulations' : {'gas_adsorption' : simulation_config}}
+
+def test_run_cycles_without_adaptive(monkeypatch, tmpdir):
+    calls = fake_raspa(monkeypatch, [{'loading' : 2., 'loading_error' : 1.}])
+    inputs = []
+    results = run_cycles(cycles_config(), 'gas_adsorption', str(tmpdir), 'input',
+                         lambda cycles, first: inputs.append((cycles, first)),
+                         None, QUANTITIES, 'stop_cycle')
+    assert inputs == [(1000, True)]
+    assert len(calls) == 1
+    assert results == {'loading' : 2., 'loading_error' : 1., 'stop_cycle' : 1000}
+
+def test_run_cycles_stops_once_converged(monkeypatch, tmpdir):
+    fake_raspa(monkeypatch, [
+        {'loading' : 10., 'loading_error' : 2.},
+        {'loading' : 14., 'loading_error' : 0.5},
+        {'loading' : 12., 'loading_error' : 0.1},
+        {'loading' : 0., 'loading_error' : 100.},
+    ])
+    os.mkdir(str(tmpdir.join('CrashRestart')))
+    inputs = []
+    adaptive = {'tolerance' : 0.06, 'check_every' : 300, 'min_cycles' : 600}
+    results = run_cycles(cycles_config(adaptive), 'gas_adsorption', str(tmpdir), 'input',
+                         lambda cycles, first: inputs.append((cycles, first)),
+                         None, QUANTITIES, 'stop_cycle')
+    # relative error is 1.03 / 12 after two chunks and 0.69 / 12 after three
+    assert inputs == [(300, True), (300, False), (300, False)]
+    assert results['loading'] == pytest.approx(12.)
+    assert results['loading_error'] == pytest.approx((4 + 0.25 + 0.01) ** 0.5 / 3)
+    assert results['stop_cycle'] == 900
+    assert not tmpdir.join('CrashRestart').check()
+
+def test_run_cycles_respects_min_and_max_cycles(monkeypatch, tmpdir):
+    fake_raspa(monkeypatch, [{'loading' : 1., 'loading_error' : 0.}] * 2 +
+                            [{'loading' : 1., 'loading_error' : None}] * 2)
+    inputs = []
+    adaptive = {'tolerance' : 0.05, 'check_every' : 400, 'min_cycles' : 800}
+    results = run_cycles(cycles_config(adaptive), 'gas_adsorption', str(tmpdir), 'input',
+                         lambda cycles, first: inputs.append((cycles, first)),
+                         None, QUANTITIES, 'stop_cycle')
+    assert inputs == [(400, True), (400, False)]
+    assert results['stop_cycle'] == 800
+
+    fake_raspa(monkeypatch, [{'loading' : 1., 'loading_error' : 0.}] +
+                            [{'loading' : 1., 'loading_error' : None}] * 3)
+    inputs = []
+    results = run_cycles(cycles_config(adaptive), 'gas_adsorption', str(tmpdir), 'input',
+                         lambda cycles, first: inputs.append((cycles, first)),
+                         None, QUANTITIES, 'stop_cycle')
+    # a missing error estimate never converges, the last chunk is cut short
+    assert inputs == [(400, True), (400, False), (200, False)]
+    assert results['loading_error'] is None
+    assert results['stop_cycle'] == 1000
+
+def failing_surface_area(monkeypatch, config):
+    """Run surface_area.run with a RASPA run that fails; returns its directories."""
+    from non_pseudo.simulation import surface_area
+    def run_cycles(config, stage, output_dir, *args):
+        open(os.path.join(output_dir, 'Restart'), 'w').close()
+        raise RuntimeError('simulate failed')
+    monkeypatch.setattr(surface_area, 'stage_inputs', lambda config, output_dir, name: None)
+    monkeypatch.setattr(surface_area, 'unit_cells', lambda config, name: (1, 1, 1))
+    monkeypatch.setattr(surface_area, 'run_cycles', run_cycles)
+    with pytest.raises(RuntimeError):
+        surface_area.run(config, 'run', 'material')
+
+def test_failed_simulation_directory_removed(monkeypatch, tmpdir):
+    config = {'simulations_directory' : 'tmpfs', 'tmpfs_directory' : str(tmpdir)}
+    failing_surface_area(monkeypatch, config)
+    assert tmpdir.join('non_pseudo', 'run', 'material').listdir() == []
+
+def test_failed_simulation_checkpoint_kept(monkeypatch, tmpdir):
+    config = {'simulations_directory' : 'tmpfs', 'checkpoint' : {'directory' : str(tmpdir)}}
+    failing_surface_area(monkeypatch, config)
+    assert tmpdir.join('run', 'material', 'surface_area', 'Restart').check()